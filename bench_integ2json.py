@@ -0,0 +1,240 @@
+import sys
+import os
+import time
+import json
+import platform
+import argparse
+import subprocess
+import statistics
+import tempfile
+import tracemalloc
+from pathlib import Path
+
+import integ2json
+import gen_integfile
+
+""" Benchmarks for integ2json.  Run with: python bench_integ2json.py """
+
+# The field lines of a global, as they appear in an integ file (stripped)
+GLOBAL_FIELD_LINES = [
+    "Top/Bottom Pnt Level: # of blocks=1      8kb (17% full)",
+    "Data Level:           # of blocks=1,170      9,360kb (89% full)",
+    "Big Strings:          # of blocks=295,835     2311MB (68% full) # = 241,005",
+    "Total:                # of blocks=297,006      2,320MB (89% full)",
+]
+
+
+def bench_global_fields(repeat: int) -> {}:
+    """ Times deal_with_global_field() against the word-by-word deal_with_global_field_slow(). """
+    lines = GLOBAL_FIELD_LINES * repeat
+    results = {}
+    for name, parser in (("slow", integ2json.deal_with_global_field_slow),
+                         ("fast", integ2json.deal_with_global_field)):
+        start = time.perf_counter()
+        for line in lines:
+            parser(line)
+        seconds = time.perf_counter() - start
+        results[name] = {"Lines": len(lines), "Seconds": seconds, "Lines_Per_Second": len(lines) / seconds}
+    results["Speedup"] = results["fast"]["Lines_Per_Second"] / results["slow"]["Lines_Per_Second"]
+    return results
+
+
+def bench_integfile(integ_file: Path, outdir: Path) -> {}:
+    """ Times deal_with_integfile(), deidentify_json() and output_to_file() on an integ file, separately.
+    Each phase is run twice, once for the time and once under tracemalloc for its peak memory,
+    so the tracing doesn't slow down the timings. """
+    size = integ_file.stat().st_size
+    with open(integ_file, 'rb') as fp:
+        lines = sum(1 for line in fp)
+    outfile = outdir / "bench.json"
+    phases = [
+        ("deal_with_integfile", lambda integ_json: {integ_file.name: integ2json.deal_with_integfile(integ_file)}),
+        ("deidentify_json", lambda integ_json: integ2json.deidentify_json("generic", integ_json)),
+        ("output_to_file", lambda integ_json: integ2json.output_to_file(integ_json, outfile, beautify=False)),
+    ]
+    results = {"Bytes": size, "Lines": lines}
+    integ_json = None
+    for name, phase in phases:
+        start = time.perf_counter()
+        phase_json = phase(integ_json)
+        seconds = time.perf_counter() - start
+        tracemalloc.start()
+        phase(integ_json)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        results[name] = {
+            "Seconds": seconds,
+            "MB_Per_Second": size / (1024 ** 2) / seconds,
+            "Lines_Per_Second": lines / seconds,
+            "Peak_Memory_MB": peak / (1024 ** 2)
+        }
+        if name == "deal_with_integfile":
+            integ_json = phase_json
+    return results
+
+
+def bench_synthetic(args) -> {}:
+    """ Generates a synthetic integ file, see gen_integfile.generate_integfile(), and benchmarks it. """
+    with tempfile.TemporaryDirectory() as tmpdir:
+        integ_file = Path(tmpdir) / "INTEG_synthetic.txt"
+        with open(integ_file, 'w') as fp:
+            gen_integfile.generate_integfile(fp, args.databases, args.globals, args.big_strings, args.errors,
+                                             args.old_format, args.seed)
+        return bench_integfile(integ_file, Path(tmpdir))
+
+
+def bench_cold_start(runs: int) -> {}:
+    """ Times starting python3 integ2json.py in a new process, the way it's run from cron or a script, as the median of runs.
+    Python itself is timed too (python -c pass), so what integ2json adds on top of it can be told apart.
+    The small conversion is a few databases, so it's nearly all startup. """
+    here = Path(__file__).resolve().parent
+    with tempfile.TemporaryDirectory() as tmpdir:
+        integ_file = Path(tmpdir) / "INTEG_small.txt"
+        with open(integ_file, 'w') as fp:
+            gen_integfile.generate_integfile(fp, databases=3, globals_per_database=10)
+        outdir = Path(tmpdir) / "out"
+        outdir.mkdir()
+        commands = {
+            "python": [sys.executable, "-c", "pass"],
+            "help": [sys.executable, str(here / "integ2json.py"), "-h"],
+            "convert": [sys.executable, str(here / "integ2json.py"), "-o", str(outdir), str(integ_file)],
+        }
+        results = {}
+        for name, command in commands.items():
+            seconds = []
+            for _ in range(runs):
+                for outfile in outdir.iterdir():
+                    outfile.unlink()
+                start = time.perf_counter()
+                subprocess.run(command, cwd=here, stdout=subprocess.DEVNULL, check=True)
+                seconds.append(time.perf_counter() - start)
+            results[name] = {"Runs": runs, "Seconds": statistics.median(seconds), "Min_Seconds": min(seconds)}
+    return results
+
+
+def compare_results(results: {}, baseline: {}, tolerance: float) -> list:
+    """ Returns the phases that are more than tolerance (a fraction) slower than in baseline. """
+    regressions = []
+    for name in ("deal_with_integfile", "deidentify_json", "output_to_file"):
+        if name not in baseline.get("Integfile", {}):
+            continue
+        old = baseline["Integfile"][name]["MB_Per_Second"]
+        new = results["Integfile"][name]["MB_Per_Second"]
+        print("{}: {:.1f} MB/s, was {:.1f} MB/s ({:+.0%})".format(name, new, old, new / old - 1))
+        if new < old * (1 - tolerance):
+            regressions.append(name)
+    for name in ("help", "convert"):
+        if name not in baseline.get("Cold_Start", {}) or name not in results.get("Cold_Start", {}):
+            continue
+        old = baseline["Cold_Start"][name]["Seconds"]
+        new = results["Cold_Start"][name]["Seconds"]
+        print("cold start ({}): {:.1f} ms, was {:.1f} ms ({:+.0%})".format(name, new * 1000, old * 1000, new / old - 1))
+        if new > old * (1 + tolerance):
+            regressions.append("cold start ({})".format(name))
+    return regressions
+
+
+def main(args):
+    """ Runs the benchmarks, prints the results. """
+    results = {
+        "Date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "Python": platform.python_version(),
+        "Platform": platform.platform(),
+        "CPUs": os.cpu_count(),
+        "Encoder": integ2json.json_encoder()["name"],
+        "Options": {"repeat": args.repeat, "databases": args.databases, "globals": args.globals,
+                    "big_strings": args.big_strings, "errors": args.errors, "old_format": args.old_format,
+                    "seed": args.seed, "integfile": str(args.integfile) if args.integfile else None,
+                    "cold_runs": args.cold_runs}
+    }
+    results["Global_Fields"] = bench_global_fields(args.repeat)
+    for name in ("slow", "fast"):
+        print("global fields ({}): {:,.0f} lines/s".format(name, results["Global_Fields"][name]["Lines_Per_Second"]))
+    print("global fields speedup: {:.2f}x".format(results["Global_Fields"]["Speedup"]))
+
+    if args.integfile:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            results["Integfile"] = bench_integfile(args.integfile, Path(tmpdir))
+    else:
+        results["Integfile"] = bench_synthetic(args)
+    print("integ file: {:,} lines, {:.1f} MB".format(results["Integfile"]["Lines"],
+                                                     results["Integfile"]["Bytes"] / (1024 ** 2)))
+    for name in ("deal_with_integfile", "deidentify_json", "output_to_file"):
+        phase = results["Integfile"][name]
+        print("{}: {:.2f}s, {:.1f} MB/s, {:,.0f} lines/s, peak {:.1f} MB".format(
+            name, phase["Seconds"], phase["MB_Per_Second"], phase["Lines_Per_Second"], phase["Peak_Memory_MB"]))
+
+    if args.cold_runs:
+        results["Cold_Start"] = bench_cold_start(args.cold_runs)
+        for name, timing in results["Cold_Start"].items():
+            print("cold start ({}): {:.1f} ms, best {:.1f} ms".format(name, timing["Seconds"] * 1000,
+                                                                      timing["Min_Seconds"] * 1000))
+
+    if args.output:
+        with open(args.output, 'w') as fp:
+            json.dump(results, fp, indent=4)
+        print("Results written to {}".format(args.output))
+    if args.compare:
+        with open(args.compare, 'r') as fp:
+            baseline = json.load(fp)
+        regressions = compare_results(results, baseline, args.tolerance)
+        if regressions:
+            sys.exit("Slower than {}: {}".format(args.compare, ", ".join(regressions)))
+
+
+def parse_args(args):
+    """ Deal with the args."""
+    parser = argparse.ArgumentParser(description='Benchmark integ2json')
+    parser.add_argument('-r', '--repeat',
+                        help='How many times to repeat the sample lines',
+                        type=int,
+                        default=100000)
+    parser.add_argument('-i', '--integfile',
+                        help='Benchmark this integ file, instead of a synthetic one',
+                        type=Path)
+    parser.add_argument('-d', '--databases',
+                        help='Number of databases in the synthetic integ file (default 20)',
+                        type=int,
+                        default=20)
+    parser.add_argument('-g', '--globals',
+                        help='Number of globals in each database of the synthetic integ file (default 2000)',
+                        type=int,
+                        default=2000)
+    parser.add_argument('--big-strings',
+                        help='Fraction of synthetic globals with a Big Strings line (default 0.1)',
+                        type=float,
+                        default=0.1)
+    parser.add_argument('--errors',
+                        help='Number of synthetic globals that are Not OK (default 0)',
+                        type=int,
+                        default=0)
+    parser.add_argument('--old-format',
+                        help='Make the synthetic integ file like an old/VMS version of Cache',
+                        action='store_true',
+                        default=False)
+    parser.add_argument('--seed',
+                        help='Random seed of the synthetic integ file (default 0)',
+                        type=int,
+                        default=0)
+    parser.add_argument('--cold-runs',
+                        help='How many times to start integ2json in a new process, to time its cold start '
+                             '(default 10, 0 to skip it)',
+                        type=int,
+                        default=10)
+    parser.add_argument('-o', '--output',
+                        help='Write the results to this JSON file',
+                        type=Path)
+    parser.add_argument('--compare',
+                        help='Compare with the results in this JSON file, and fail if anything got slower',
+                        metavar='results',
+                        type=Path)
+    parser.add_argument('--tolerance',
+                        help='With --compare, how much slower is still ok, as a fraction (default 0.1)',
+                        type=float,
+                        default=0.1)
+    return parser.parse_args(args)
+
+
+if __name__ == '__main__':
+    args = parse_args([*sys.argv[1:]])
+    main(args)
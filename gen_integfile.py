@@ -0,0 +1,254 @@
+import sys
+import argparse
+import random
+from pathlib import Path
+
+""" Generates synthetic Cache integrity files, for benchmarking integ2json.  Run with: python gen_integfile.py -h """
+
+
+def generate_integfile(fp, databases: int = 10, globals_per_database: int = 100, big_strings: float = 0.1,
+                       errors: int = 0, old_format: bool = False, seed: int = 0) -> int:
+    """ Writes a synthetic integ file to fp, returns the number of lines written.
+    big_strings is the fraction of globals with a Big Strings line, errors is how many globals are Not OK.
+    old_format writes it like an old/VMS Cache would: no version line, VMS directories and no dates in
+     the Elapsed Time lines, eg: 'Elapsed Time = 0.0 seconds 19:43:01.'
+    The same seed always gives the same file. """
+    integfile = {"fp": fp, "rng": random.Random(seed), "old_format": old_format, "lines": 0, "clock": 0}
+    error_globals = pick_error_globals(integfile["rng"], databases, globals_per_database, errors)
+    write_header(integfile)
+    errors_found = []
+    for db in range(databases):
+        directory, database_errors = write_database(integfile, db, globals_per_database, big_strings, error_globals)
+        if database_errors:
+            errors_found.append((directory, database_errors))
+    write_line(integfile)
+    write_errors(integfile, errors_found)
+    return integfile["lines"]
+
+
+def pick_error_globals(rng: random.Random, databases: int, globals_per_database: int, errors: int) -> set:
+    """ Returns which globals are Not OK, as (database, global) numbers. """
+    if not (errors and databases and globals_per_database):
+        return set()
+    all_globals = databases * globals_per_database
+    return {divmod(number, globals_per_database) for number in rng.sample(range(all_globals), min(errors, all_globals))}
+
+
+def write_line(integfile: {}, text: str = "") -> None:
+    """ Writes a line to the integ file, see generate_integfile(). """
+    integfile["fp"].write(text + "\n")
+    integfile["lines"] += 1
+
+
+def timestamp(integfile: {}, elapsed: float) -> str:
+    """ Moves the clock of the integ file on by elapsed seconds, returns the time it is now, ie: 01/02/2199 00:01:10.
+    The old format has no date. """
+    integfile["clock"] += int(elapsed)
+    clock = integfile["clock"]
+    seconds = clock % 86400
+    time_str = "{:02}:{:02}:{:02}".format(seconds // 3600, seconds // 60 % 60, seconds % 60)
+    if integfile["old_format"]:
+        return time_str
+    return "{:02}/{:02}/2199 {}".format(1 + clock // 86400 // 28 % 12, 1 + clock // 86400 % 28, time_str)
+
+
+def write_header(integfile: {}) -> None:
+    """ Writes the lines at the top of the integ file, the old format has no version line. """
+    write_line(integfile, "Cache Database Integrity Check on 01/01/2199 at 00:00:00")
+    write_line(integfile, "System: SYNTHHOST  Configuration: CACHE")
+    if integfile["old_format"]:
+        write_line(integfile)
+    else:
+        write_line(integfile, "Cache for UNIX (IBM AIX for System Power System-64) 2017.2.1 (Build 801) "
+                              "Wed Dec 6 2017 09:23:33 EST")
+    write_line(integfile)
+
+
+def write_database(integfile: {}, db: int, globals_per_database: int, big_strings: float,
+                   error_globals: set) -> tuple:
+    """ Writes database number db, its globals and its totals.  Returns (directory, [(global, error), ...]). """
+    if integfile["old_format"]:
+        directory = "_DIR:[DATABASE{}]".format(db)
+    else:
+        directory = "/database/db{}/".format(db)
+    write_line(integfile)
+    write_line(integfile, "---Directory {}---".format(directory))
+    write_line(integfile)
+    totals = {"Pointer Level": [0, 0], "Data Level": [0, 0], "Big String": [0, 0, 0]}
+    database_elapsed = 0.0
+    database_errors = []
+    for glbl in range(globals_per_database):
+        global_name = "GLOBAL{}".format(glbl)
+        elapsed, error_msg = write_global(integfile, global_name, big_strings, (db, glbl) in error_globals, totals)
+        database_elapsed += elapsed
+        if error_msg is not None:
+            database_errors.append((global_name, error_msg))
+    write_database_totals(integfile, directory, totals, database_elapsed)
+    write_database_errors(integfile, database_errors)
+    return directory, database_errors
+
+
+def write_global(integfile: {}, global_name: str, big_strings: float, not_ok: bool, totals: {}) -> tuple:
+    """ Writes a global, and adds its blocks to the totals of its database.  Returns (its elapsed seconds,
+    its error or None). """
+    rng = integfile["rng"]
+    write_line(integfile, "Global: {}".format(global_name))
+    pointer_blocks = rng.randint(1, 50)
+    data_blocks = rng.randint(1, 2000000)
+    pointer_full = rng.randint(0, 100)
+    data_full = rng.randint(0, 100)
+    write_line(integfile, global_field("Top/Bottom Pnt Level", pointer_blocks, pointer_full))
+    write_line(integfile, global_field("Data Level", data_blocks, data_full))
+    blocks = pointer_blocks + data_blocks
+    totals["Pointer Level"][0] += pointer_blocks
+    totals["Data Level"][0] += data_blocks
+    if rng.random() < big_strings:
+        big_string_blocks = rng.randint(1, 500000)
+        big_string_count = rng.randint(1, big_string_blocks)
+        write_line(integfile, global_field("Big Strings", big_string_blocks, rng.randint(0, 100), big_string_count))
+        blocks += big_string_blocks
+        totals["Big String"][0] += big_string_blocks
+        totals["Big String"][2] += big_string_count
+    write_line(integfile, global_field("Total", blocks, rng.randint(0, 100)))
+    error_msg = None
+    if not_ok:
+        error_msg = "The pointer block contains the wrong global"
+        write_line(integfile, "**********Global {} is Not OK**********".format(global_name))
+        write_line(integfile, error_msg)
+        write_line(integfile)
+    elapsed = round(rng.expovariate(1.0), 1)
+    if integfile["old_format"]:
+        write_line(integfile, " Elapsed Time = {} seconds {}.".format(elapsed, timestamp(integfile, elapsed)))
+    else:
+        write_line(integfile, " Elapsed Time = {} seconds, Completed {}".format(elapsed, timestamp(integfile, elapsed)))
+    write_line(integfile)
+    return elapsed, error_msg
+
+
+def write_database_totals(integfile: {}, directory: str, totals: {}, database_elapsed: float) -> None:
+    """ Writes the Total for directory lines of a database, and its elapsed time. """
+    rng = integfile["rng"]
+    write_line(integfile)
+    write_line(integfile, "---Total for directory {}---".format(directory))
+    pointer_blocks = totals["Pointer Level"][0]
+    data_blocks = totals["Data Level"][0]
+    big_string_blocks = totals["Big String"][0]
+    total_blocks = pointer_blocks + data_blocks + big_string_blocks
+    write_line(integfile, total_field("Pointer Level", pointer_blocks, rng.randint(0, 100)))
+    write_line(integfile, total_field("Data Level", data_blocks, rng.randint(0, 100)))
+    if big_string_blocks:
+        write_line(integfile, total_field("Big String", big_string_blocks, rng.randint(0, 100), totals["Big String"][2]))
+    write_line(integfile, total_field("Total", total_blocks, rng.randint(0, 100)))
+    write_line(integfile, total_field("Free", rng.randint(0, total_blocks + 1000)))
+    write_line(integfile)
+    write_line(integfile, "Elapsed time = {:.1f} seconds {}".format(database_elapsed, timestamp(integfile, 0)))
+    write_line(integfile)
+
+
+def write_database_errors(integfile: {}, database_errors: list) -> None:
+    """ Writes the errors at the end of a database, ie: the (global, error)s of its globals that are Not OK. """
+    if database_errors:
+        write_line(integfile, "***** The following errors were detected *****")
+        for global_name, error_msg in database_errors:
+            write_line(integfile, " **********Global {} is Not OK**********".format(global_name))
+            write_line(integfile, " " + error_msg)
+            write_line(integfile)
+    else:
+        write_line(integfile, "No Errors were found in this directory.")
+    write_line(integfile)
+
+
+def write_errors(integfile: {}, errors_found: list) -> None:
+    """ Writes the errors at the end of the integ file, errors_found is [(directory, [(global, error), ...]), ...]. """
+    if not errors_found:
+        write_line(integfile, "No Errors were found.")
+        return
+    write_line(integfile, "*****ERRORS WERE FOUND *****")
+    write_line(integfile)
+    write_line(integfile, "***** The following errors were detected *****")
+    for directory, database_errors in errors_found:
+        write_line(integfile)
+        write_line(integfile, "************************************************")
+        write_line(integfile, "*** Errors in directory: {} ***".format(directory))
+        write_line(integfile, "************************************************")
+        write_line(integfile)
+        for global_name, error_msg in database_errors:
+            write_line(integfile, " **********Global {} is Not OK**********".format(global_name))
+            write_line(integfile, error_msg)
+            write_line(integfile)
+
+
+def size_str(blocks: int) -> str:
+    """ Returns the size of some 8kb blocks the way Cache prints it, ie: 9,360kb or 2311MB. """
+    size_kb = blocks * 8
+    if size_kb < 10000:
+        return "{:,}kb".format(size_kb)
+    elif size_kb < 100000 * 1024:
+        return "{}MB".format(size_kb // 1024)
+    return "{}GB".format(size_kb // 1024 ** 2)
+
+
+def global_field(field: str, blocks: int, percent_full: int, big_strings_count: int = None) -> str:
+    """ Returns a field line of a global, ie:
+        ' Data Level:           # of blocks=1,170      9,360kb (89% full)' """
+    line = " {:<22}# of blocks={:,}      {} ({}% full)".format(field + ":", blocks, size_str(blocks), percent_full)
+    if big_strings_count is not None:
+        line += " # = {:,}".format(big_strings_count)
+    return line
+
+
+def total_field(field: str, blocks: int, percent_full: int = None, big_strings_count: int = None) -> str:
+    """ Returns a line of a directory's totals, ie:
+        '     3,166 Pointer Level blocks          24MB (63% full)' """
+    line = "{:>10} {:<20}{:>12}".format("{:,}".format(blocks), field + " blocks", size_str(blocks))
+    if percent_full is not None:
+        line += " ({}% full)".format(percent_full)
+    if big_strings_count is not None:
+        line += " # = {:,}".format(big_strings_count)
+    return line
+
+
+def main(args):
+    """ Writes the integ file. """
+    with open(args.outfile, 'w') as fp:
+        lines = generate_integfile(fp, args.databases, args.globals, args.big_strings, args.errors,
+                                   args.old_format, args.seed)
+    print("Wrote {} ({:,} lines, {:.1f} MB)".format(args.outfile, lines, args.outfile.stat().st_size / 1024 ** 2))
+
+
+def parse_args(args):
+    """ Deal with the args."""
+    parser = argparse.ArgumentParser(description='Generate a synthetic Cache integrity file')
+    parser.add_argument('-d', '--databases',
+                        help='Number of databases (default 10)',
+                        type=int,
+                        default=10)
+    parser.add_argument('-g', '--globals',
+                        help='Number of globals in each database (default 100)',
+                        type=int,
+                        default=100)
+    parser.add_argument('--big-strings',
+                        help='Fraction of globals with a Big Strings line (default 0.1)',
+                        type=float,
+                        default=0.1)
+    parser.add_argument('--errors',
+                        help='Number of globals that are Not OK (default 0)',
+                        type=int,
+                        default=0)
+    parser.add_argument('--old-format',
+                        help='Write it like an old/VMS version of Cache, without dates in the Elapsed Time lines',
+                        action='store_true',
+                        default=False)
+    parser.add_argument('--seed',
+                        help='Random seed, the same seed always gives the same file (default 0)',
+                        type=int,
+                        default=0)
+    parser.add_argument('outfile',
+                        help='The integ file to write',
+                        type=Path)
+    return parser.parse_args(args)
+
+
+if __name__ == '__main__':
+    args = parse_args([*sys.argv[1:]])
+    main(args)
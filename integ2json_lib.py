@@ -0,0 +1,4111 @@
+from __future__ import annotations
+import sys
+import os
+from pathlib import Path, PurePosixPath
+import argparse
+import re
+import json
+import errno
+import io
+import mmap
+import locale
+import time
+import fnmatch
+import heapq
+import bisect
+import math
+from array import array
+from itertools import repeat, chain
+from contextlib import nullcontext, contextmanager, ExitStack, closing
+from collections.abc import Iterator
+from urllib.parse import urlsplit, unquote
+try:
+    import resource
+except ImportError:
+    # Not on Windows, we just can't report the peak RSS there
+    resource = None
+# The modules that only some features need (hashlib, gzip, zipfile, csv, sqlite3, asyncio, the process pool...) are
+# imported in the functions that use them, so a plain conversion doesn't pay for loading them, see optional_module()
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    import sqlite3
+    import asyncio
+
+""" Converts an Intersystem's Cache database integrity file from text to JSON.  This is the code of integ2json.py,
+which runs it, see run(). """
+
+"""
+To do:
+    - Test on operating systems than other AIX
+    - Test on files with different errors
+"""
+
+
+def main(args):
+    """ The whole dang thing. """
+    # The pseudonyms of everything we deidentify, shared by every file so a name gets the same one everywhere
+    table = None
+    if args.deidentify:
+        if args.pseudonyms:
+            table = load_pseudonym_table(args.pseudonyms, args.deidentify)
+        else:
+            table = new_pseudonym_table(args.deidentify)
+    if args.follow:
+        follow_integfile_to_output(args, table)
+    elif args.stdin:
+        convert_stdin_integfiles(args, table)
+    else:
+        convert_integfiles(args, table)
+    if args.pseudonyms:
+        save_pseudonym_table(args.pseudonyms, table)
+
+
+def convert_integfiles(args, table: {} = None) -> None:
+    """ Converts the integ files, see main(). """
+    # The conversion cache, if we're using one, see load_cache()
+    cache = load_cache(args.outdir) if args.cache else None
+    # A zip file can hold more than one integ file, so each one is an (integ_file, member) pair.
+    #  member is the name of the integ file inside the zip, otherwise it's None.
+    # listof_sources are the ones to convert, listof_all_sources also has the unchanged cached ones.
+    # With --stats, the stats of each file, see new_stats()
+    file_stats = {} if args.stats else None
+    listof_sources, listof_all_sources = find_integfiles(args, cache, file_stats)
+
+    if args.singlefile and (args.stream or args.format != 'json'):
+        stream_integfiles(args, listof_sources, table, file_stats)
+        return
+    if args.shard_reports or args.shard_mb:
+        shard_integfiles(args, listof_sources, table, file_stats)
+        return
+
+    # With singlefile everything is returned to us, and output at the end
+    listof_outfiles = [None if args.singlefile else default_outfile(integ_file, member, args.outdir, output_suffix(args))
+                       for integ_file, member in listof_sources]
+    # converted_json is where we keep the JSON of each file for singlefile, until they're all done
+    converted_json = {}
+    # The ones that turned out not to be integ files
+    skipped_sources = set()
+    with make_pool(args.jobs) as pool:
+        results = convert_sources(args, listof_sources, listof_outfiles, table, pool)
+        for source, outfile, (file_json, stats) in zip(listof_sources, listof_outfiles, results):
+            if not report_converted(source, outfile, stats, file_stats):
+                skipped_sources.add(source)
+                continue
+            if not outfile:
+                converted_json[source] = file_json
+            if cache is not None:
+                update_cache(cache, args, *source, file_json)
+    if cache is not None:
+        save_cache(args.outdir, cache)
+    if args.singlefile:
+        output_singlefile(args, listof_all_sources, skipped_sources, converted_json, cache)
+
+
+def convert_sources(args, listof_sources: list, listof_outfiles: list, table: {} = None, pool=None) -> Iterator:
+    """ Converts each (integ_file, member) of listof_sources to its outfile, in pool if there is one, see
+    convert_integfile().  Yields the (JSON or None, stats) of each one, in the same order as listof_sources. """
+    # map() hands the results back in the same order as the files, no matter which finishes first
+    pool_map = pool.map if pool else map
+    listof_integ_files = [integ_file for integ_file, member in listof_sources]
+    listof_members = [member for integ_file, member in listof_sources]
+    if args.split:
+        # One file at a time, its databases are spread over the pool instead
+        for integ_file, member, outfile in zip(listof_integ_files, listof_members, listof_outfiles):
+            yield convert_integfile(integ_file, member, outfile, args, table, pool_map)
+        return
+    if not deidentify_in_parent(args, pool):
+        # Hash pseudonyms are the same whoever makes them, so each worker can keep its own table
+        worker_table = new_pseudonym_table(args.deidentify) if pool and table is not None else table
+        yield from pool_map(convert_integfile, listof_integ_files, listof_members, listof_outfiles, repeat(args),
+                            repeat(worker_table))
+        return
+    results = pool_map(convert_integfile, listof_integ_files, listof_members, repeat(None), repeat(args))
+    for outfile, (file_json, stats) in zip(listof_outfiles, results):
+        if "Skipped" not in stats:
+            file_json = deidentify_converted(file_json, outfile, args, table, stats)
+        yield file_json, stats
+
+
+def deidentify_in_parent(args, pool=None) -> bool:
+    """ Returns True if the files converted in pool's workers have to be deidentified here instead, see
+    deidentify_converted().  Generic pseudonyms are numbered in the order they're first seen, which the workers
+    can't agree on.  --split deidentifies here anyway, the files aren't converted in the workers. """
+    return pool is not None and not args.split and args.deidentify == 'generic'
+
+
+def deidentify_converted(file_json: {}, outfile: Path, args, table: {}, stats: {}) -> {}:
+    """ Deidentifies the JSON of a file a worker converted without deidentifying it, with table, and outputs it
+    to outfile, see deidentify_in_parent().  Returns the JSON if outfile is None, otherwise None.
+    The time it takes is added to stats' Seconds. """
+    start = time.perf_counter()
+    if args.errors_only:
+        file_json = deidentify_json(table["method"], file_json, table)
+        if outfile:
+            output_to_file(file_json, outfile, args.beautify, args.encoder, args.compress)
+            file_json = None
+    else:
+        (if_str, integfile_data), = file_json.items()
+        events = deidentify_events(table, integfile_to_events(integfile_data))
+        file_json = output_integfile(pseudonym(table, "integfile", if_str), events, outfile, args)
+    stats["Seconds"] += time.perf_counter() - start
+    return file_json
+
+
+def report_converted(source: tuple, outfile: Path, stats: {}, file_stats: {} = None) -> bool:
+    """ Prints that the (integ_file, member) source was converted to outfile (None for singlefile), with its stats if
+    file_stats is given, see convert_integfile().  Returns False if it was skipped, it wasn't an integ file. """
+    integ_file, member = source
+    if "Skipped" in stats:
+        print("Skipping file {} because {}.".format(source_str(integ_file, member), stats["Skipped"]))
+        return False
+    seconds = stats["Seconds"]
+    throughput = integ_file.stat().st_size / (1024 ** 2) / max(seconds, 1e-6)
+    if outfile:
+        print(f'Converted {source_str(integ_file, member)} to {outfile} in {seconds:.2f}s ({throughput:.1f} MB/s)')
+    else:
+        print(f'Converted {source_str(integ_file, member)} in {seconds:.2f}s ({throughput:.1f} MB/s)')
+    if file_stats is not None:
+        file_stats[source].update(stats)
+        print_stats(file_stats[source])
+    return True
+
+
+def output_singlefile(args, listof_all_sources: list, skipped_sources: set, converted_json: {}, cache: {} = None) -> None:
+    """ Outputs every file's JSON to integ2json.json in outdir, in the order of listof_all_sources.  They're the
+    converted_json of the ones that were converted, or their JSON in the cache if they hadn't changed. """
+    # integ_json is the big ol' dict where we store the JSON
+    integ_json = {}
+    for integ_file, member in listof_all_sources:
+        if (integ_file, member) in skipped_sources:
+            continue
+        if (integ_file, member) in converted_json:
+            integ_json.update(converted_json.pop((integ_file, member)))
+        else:
+            integ_json.update(load_cached_json(cache, args.outdir, integ_file, member))
+    outfile = args.outdir / Path("integ2json" + output_suffix(args))
+    print('Outputting to {}'.format(outfile))
+    output_to_file(integ_json, outfile, args.beautify, args.encoder, args.compress)
+
+
+def convert_stdin_integfiles(args, table: {} = None) -> None:
+    """ Converts the integ files named on stdin, one per line, as each name is read, until stdin is closed.
+    It's for converting a whole batch (ie: find ... | integ2json.py --stdin) in one process, so the startup, the
+     conversion cache and the process pool are only paid for once instead of once per file.
+    With --jobs the files are handed to the pool as their names are read, and reported as they finish, so generic
+     pseudonyms are numbered in the order they finish.
+    The cache is saved once, at the end (or when it's interrupted), see stdin_results(). """
+    cache = load_cache(args.outdir) if args.cache else None
+    file_stats = {} if args.stats else None
+    try:
+        with make_pool(args.jobs) as pool:
+            for source, outfile, (file_json, stats) in stdin_results(args, table, cache, file_stats, pool):
+                if report_converted(source, outfile, stats, file_stats) and cache is not None:
+                    update_cache(cache, args, *source, file_json)
+                # Whatever is reading our output sees each file as soon as it's done
+                sys.stdout.flush()
+    finally:
+        if cache is not None:
+            save_cache(args.outdir, cache)
+
+
+def stdin_results(args, table: {} = None, cache: {} = None, file_stats: {} = None, pool=None) -> Iterator:
+    """ Converts the integ files named on stdin, and yields ((integ_file, member), outfile, (JSON or None, stats)) of each
+    one, see convert_integfile().  Without a pool, or with --split, each file is converted when its name is read.
+    Otherwise they're submitted to the pool as they're read, and yielded in the order they finish.
+    The names are read in a thread, so a file that finishes is yielded even while stdin is waiting for the next. """
+    import queue
+    import threading
+    # The names read from stdin, None once it's closed, and the (source, outfile, future) of each finished file
+    events = queue.Queue()
+    threading.Thread(target=queue_stdin_lines, args=(events,), daemon=True).start()
+    in_parent = deidentify_in_parent(args, pool)
+    # Hash pseudonyms are the same whoever makes them, so each worker can keep its own table
+    worker_table = new_pseudonym_table(args.deidentify) if pool and table is not None else table
+    # The outdir's listing, so it's listed once for the whole batch, see outfile_exists()
+    listings = {}
+    reading, running = True, 0
+    while reading or running:
+        event = events.get()
+        if event is None:
+            reading = False
+        elif isinstance(event, tuple):
+            running -= 1
+            source, outfile, future = event
+            file_json, stats = future.result()
+            if in_parent and "Skipped" not in stats:
+                file_json = deidentify_converted(file_json, outfile, args, table, stats)
+            yield source, outfile, (file_json, stats)
+        else:
+            for source, outfile in stdin_sources(args, event.strip(), cache, file_stats, listings):
+                if pool is None or args.split:
+                    yield source, outfile, convert_integfile(*source, outfile, args, table, pool.map if pool else None)
+                    continue
+                future = pool.submit(convert_integfile, *source, None if in_parent else outfile, args,
+                                     None if in_parent else worker_table)
+                future.add_done_callback(lambda future, source=source, outfile=outfile:
+                                         events.put((source, outfile, future)))
+                running += 1
+
+
+def queue_stdin_lines(events) -> None:
+    """ Puts each line of stdin in the events queue as it's read, then None once stdin is closed.
+    It's read through a file of its own, not sys.stdin: a forked pool worker closes sys.stdin as it starts, which
+     would wait forever for the lock a thread reading it held when the worker was forked. """
+    try:
+        fp = open(sys.stdin.fileno(), encoding=sys.stdin.encoding, errors=sys.stdin.errors, closefd=False)
+    except (AttributeError, ValueError, io.UnsupportedOperation):
+        fp = nullcontext(sys.stdin)
+    with fp as lines:
+        for line in lines:
+            events.put(line)
+    events.put(None)
+
+
+def stdin_sources(args, name: str, cache: {} = None, file_stats: {} = None, listings: {} = None) -> list:
+    """ Returns the ((integ_file, member), outfile) to convert of a name read from stdin, see find_integfiles().
+    A blank line is nothing, and a name that isn't a file is reported and skipped. """
+    if not name:
+        return []
+    if not Path(name).is_file():
+        print("Skipping file {} because it does not exist.".format(name), flush=True)
+        return []
+    listof_sources, _ = find_integfiles(args, cache, file_stats, [name], listings)
+    return [((integ_file, member), default_outfile(integ_file, member, args.outdir, output_suffix(args)))
+            for integ_file, member in listof_sources]
+
+
+def follow_integfile_to_output(args, table: {} = None) -> None:
+    """ Parses the integ file while Cache is still writing it, outputs each event as a line of JSON as soon as it's read.
+    Output goes to stdout, or to a .ndjson file if outdir is set.  If table is given names are deidentified with it. """
+    integ_file = Path(args.files[0]).resolve()
+    integ_name = integfile_name(integ_file)
+    events = follow_integfile(integ_file, args.follow_interval, args.follow_timeout, args_filters(args))
+    if table is not None:
+        integ_name = pseudonym(table, "integfile", integ_name)
+        events = deidentify_events(table, events)
+    if args.summary:
+        events = summarize_events(events, args.top)
+    if args.outdir:
+        outfile = args.outdir / Path(integfile_name(integ_file)).with_suffix('.ndjson').name
+        print(f'Following {integ_file} to {outfile}')
+        with open(outfile, 'w') as file:
+            output_events_to_file(integ_name, events, file)
+    else:
+        print(f'Following {integ_file}', file=sys.stderr)
+        output_events_to_file(integ_name, events, sys.stdout)
+
+
+def find_integfiles(args, cache: {}, file_stats: {} = None, files: list = None, listings: {} = None) -> tuple:
+    """ Works out which of the supplied integ files to convert, returns them as lists of (integ_file, member).
+    Returns (the ones to convert, all of them including the unchanged ones in the cache).
+    The files are only opened here to read their first bytes, zip files' members are listed whatever they're called,
+     see integfile_members().  Whether they're really integ files is checked when they're parsed, see sniff_integfile().
+    If file_stats is given, how long each file took to find is put in it, see new_stats().
+    files are the integ files, args.files if it's None.  listings is kept between calls, see outfile_exists(). """
+    listof_sources = []
+    listof_all_sources = []
+    # The names in each directory we put outfiles in, so it's one listdir() per directory instead of a stat per file
+    listings = {} if listings is None else listings
+    # Path-anise our args.files:
+    listof_integ_files = list(Path(x).resolve() for x in (args.files if files is None else files))
+    for integ_file in listof_integ_files:
+        start = time.perf_counter()
+        if not integ_file.is_file():
+            sys.exit(f"Integrity file does not exist: {integ_file}")
+        members = integfile_members(integ_file)
+        for member in members:
+            if file_stats is not None:
+                file_stats[(integ_file, member)] = new_stats()
+                file_stats[(integ_file, member)]["Detect_Seconds"] = (time.perf_counter() - start) / len(members)
+
+            if cache is not None:
+                # With a cache, outfiles are overwritten unless the integ file hasn't changed
+                listof_all_sources.append((integ_file, member))
+                if is_cached(cache, args, integ_file, member):
+                    print("Skipping file {} because it hasn't changed.".format(source_str(integ_file, member)))
+                else:
+                    listof_sources.append((integ_file, member))
+                continue
+
+            if check_outfile(args, integ_file, member, listings):
+                listof_sources.append((integ_file, member))
+                listof_all_sources.append((integ_file, member))
+    return listof_sources, listof_all_sources
+
+
+def check_outfile(args, integ_file: Path, member: str = None, listings: {} = None) -> bool:
+    """ Returns True if the integ file can be converted without overwriting its outfile, for find_integfiles().
+    If it can't it's skipped, but --singlefile's outfile and the shard manifest are for every file, if they
+    exist already it exits.  listings is a dict of the names in each outdir, see outfile_exists(). """
+    # Make sure outfile doesnt exist
+    if args.singlefile:
+        outfile = args.outdir / ("integ2json" + output_suffix(args))
+        if outfile.exists():
+            sys.exit("Default single-output file exists: {}".format(outfile))
+    elif args.shard_reports or args.shard_mb:
+        # Every file goes in a shard, it's the manifest of them that mustn't be there already
+        manifest = args.outdir / SHARD_MANIFEST
+        if manifest.exists():
+            sys.exit("Shard manifest exists: {}".format(manifest))
+    else:
+        outfile = default_outfile(integ_file, member, args.outdir, output_suffix(args))
+        if outfile_exists(outfile, {} if listings is None else listings):
+            print("Skipping file {} because its outfile exists: {}".format(source_str(integ_file, member), outfile))
+            return False
+    return True
+
+
+def outfile_exists(outfile: Path, listings: {}) -> bool:
+    """ Returns True if outfile exists.  listings is a dict of the names in each directory we've looked in,
+    the first time we see a directory it's listed and added to it. """
+    directory = outfile.parent
+    if directory not in listings:
+        try:
+            listings[directory] = set(os.listdir(directory))
+        except OSError:
+            listings[directory] = set()
+    return outfile.name in listings[directory]
+
+
+def make_pool(jobs: int):
+    """ Returns a process pool with jobs workers, or if jobs is 1 no pool, everything runs in this process. """
+    if jobs == 1:
+        return nullcontext()
+    from concurrent.futures import ProcessPoolExecutor
+    return ProcessPoolExecutor(max_workers=jobs or None)
+
+
+def convert_integfile(integ_file: Path, member: str, outfile: Path, args, table: {} = None, pool_map=None) -> tuple:
+    """ Converts a single integ file, writing it to outfile.
+    member is the name of the integ file inside a zip file, or None.
+    If outfile is None nothing is written, the JSON is returned instead.
+    If table is given names are deidentified as the file is parsed, see pseudonym().
+    If pool_map is given the file's databases are parsed with it, see deal_with_integfile_sections().
+    Only the databases and globals args' filters allow are parsed, see args_filters().
+    With args.errors_only only the errors are found, see scan_integfile_errors().
+    Returns (JSON or None, stats).  stats has the seconds taken, and with args.stats the rest of new_stats().
+    Safe to run in a worker process. """
+    start = time.perf_counter()
+    stats = new_stats() if args.stats else None
+    pstats_file = default_outfile(integ_file, member, args.outdir, '.pstats') if args.profile else None
+    try:
+        with profiled(pstats_file):
+            integ_json = parse_integfile(integ_file, member, outfile, args, table, pool_map, stats)
+    except NotAnIntegFile:
+        return None, {"Seconds": time.perf_counter() - start, "Skipped": "it's not an integrity file"}
+    seconds = time.perf_counter() - start
+    if stats is None:
+        return integ_json, {"Seconds": seconds}
+    stats["Seconds"] = seconds
+    stats["Output_Seconds"] = seconds - stats["Parse_Seconds"] - stats["Deidentify_Seconds"]
+    stats["Peak_RSS_MB"] = peak_rss_mb()
+    return integ_json, stats
+
+
+@contextmanager
+def profiled(pstats_file: Path = None):
+    """ Profiles the with block with cProfile, and writes it to pstats_file.  Does nothing if pstats_file is None.
+    Nothing is written if the block raises. """
+    if pstats_file is None:
+        yield
+        return
+    import cProfile
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+    profiler.dump_stats(pstats_file)
+
+
+def parse_integfile(integ_file: Path, member: str, outfile: Path, args, table: {} = None, pool_map=None,
+                    stats: {} = None) -> {}:
+    """ Parses the integ file for convert_integfile(), the way args ask, and outputs it.
+    Returns its JSON if outfile is None, otherwise None.  stats is filled in if it's given, see new_stats().
+    Raises NotAnIntegFile before there's an outfile if the header isn't an integ file's. """
+    start = time.perf_counter()
+    if_str = integfile_name(integ_file, member)
+    filters = args_filters(args)
+    if args.errors_only:
+        integfile_data = {"errors": scan_integfile_errors(integ_file, member, filters, stats)}
+    elif use_sections(integ_file, outfile, args, filters, pool_map):
+        integfile_data = deal_with_integfile_sections(integ_file, pool_map or map, args.engine, filters, stats)
+    else:
+        events = check_integfile(iter_integfile(integ_file, member, args.engine, filters, stats))
+        return output_integfile_events(if_str, events, outfile, args, table, stats)
+    if stats is not None:
+        stats["Parse_Seconds"] = time.perf_counter() - start
+    return output_integfile_data(if_str, integfile_data, outfile, args, table, stats)
+
+
+def use_sections(integ_file: Path, outfile: Path, args, filters: {} = None, pool_map=None) -> bool:
+    """ Returns True if the integ file should be parsed a database at a time, see deal_with_integfile_sections().
+    That's with a pool to spread the databases over, or a database filter, so only the sections of the databases
+     we want are read even without a pool.  Compressed files can't be split, we can't seek into them, and the
+     sections only make JSON, so not for the flat formats or --stream. """
+    return bool((pool_map or (filters and filters["database"])) and not compression_type(integ_file)
+                and args.format == 'json' and not (outfile and args.stream))
+
+
+def output_integfile_data(if_str: str, integfile_data: {}, outfile: Path, args, table: {} = None,
+                          stats: {} = None) -> {}:
+    """ Outputs the JSON of one integ file that's been parsed all at once, after deidentifying it with table if
+    it's given.  If outfile is None nothing is written, the JSON is returned instead, otherwise returns None. """
+    integ_json = {}
+    integ_json[if_str] = integfile_data
+    if args.summary:
+        summarize_integfile(integ_json[if_str], args.top)
+    if stats is not None:
+        # With errors_only there's nothing to count, it doesn't look at the globals
+        stats["Databases"] = len(integfile_data.get("databases", {}))
+        stats["Globals"] = sum(len(database_data["globals"])
+                               for database_data in integfile_data.get("databases", {}).values())
+    if table is not None:
+        deidentify_start = time.perf_counter()
+        integ_json = deidentify_json(table["method"], integ_json, table)
+        if stats is not None:
+            stats["Deidentify_Seconds"] = time.perf_counter() - deidentify_start
+    if not outfile:
+        return integ_json
+    output_to_file(integ_json, outfile, args.beautify, args.encoder, args.compress)
+    return None
+
+
+def output_integfile_events(if_str: str, events, outfile: Path, args, table: {} = None, stats: {} = None) -> {}:
+    """ Outputs the iter_integfile() events of one integ file as they're parsed, see output_integfile(), after
+    deidentifying them with table if it's given.  stats is filled in as they go by, see timed_events(). """
+    if table is not None:
+        if_str = pseudonym(table, "integfile", if_str)
+        events = deidentify_events(table, events)
+    if stats is not None:
+        events = timed_events(events, stats)
+    if args.summary:
+        events = summarize_events(events, args.top)
+    return output_integfile(if_str, events, outfile, args)
+
+
+def output_integfile(if_str: str, events, outfile: Path, args) -> {}:
+    """ Outputs the iter_integfile() events of one integ file to outfile, in args.format.
+    If outfile is None nothing is written, the JSON is returned instead, otherwise returns None. """
+    if outfile and args.format != 'json':
+        output_records_to_file(args.format, [(if_str, events)], outfile, args.encoder, args.compress)
+    elif outfile and args.stream:
+        output_stream_to_file(iter([(if_str, stream_events(events))]), outfile, args.beautify, args.encoder,
+                              args.compress)
+    else:
+        integ_json = {}
+        integ_json[if_str] = deal_with_events(events)
+        if not outfile:
+            return integ_json
+        output_to_file(integ_json, outfile, args.beautify, args.encoder, args.compress)
+    return None
+
+
+def stream_integfiles(args, listof_sources: list, table: {} = None, file_stats: {} = None) -> None:
+    """ Same as main() with singlefile, but each file is written out as it is parsed instead of held in memory.
+    With file_stats the files are written out as they're parsed, so only the parse time of each is known. """
+    outfile = args.outdir / Path("integ2json" + output_suffix(args))
+    print('Outputting to {}'.format(outfile))
+    # The ones that turned out not to be integ files
+    skipped_sources = set()
+    filters = args_filters(args)
+
+    def integ_streams():
+        for integ_file, member in listof_sources:
+            try:
+                yield integfile_stream(integ_file, member, args.engine, table,
+                                       file_stats[(integ_file, member)] if file_stats is not None else None,
+                                       args.top if args.summary else None, filters)
+            except NotAnIntegFile:
+                print("Skipping file {} because it's not an integrity file.".format(source_str(integ_file, member)))
+                skipped_sources.add((integ_file, member))
+
+    with profiled(outfile.with_suffix('.pstats') if args.profile else None):
+        if args.format != 'json':
+            output_records_to_file(args.format, integ_streams(), outfile, args.encoder, args.compress)
+        else:
+            integ_stream = ((if_str, stream_events(events)) for if_str, events in integ_streams())
+            output_stream_to_file(integ_stream, outfile, args.beautify, args.encoder, args.compress)
+    if file_stats is not None:
+        print_streamed_stats(listof_sources, skipped_sources, file_stats)
+
+
+def print_streamed_stats(listof_sources: list, skipped_sources: set, file_stats: {}) -> None:
+    """ Finishes and prints the file_stats of files that were streamed, see stream_integfiles().
+    Their output was written as they were parsed, so output is whatever of the time wasn't parsing. """
+    for integ_file, member in listof_sources:
+        if (integ_file, member) in skipped_sources:
+            continue
+        stats = file_stats[(integ_file, member)]
+        stats["Output_Seconds"] = stats["Seconds"] - stats["Parse_Seconds"]
+        stats["Peak_RSS_MB"] = peak_rss_mb()
+        print(f'Streamed {source_str(integ_file, member)}')
+        print_stats(stats)
+
+
+# Where --shard-reports/--shard-mb put the shards and the manifest of them, in outdir
+SHARD_DIR = "integ2json_shards"
+SHARD_MANIFEST = "integ2json_manifest.json"
+
+
+def shard_integfiles(args, listof_sources: list, table: {} = None, file_stats: {} = None) -> None:
+    """ Batch mode for a fleet of servers.  The integ files are grouped by the System_Name and System_Instance in
+    their headers, and each group is written to shards of at most args.shard_reports files or args.shard_mb MB,
+    see shard_sources().  Each file is streamed into its shard as it's parsed, the same as stream_integfiles(), so
+    memory use doesn't grow with the number of files.  A shard has the same layout as --singlefile's outfile.
+    The manifest of the shards says which one each file is in:
+        {"Shards": [{"File": "integ2json_shards/SYS_CACHE_00000.json", "System_Name": "SYS",
+                     "System_Instance": "CACHE", "Reports": 2}, ...],
+         "Reports": [{"Name": "INTEG.txt", "Source": "/path/INTEG.txt", "System_Name": "SYS",
+                      "System_Instance": "CACHE", "Start_Date": "01/01/2199", "Start_Time": "00:00:00", "Shard": 0}, ...]}
+    With table the names are deidentified, and there's no Source. """
+    (args.outdir / SHARD_DIR).mkdir(exist_ok=True)
+    max_bytes = int(args.shard_mb * 1024 ** 2) if args.shard_mb else None
+    # The ones that turned out not to be integ files
+    skipped_sources = set()
+    groups = group_integfiles(listof_sources, table, skipped_sources)
+    manifest = {"Shards": [], "Reports": []}
+    for (system, instance), group in sorted(groups.items()):
+        sources = iter(group)
+        # The next file to put in a shard, see shard_sources().  Groups are never empty.
+        pending = [next(sources)]
+        while pending:
+            shard_number = len(manifest["Shards"])
+            shard_file = args.outdir / SHARD_DIR / "{}_{:05}{}".format(
+                re.sub(r'[^\w.-]+', '_', "{}_{}".format(system, instance)), shard_number, output_suffix(args))
+            manifest["Shards"].append({"File": shard_file.relative_to(args.outdir).as_posix(), "System_Name": system,
+                                       "System_Instance": instance, "Reports": 0})
+            with open_outfile(shard_file, args.compress, text=args.format == 'csv') as file:
+                streams = shard_streams(args, shard_sources(sources, pending, file, args.shard_reports, max_bytes),
+                                        manifest, shard_number, table, file_stats, skipped_sources)
+                write_integ_streams(args, streams, file)
+            print("Wrote {} integ files to {}".format(manifest["Shards"][shard_number]["Reports"], shard_file))
+    save_shard_manifest(args.outdir, manifest)
+    if file_stats is not None:
+        print_streamed_stats(listof_sources, skipped_sources, file_stats)
+
+
+def group_integfiles(listof_sources: list, table: {} = None, skipped_sources: set = None) -> {}:
+    """ Groups the integ files by their System_Name and System_Instance, for shard_integfiles().  Only their headers
+    are read.  Returns {(system, instance): [(integ_file, member, profile), ...]}, in the order they were given.
+    The profiles are deidentified with table if it's given.  The ones that aren't integ files are added to
+    skipped_sources. """
+    groups = {}
+    for integ_file, member in listof_sources:
+        profile = integfile_header(integ_file, member)
+        if profile is None:
+            print("Skipping file {} because it's not an integrity file.".format(source_str(integ_file, member)))
+            if skipped_sources is not None:
+                skipped_sources.add((integ_file, member))
+            continue
+        if table is not None:
+            profile = deidentify_profile(table, profile)
+        groups.setdefault((profile["System_Name"], profile["System_Instance"]), []).append((integ_file, member, profile))
+    return groups
+
+
+def shard_streams(args, sources, manifest: {}, shard_number: int, table: {} = None, file_stats: {} = None,
+                  skipped_sources: set = None):
+    """ Yields (integ_name, events) of the (integ_file, member, profile) sources in shard shard_number, see
+    integfile_stream(), and adds each one to the manifest as it goes.  See shard_integfiles(). """
+    filters = args_filters(args)
+    for integ_file, member, profile in sources:
+        try:
+            if_str, events = integfile_stream(integ_file, member, args.engine, table,
+                                              file_stats[(integ_file, member)] if file_stats is not None else None,
+                                              args.top if args.summary else None, filters)
+        except NotAnIntegFile:
+            print("Skipping file {} because it's not an integrity file.".format(source_str(integ_file, member)))
+            if skipped_sources is not None:
+                skipped_sources.add((integ_file, member))
+            continue
+        report = {"Name": if_str, "Source": source_str(integ_file, member)}
+        if table is not None:
+            del report["Source"]
+        report.update({field: profile.get(field) for field in
+                       ("System_Name", "System_Instance", "Start_Date", "Start_Time")})
+        report["Shard"] = shard_number
+        manifest["Reports"].append(report)
+        manifest["Shards"][shard_number]["Reports"] += 1
+        yield if_str, events
+
+
+def write_integ_streams(args, integ_streams, file) -> None:
+    """ Writes (integ_name, events) integ_streams to an open outfile in args.format, ie: a shard. """
+    if args.format != 'json':
+        write_records(args.format, integ_streams, file, args.encoder)
+    else:
+        integ_stream = ((if_str, stream_events(events)) for if_str, events in integ_streams)
+        write_json_stream(file, integ_stream, json_encoder(args.encoder, args.beautify))
+
+
+def save_shard_manifest(outdir: Path, manifest: {}) -> None:
+    """ Writes the manifest of the shards to outdir, see shard_integfiles(). """
+    # Written next to the real one and swapped in, same as save_cache()
+    tmpfile = outdir / (SHARD_MANIFEST + ".tmp")
+    with open(tmpfile, 'w') as fp:
+        json.dump(manifest, fp, indent=4)
+    os.replace(tmpfile, outdir / SHARD_MANIFEST)
+    print('Wrote the manifest of {} shards to {}'.format(len(manifest["Shards"]), outdir / SHARD_MANIFEST))
+
+
+def shard_sources(sources, pending: list, file, max_reports: int = None, max_bytes: int = None):
+    """ Yields the (integ_file, member, profile) in pending, then sources, until the shard is full: it has max_reports
+    files, or max_bytes have been written to its file, or the next file has the same name as one that's already in it
+    (a shard is keyed on the names).  The one that doesn't fit is put back in pending, for the next shard.
+    The bytes are checked between files, so a shard goes over max_bytes by the last file in it.  With gzip they're
+    the bytes before they're compressed. """
+    names = set()
+    for source in chain([pending.pop()], sources):
+        name = integfile_name(source[0], source[1])
+        if names and (len(names) == max_reports or name in names
+                      or (max_bytes and file.tell() >= max_bytes)):
+            pending.append(source)
+            return
+        names.add(name)
+        yield source
+
+
+def integfile_stream(integ_file: Path, member: str = None, engine: str = 'text', table: {} = None,
+                     stats: {} = None, top: int = None, filters: {} = None) -> tuple:
+    """ Returns (integ_name, iter_integfile() events), deidentified with table if it's given.
+    If stats is given the time spent parsing, and the bytes and lines read, are added to it, see timed_events().
+    If top is given there are summaries with that many globals in each list, see summarize_events().
+    filters are the databases and globals to parse, see new_filters().
+    Raises NotAnIntegFile if it isn't one. """
+    if_str = integfile_name(integ_file, member)
+    events = check_integfile(iter_integfile(integ_file, member, engine, filters, stats))
+    if table is not None:
+        if_str = pseudonym(table, "integfile", if_str)
+        events = deidentify_events(table, events)
+    if stats is not None:
+        events = timed_events(events, stats)
+    if top is not None:
+        events = summarize_events(events, top)
+    return if_str, events
+
+
+def new_stats() -> {}:
+    """ Returns the empty --stats of an integ file.  The phases are:
+        Detect_Seconds      finding it, ie: listing the zip file it's in, see find_integfiles()
+        Parse_Seconds       reading and parsing it, including deidentifying unless it's done afterwards
+        Deidentify_Seconds  deidentifying the JSON afterwards, ie: with --split
+        Output_Seconds      building the JSON and writing it out
+    Seconds is the total, without Detect_Seconds.  Bytes and Lines are how much of the uncompressed integ file
+     was read, counted as it's parsed, see CountingReader and count_buffer().
+    Peak_RSS_MB is the peak memory of the process that converted it, so far. """
+    return {"Seconds": 0.0, "Detect_Seconds": 0.0, "Parse_Seconds": 0.0, "Deidentify_Seconds": 0.0,
+            "Output_Seconds": 0.0, "Bytes": 0, "Lines": 0, "Databases": 0, "Globals": 0, "Peak_RSS_MB": None}
+
+
+def timed_events(events, stats: {}):
+    """ Passes iter_integfile() events through, adding the time spent making them and how many there are to stats.
+    Seconds gets the time from the first event to the last, including whatever the consumer did with them.
+    It's a couple of clock reads per global, cheap enough to leave on. """
+    clock = time.perf_counter
+    parse_seconds = 0.0
+    start = first = clock()
+    try:
+        for event in events:
+            parse_seconds += clock() - start
+            if event[0] == "global":
+                stats["Globals"] += 1
+            elif event[0] == "database":
+                stats["Databases"] += 1
+            yield event
+            start = clock()
+        parse_seconds += clock() - start
+    finally:
+        stats["Parse_Seconds"] += parse_seconds
+        stats["Seconds"] += clock() - first
+
+
+def peak_rss_mb() -> float:
+    """ Returns the peak resident memory of this process so far in MB, or None if we can't tell. """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux gives kb, macOS gives bytes
+    if sys.platform == 'darwin':
+        return peak / (1024 ** 2)
+    return peak / 1024
+
+
+def print_stats(stats: {}) -> None:
+    """ Prints the --stats of an integ file, see new_stats(). """
+    seconds = max(stats["Seconds"], 1e-6)
+    parse_seconds = max(stats["Parse_Seconds"], 1e-6)
+    peak_rss = "{:.1f} MB".format(stats["Peak_RSS_MB"]) if stats["Peak_RSS_MB"] is not None else "unknown"
+    print(f'    detect {stats["Detect_Seconds"]:.3f}s, parse {stats["Parse_Seconds"]:.3f}s, '
+          f'deidentify {stats["Deidentify_Seconds"]:.3f}s, output {stats["Output_Seconds"]:.3f}s, '
+          f'total {stats["Seconds"]:.3f}s')
+    print(f'    {stats["Bytes"]:,} bytes, {stats["Lines"]:,} lines ({stats["Lines"] / seconds:,.0f} lines/s), '
+          f'{stats["Databases"]:,} databases ({stats["Databases"] / parse_seconds:,.1f}/s), '
+          f'{stats["Globals"]:,} globals ({stats["Globals"] / parse_seconds:,.0f}/s), peak RSS {peak_rss}')
+
+
+# Where the conversion cache lives in the outdir, see load_cache()
+CACHE_MANIFEST = "integ2json_cache.json"
+CACHE_DIR = "integ2json_cache"
+
+
+def load_cache(outdir: Path) -> {}:
+    """ Loads the conversion cache manifest from outdir, or returns a new empty one.
+    The manifest remembers each integ file we've converted, keyed on its path (and member):
+        {"files": {"/path/INTEG.txt": {"Size": 123, "Mtime_ns": 456, "Digest": "sha256",
+                                        "Outfile": "/outdir/INTEG.json", "Options": {...},
+                                        "Cached_JSON": "integ2json_cache/abc.json"}}}
+    Cached_JSON is only there for singlefile, it's the file's JSON so we don't have to parse it again. """
+    try:
+        with open(outdir / CACHE_MANIFEST, 'r') as fp:
+            cache = json.load(fp)
+    except FileNotFoundError:
+        cache = {}
+    except ValueError:
+        print("Ignoring unreadable cache manifest: {}".format(outdir / CACHE_MANIFEST))
+        cache = {}
+    cache.setdefault("files", {})
+    return cache
+
+
+def save_cache(outdir: Path, cache: {}) -> None:
+    """ Writes the conversion cache manifest to outdir. """
+    # Write it next to the real one and swap it in, so a crash can't leave half a manifest
+    tmpfile = outdir / (CACHE_MANIFEST + ".tmp")
+    with open(tmpfile, 'w') as fp:
+        json.dump(cache, fp)
+    os.replace(tmpfile, outdir / CACHE_MANIFEST)
+
+
+def cache_key(integ_file: Path, member: str = None) -> str:
+    """ Returns the key of the integ file in the cache manifest. """
+    return source_str(integ_file, member)
+
+
+def cache_options(args) -> {}:
+    """ Returns the args that change what's in an outfile.  If any of them change the file is converted again. """
+    return {"deidentify": args.deidentify, "beautify": args.beautify, "stream": args.stream, "format": args.format,
+            "summary": args.summary, "encoder": args.encoder, "compress": args.compress, "errors_only": args.errors_only,
+            "filters": [args.databases, args.exclude_databases, args.glbls, args.exclude_glbls]}
+
+
+def is_cached(cache: {}, args, integ_file: Path, member: str = None) -> bool:
+    """ Returns True if the integ file hasn't changed since it was converted, and its output is still there.
+    If the size and mtime are the same that's all we check, otherwise we compare the digest of its contents. """
+    entry = cache["files"].get(cache_key(integ_file, member))
+    if not entry or entry.get("Options") != cache_options(args):
+        return False
+    if args.singlefile:
+        if not (entry.get("Cached_JSON") and (args.outdir / entry["Cached_JSON"]).exists()):
+            return False
+    else:
+        outfile = default_outfile(integ_file, member, args.outdir, output_suffix(args))
+        if entry.get("Outfile") != str(outfile.resolve()) or not outfile.exists():
+            return False
+    stat = integ_file.stat()
+    if entry["Size"] == stat.st_size and entry["Mtime_ns"] == stat.st_mtime_ns:
+        return True
+    if entry["Size"] == stat.st_size and entry["Digest"] == file_digest(integ_file):
+        # Touched but not changed, remember the new mtime so we don't digest it again next time
+        entry["Mtime_ns"] = stat.st_mtime_ns
+        return True
+    return False
+
+
+def update_cache(cache: {}, args, integ_file: Path, member: str, file_json: {}) -> None:
+    """ Remembers the integ file we just converted in the cache.  file_json is its JSON, for singlefile. """
+    import hashlib
+    stat = integ_file.stat()
+    entry = {
+        "Size": stat.st_size,
+        "Mtime_ns": stat.st_mtime_ns,
+        "Digest": file_digest(integ_file),
+        "Options": cache_options(args)
+    }
+    if file_json is None:
+        entry["Outfile"] = str(default_outfile(integ_file, member, args.outdir, output_suffix(args)).resolve())
+    else:
+        (args.outdir / CACHE_DIR).mkdir(exist_ok=True)
+        cached_json = Path(CACHE_DIR) / (hashlib.sha256(cache_key(integ_file, member).encode()).hexdigest() + ".json")
+        output_to_file(file_json, args.outdir / cached_json, beautify=False)
+        entry["Cached_JSON"] = cached_json.as_posix()
+    cache["files"][cache_key(integ_file, member)] = entry
+
+
+def load_cached_json(cache: {}, outdir: Path, integ_file: Path, member: str = None) -> {}:
+    """ Returns the JSON of an integ file we converted in an earlier run. """
+    entry = cache["files"][cache_key(integ_file, member)]
+    with open(outdir / entry["Cached_JSON"], 'r') as fp:
+        return json.load(fp)
+
+
+def file_digest(file: Path) -> str:
+    """ Returns the sha256 of the file's contents, read a chunk at a time. """
+    import hashlib
+    digest = hashlib.sha256()
+    with open(file, 'rb') as fp:
+        for chunk in iter(lambda: fp.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def integfile_name(integ_file: Path, member: str = None) -> str:
+    """ Returns the name of the integ file as it's used in the JSON.
+    eg: /path/INTEG.txt, /path/INTEG.txt.gz and INTEG.txt inside /path/INTEG.zip are all 'INTEG.txt'
+    It's worked out from the name alone, so it can be called for every file without opening it. """
+    if member:
+        return PurePosixPath(member).name
+    if integ_file.suffix == '.gz':
+        return integ_file.stem
+    return str(integ_file.name)
+
+
+def default_outfile(integ_file: Path, member: str = None, outdir: Path = None, suffix: str = '.json') -> Path:
+    """ Returns where the JSON of the integ file goes, next to the integ file unless outdir is set.
+    suffix is the suffix of the output format, see FORMAT_SUFFIX. """
+    outfile = integ_file.with_name(integfile_name(integ_file, member)).with_suffix(suffix)
+    if outdir:
+        outfile = outdir / outfile.name
+    return outfile
+
+
+def source_str(integ_file: Path, member: str = None) -> str:
+    """ Returns the integ file for printing, including the member if it's inside a zip. """
+    if member:
+        return "{}:{}".format(integ_file, member)
+    return str(integ_file)
+
+
+def is_integfile(integ_file: Path, member: str = None) -> bool:
+    """ Checks to see if supplied integ_file is an Intersystems Cache integrity file.
+    Returns True/False.  Converting doesn't need this, the header is checked as it's parsed, see iter_integfile(). """
+    try:
+        with open_integfile(integ_file, member) as fp:
+            return sniff_integfile(fp.buffer.peek(INTEG_HEADER_PEEK))
+    except Exception as e:
+        if getattr(e, 'errno', None) == errno.ENOENT:
+            sys.exit(f"Integrity file does not exist: {integ_file}")
+        else:
+            sys.exit(f"Failed to check status of integrity file: {integ_file}")
+
+
+def integfile_header(integ_file: Path, member: str = None) -> {}:
+    """ Returns the starting profile of the integ file, from its header (see deal_with_header()), without reading the
+    rest of it.  Returns None if it isn't an integ file. """
+    with open_integfile(integ_file, member) as fp:
+        if not sniff_integfile(fp.buffer.peek(INTEG_HEADER_PEEK)):
+            return None
+        return deal_with_header(fp, integ_file)
+
+
+class NotAnIntegFile(Exception):
+    """ Raised by iter_integfile() when the file doesn't start like an integ file, see sniff_integfile(). """
+
+
+# How many bytes to peek at to check the header, the first line is about 60
+INTEG_HEADER_PEEK = 256
+
+
+def sniff_integfile(head: bytes) -> bool:
+    """ Returns True if head, the first bytes of a file, starts like an integ file.
+    The top line should match something like:
+        Cache Database Integrity Check on 11/04/2018 at 19:00:01
+    This seems like a TERRIBLE way of ensuring it's a Cache integrity file but I have only bad ideas. """
+    top_line = head.split(b'\n', 1)[0]
+    try:
+        top_line = top_line.decode(locale.getpreferredencoding(False)).split()
+    except UnicodeDecodeError:
+        return False
+    return ' '.join(top_line[0:5]) == 'Cache Database Integrity Check on'
+
+
+def check_integfile(events):
+    """ Starts iter_integfile() events, so NotAnIntegFile is raised now instead of when they're first used,
+    ie: after the outfile is opened.  Returns the events. """
+    first_event = next(events)
+    return chain([first_event], events)
+
+
+# The first bytes of the compressed files we can read
+COMPRESSED_MAGIC = {
+    b'\x1f\x8b': 'gzip',
+    b'PK\x03\x04': 'zip'
+}
+
+
+def compression_type(file: Path, fp=None) -> str:
+    """ Returns 'gzip' or 'zip' if file is a supported compressed file, else ''.
+    Checks the magic number at the start of the file, not the suffix.
+    If fp is given it's a buffered binary file of file to peek at, instead of opening it again. """
+    if fp is None:
+        try:
+            with open(file, 'rb') as fp:
+                magic = fp.read(4)
+        except OSError:
+            return ''
+    else:
+        magic = fp.peek(4)[:4]
+    for compressed_magic, filetype in COMPRESSED_MAGIC.items():
+        if magic.startswith(compressed_magic):
+            return filetype
+    return ''
+
+
+def integfile_members(integ_file: Path) -> list:
+    """ Returns the members of the integ file to convert: the files inside it if it's a zip file, or [None] for the
+    file itself.  Whatever it's called, it's a zip file if it starts like one, see compression_type(). """
+    if compression_type(integ_file) == 'zip':
+        return zip_members(integ_file)
+    return [None]
+
+
+def zip_members(zip_file: Path) -> list:
+    """ Returns the names of the files inside the zip file, in the order they were stored. """
+    import zipfile
+    with zipfile.ZipFile(zip_file) as zf:
+        return [info.filename for info in zf.infolist() if not info.is_dir()]
+
+
+@contextmanager
+def open_integfile(integ_file: Path, member: str = None, stats: {} = None):
+    """ Opens the integ file for reading text, like open(integ_file, 'r').
+    gzip and zip files are read straight out of the compressed file, without extracting them.
+    member is the file to read inside a zip file, if it's None the first file is read.
+    If stats is given the bytes and lines read are added to it as they're read, see CountingReader. """
+    with ExitStack() as stack:
+        fp = stack.enter_context(open(integ_file, 'rb'))
+        filetype = compression_type(integ_file, fp)
+        if filetype == 'gzip':
+            import gzip
+            fp = stack.enter_context(gzip.GzipFile(fileobj=fp, mode='rb'))
+        elif filetype == 'zip':
+            import zipfile
+            zf = stack.enter_context(zipfile.ZipFile(fp))
+            if member is None:
+                member = next(info.filename for info in zf.infolist() if not info.is_dir())
+            fp = stack.enter_context(zf.open(member))
+        if stats is not None:
+            fp = CountingReader(fp, stats)
+        yield stack.enter_context(io.TextIOWrapper(fp))
+
+
+class CountingReader(io.BufferedIOBase):
+    """ Reads a binary file, adding the (uncompressed) bytes and lines that are read through it to stats, so
+    --stats doesn't have to read the file again to count them.  It's a chunk at a time, ie: as TextIOWrapper
+    reads them, so it's a count of what's been read, which is the whole file unless parsing it stopped early. """
+
+    def __init__(self, fp, stats: {}):
+        super().__init__()
+        self.fp = fp
+        self.stats = stats
+
+    def readable(self) -> bool:
+        return True
+
+    def peek(self, size: int = 0) -> bytes:
+        return self.fp.peek(size)
+
+    def read(self, size: int = -1) -> bytes:
+        return self.counted(self.fp.read(size))
+
+    def read1(self, size: int = -1) -> bytes:
+        return self.counted(self.fp.read1(size))
+
+    def counted(self, chunk: bytes) -> bytes:
+        self.stats["Bytes"] += len(chunk)
+        self.stats["Lines"] += chunk.count(b'\n')
+        return chunk
+
+
+def deidentify_json(deIdentifyMethod: str, integ_json: {}, table: {} = None) -> {}:
+    """ Takes given JSON, de-identifies any private data, such as Database and Global Names, returns JSON.
+    Names are looked up in table, see pseudonym(), a new one is used if it isn't given. """
+    # If we are deIdentifying data, there are two main ways: hash and 'tags' ?
+    #   - hash replaces them with a hashed version of the string.
+    #    - Tags replaces the values with an iterator, like database1, global1 etc
+    # Protecting GDPR Personal Data with Pseudonymization:
+    #   https://www.elastic.co/blog/gdpr-personal-data-pseudonymization-part-1
+    if table is None:
+        table = new_pseudonym_table(deIdentifyMethod)
+    deidentified_json = {}
+    for integfile, integfile_data in integ_json.items():
+        # Same order as deidentify_events(), so generic pseudonyms are the same either way
+        integfileDeIdent = pseudonym(table, "integfile", integfile)
+        deidentified_json[integfileDeIdent] = deidentify_integfile(table, integfile_data)
+    return deidentified_json
+
+
+def deidentify_integfile(table: {}, integfile_data: {}) -> {}:
+    """ De-identifies the deal_with_integfile() JSON of one integ file, returns a new dict. """
+    deidentified_data = {}
+    for key, value in integfile_data.items():
+        if key == "databases":
+            value = {pseudonym(table, "database", database):
+                     deidentify_database(table, database_data) for database, database_data in value.items()}
+        elif key == "errors":
+            value = {pseudonym(table, "database", database): deidentify_errors(table, errors)
+                     for database, errors in value.items()}
+        elif key == "profile":
+            value = deidentify_profile(table, value)
+        elif key == "summary":
+            value = deidentify_summary(table, value)
+        deidentified_data[key] = value
+    return deidentified_data
+
+
+def deidentify_database(table: {}, database_data: {}) -> {}:
+    """ De-identifies the JSON of one database, returns a new dict. """
+    deidentified_data = {}
+    for key, value in database_data.items():
+        if key == "globals":
+            value = {pseudonym(table, "global", glbl): glbl_data for glbl, glbl_data in value.items()}
+        elif key == "errors":
+            value = deidentify_errors(table, value)
+        elif key == "summary":
+            value = deidentify_summary(table, value)
+        deidentified_data[key] = value
+    return deidentified_data
+
+
+def deidentify_errors(table: {}, errors: {}) -> {}:
+    """ De-identifies errors, in the form {'global': 'error text'}.  The error text is kept as is. """
+    return {pseudonym(table, "global", glbl): error for glbl, error in errors.items()}
+
+
+def deidentify_summary(table: {}, summary: {}) -> {}:
+    """ De-identifies the globals listed in a summary, see summarize_events(), returns a new dict. """
+    summary = dict(summary)
+    for key in SUMMARY_LISTS:
+        summary[key] = [dict(entry, Database=pseudonym(table, "database", entry["Database"]),
+                             Global=pseudonym(table, "global", entry["Global"])) for entry in summary[key]]
+    return summary
+
+
+def deidentify_profile(table: {}, profile: {}) -> {}:
+    """ De-identifies the System_Name and System_Instance of a profile, returns a new dict. """
+    profile = dict(profile)
+    if "System_Name" in profile:
+        profile["System_Name"] = pseudonym(table, "SystemName", profile["System_Name"])
+    if "System_Instance" in profile:
+        profile["System_Instance"] = pseudonym(table, "SystemInstance", profile["System_Instance"])
+    return profile
+
+
+def deidentify_events(table: {}, events):
+    """ De-identifies iter_integfile() events as they are parsed, so there's no JSON to walk afterwards. """
+    for event, database, name, values in events:
+        if database is not None:
+            database = pseudonym(table, "database", database)
+        if event == "global":
+            name = pseudonym(table, "global", name)
+        elif event == "errors":
+            values = deidentify_errors(table, values)
+        elif event == "profile":
+            values = deidentify_profile(table, values)
+        elif event == "summary":
+            values = deidentify_summary(table, values)
+        yield (event, database, name, values)
+
+
+# The kinds of names that get a pseudonym, see pseudonym()
+PSEUDONYM_KINDS = ["integfile", "SystemName", "SystemInstance", "database", "global"]
+
+
+def new_pseudonym_table(deIdentifyMethod: str) -> {}:
+    """ Returns an empty pseudonym table, in the form:
+        {"method": "generic", "integfile": {"INTEG.txt": "integfile_0"}, "database": {...}, "global": {...}, ...}
+    """
+    table = {"method": deIdentifyMethod}
+    for kind in PSEUDONYM_KINDS:
+        table[kind] = {}
+    return table
+
+
+def pseudonym(table: {}, kind: str, name: str) -> str:
+    """ Returns the pseudonym of a name, ie: global_3, making a new one the first time the name is seen.
+    hash gives the same pseudonym for a name everywhere, generic numbers them in the order they're seen.
+    Either way the same global has the same pseudonym in every database and file that uses the table. """
+    names = table[kind]
+    try:
+        return names[name]
+    except KeyError:
+        pass
+    if table["method"] == "hash":
+        names[name] = kind + "_" + hash_string(name)
+    else:
+        names[name] = kind + "_" + str(len(names))
+    return names[name]
+
+
+def load_pseudonym_table(pseudonym_file: Path, deIdentifyMethod: str) -> {}:
+    """ Loads the pseudonym table saved by an earlier run, so names keep the same pseudonyms.
+    Returns a new empty table if there isn't one yet. """
+    table = new_pseudonym_table(deIdentifyMethod)
+    try:
+        with open(pseudonym_file, 'r') as fp:
+            saved_table = json.load(fp)
+    except FileNotFoundError:
+        return table
+    except (OSError, ValueError) as e:
+        sys.exit("Can't read pseudonym table {}: {}.  Exiting...".format(pseudonym_file, e))
+    if saved_table.get("method") != deIdentifyMethod:
+        sys.exit("Pseudonym table {} was made with deidentify {}, not {}.  Exiting..."
+                 .format(pseudonym_file, saved_table.get("method"), deIdentifyMethod))
+    for kind in PSEUDONYM_KINDS:
+        table[kind].update(saved_table.get(kind, {}))
+    return table
+
+
+def save_pseudonym_table(pseudonym_file: Path, table: {}) -> None:
+    """ Saves the pseudonym table, see load_pseudonym_table(). """
+    # Write it next to the real one and swap it in, so a crash can't leave half a table
+    tmpfile = pseudonym_file.with_name(pseudonym_file.name + ".tmp")
+    with open(tmpfile, 'w') as fp:
+        json.dump(table, fp, indent=4)
+    os.replace(tmpfile, pseudonym_file)
+
+
+def hash_string(string: str) -> str:
+    """ Returns a hash of the given string. """
+    # Salt Generation and open source software
+    #  https://stackoverflow.com/questions/1645161/salt-generation-and-open-source-software/1645190#1645190
+    # md5 and sha256 have collission attacks, but that's ok for this context.
+    #  Collisions (probably) don't leak data.
+    import hashlib
+    if "md5" in hashlib.algorithms_guaranteed:
+        hash = "md5"
+    elif "sha512" in hashlib.algorithms_guaranteed:
+        hash = "sha512"
+    elif "sha256" in hashlib.algorithms_guaranteed:
+        hash = "sha256"
+    else:
+        sys.exit("No acceptable hash in hashlib.")
+
+    salt = "nA8UvBjWa8"  # salt from random.org password generator
+    h = hashlib.new(hash)
+    h.update((string + salt).encode())
+    return str(h.hexdigest())
+
+
+def output_to_file(integ_json: dict, outfile: Path, beautify: bool, encoder: str = 'json', compress: str = None) -> None:
+    """ Outputs JSON to a file.
+    encoder is the JSON encoder to use, see json_encoder().  compress is None, 'gzip' or 'zstd', see open_outfile(). """
+    # It's encoded in one go and written out in big chunks, json.dump() would write it a few bytes at a time
+    dumps = json_encoder(encoder, beautify)["dumps"]
+    with open_outfile(outfile, compress) as file:
+        # nb: beautify significantly increases the size of the output file
+        file.write(dumps(integ_json))
+
+
+# The JSON encoders we can use, see json_encoder()
+JSON_ENCODERS = ['auto', 'orjson', 'ujson', 'json']
+# The optional modules that have been looked for, see optional_module()
+OPTIONAL_MODULES = {}
+
+
+def optional_module(name: str):
+    """ Returns the module called name, or None if it isn't installed, ie: orjson, ujson or zstandard.
+    It's only imported the first time it's needed, so a run that doesn't use it doesn't pay for loading it. """
+    if name not in OPTIONAL_MODULES:
+        try:
+            OPTIONAL_MODULES[name] = __import__(name)
+        except ImportError:
+            OPTIONAL_MODULES[name] = None
+    return OPTIONAL_MODULES[name]
+
+
+def json_encoder(name: str = 'json', beautify: bool = False) -> {}:
+    """ Returns the JSON encoder called name, as a dict of how it writes JSON:
+        {"name": "orjson", "dumps": function(value) -> bytes, "indent": None, "item_sep": b",", "key_sep": b":"}
+    json, the stdlib, is the default, so the output is byte for byte what it's always been.  The others have to be
+     asked for: auto is the fastest one that's installed, orjson, then ujson, then json.
+    orjson and ujson only write compact JSON, without spaces after the , and :, but the keys are the same and in the
+     same order.  ujson escapes non-ASCII like json does, orjson can't, it writes it as UTF-8.
+    beautify is always the stdlib json, so it's sorted and indented the way it always has been. """
+    if beautify:
+        name = 'json'
+    elif name == 'auto':
+        name = 'orjson' if optional_module('orjson') else 'ujson' if optional_module('ujson') else 'json'
+    if name == 'orjson':
+        orjson = optional_module('orjson')
+        if orjson is None:
+            sys.exit("The orjson encoder is not installed.  Exiting...")
+        return {"name": name, "dumps": orjson.dumps, "indent": None, "item_sep": b',', "key_sep": b':'}
+    if name == 'ujson':
+        ujson = optional_module('ujson')
+        if ujson is None:
+            sys.exit("The ujson encoder is not installed.  Exiting...")
+
+        def dumps(value) -> bytes:
+            # ujson escapes / by default, which is every character of a database's directory
+            return ujson.dumps(value, ensure_ascii=True, escape_forward_slashes=False).encode()
+        return {"name": name, "dumps": dumps, "indent": None, "item_sep": b',', "key_sep": b':'}
+    indent = 4 if beautify else None
+
+    def dumps(value) -> bytes:
+        return json.dumps(value, indent=indent, sort_keys=beautify).encode()
+    return {"name": 'json', "dumps": dumps, "indent": indent, "item_sep": b', ', "key_sep": b': '}
+
+
+# The suffix added to outfiles by each kind of compression, see open_outfile()
+COMPRESS_SUFFIX = {
+    'gzip': '.gz',
+    'zstd': '.zst'
+}
+# Outfiles are written out this many bytes at a time
+OUTPUT_BUFFER_SIZE = 1024 * 1024
+
+
+@contextmanager
+def open_outfile(outfile: Path, compress: str = None, text: bool = False):
+    """ Opens outfile for writing bytes, through a big buffer, or for writing text (csv) if text is True.
+    compress is None, or 'gzip' or 'zstd' to compress it as it's written, see COMPRESS_SUFFIX. """
+    with ExitStack() as stack:
+        fp = stack.enter_context(open(outfile, 'wb', buffering=OUTPUT_BUFFER_SIZE))
+        if compress == 'gzip':
+            import gzip
+            # Level 6 is most of the compression of 9 in much less time
+            fp = stack.enter_context(gzip.GzipFile(fileobj=fp, mode='wb', compresslevel=6))
+        elif compress == 'zstd':
+            zstandard = optional_module('zstandard')
+            if zstandard is None:
+                sys.exit("zstd compression needs the zstandard module, it is not installed.  Exiting...")
+            fp = stack.enter_context(zstandard.ZstdCompressor().stream_writer(fp, closefd=False))
+        if text:
+            fp = stack.enter_context(io.TextIOWrapper(fp, newline=''))
+        yield fp
+
+
+def output_suffix(args) -> str:
+    """ Returns the suffix of the outfiles, ie: .json, or .json.gz with --compress gzip. """
+    return FORMAT_SUFFIX[args.format] + COMPRESS_SUFFIX.get(args.compress, '')
+
+
+def output_events_to_file(integ_name: str, events, file) -> None:
+    """ Outputs iter_integfile() events to a file as newline delimited JSON, one line per event.
+    Each line is written out as soon as it's ready, see event_to_record(). """
+    for event in events:
+        file.write(json.dumps(event_to_record(integ_name, event)) + '\n')
+        file.flush()
+
+
+# The suffix of each output format's files
+FORMAT_SUFFIX = {
+    'json': '.json',
+    'ndjson': '.ndjson',
+    'csv': '.csv'
+}
+# The columns of the csv format.  There's a row per level of each global, ie: Data_Level, Big_Strings, Total
+#  and a row per field of each database's totals, ie: Pointer_Level, Free
+# Blocks, Size_KB, Percent_Full and Big_Strings_Count are ints, Elapsed_Seconds is a float, the rest are strings.
+#  Empty means there's no value, ie: totals only have Blocks.
+CSV_COLUMNS = ["Record", "File", "Database", "Global", "Level", "Blocks", "Size_KB", "Percent_Full",
+               "Big_Strings_Count", "Elapsed_Seconds", "End_Date", "End_Time"]
+
+
+def output_records_to_file(file_format: str, integ_streams, outfile: Path, encoder: str = 'json',
+                           compress: str = None) -> None:
+    """ Outputs the globals and database totals of integ files to a flat file, as they're parsed.
+    integ_streams is an iterator of (integ_name, iter_integfile() events).
+    file_format is 'ndjson' for a line of JSON per global/total (see event_to_record()), or 'csv' (see CSV_COLUMNS).
+    encoder and compress are the same as output_to_file(). """
+    with open_outfile(outfile, compress, text=file_format == 'csv') as file:
+        write_records(file_format, integ_streams, file, encoder)
+
+
+def write_records(file_format: str, integ_streams, file, encoder: str = 'json') -> None:
+    """ Writes the records of output_records_to_file() to a file, a text file for csv or a binary one for ndjson. """
+    import csv
+    if file_format == 'csv':
+        writer = csv.writer(file)
+        writer.writerow(CSV_COLUMNS)
+        for integ_name, events in integ_streams:
+            for event in events:
+                writer.writerows(event_to_rows(integ_name, event))
+    else:
+        dumps = json_encoder(encoder)["dumps"]
+        for integ_name, events in integ_streams:
+            for event in events:
+                if event[0] in ("global", "totals", "summary"):
+                    file.write(dumps(event_to_record(integ_name, event)) + b'\n')
+
+
+def event_to_rows(integ_name: str, event: tuple) -> list:
+    """ Turns an iter_integfile() event into rows of CSV_COLUMNS.  Only globals and totals have rows. """
+    event, database, name, values = event
+    rows = []
+    if event == "global":
+        global_time = values.get("Time", {})
+        for level, level_values in values["Data"].items():
+            rows.append(["global", integ_name, database, name, level,
+                         level_values.get("Blocks"), level_values.get("Size_KB"), level_values.get("Percent_Full"),
+                         level_values.get("Big_Stings_Count"), global_time.get("Elapsed_Seconds"),
+                         global_time.get("End_Date"), global_time.get("End_Time")])
+    elif event == "totals":
+        for field, value in values.items():
+            if field in ("Elapsed_Seconds", "End_Date", "End_Time"):
+                continue
+            # ie: Pointer_Level_blocks is the Blocks of the Pointer_Level
+            rows.append(["totals", integ_name, database, None, re.sub('_blocks$', '', field),
+                         value, None, None, None, values.get("Elapsed_Seconds"),
+                         values.get("End_Date"), values.get("End_Time")])
+    return rows
+
+
+def event_to_record(integ_name: str, event: tuple) -> {}:
+    """ Turns an iter_integfile() event into a flat dict, ie: for a global
+        {"event": "global", "file": "INTEG.txt", "database": "/db/", "global": "GLOBAL1", "Data": {...}, "Time": {...}}
+    """
+    event, database, name, values = event
+    record = {"event": event, "file": integ_name}
+    if database is not None:
+        record["database"] = database
+    if event == "global":
+        record["global"] = name
+        record.update(values)
+    elif event in ("totals", "errors", "profile", "summary"):
+        record[event] = values
+    return record
+
+
+def output_stream_to_file(integ_stream, outfile: Path, beautify: bool, encoder: str = 'json',
+                          compress: str = None) -> None:
+    """ Outputs a stream of (key, value) pairs to a file as a JSON object, as they are generated.
+    Same layout as output_to_file(), except beautify can only sort the keys within each global/total.
+    encoder and compress are the same as output_to_file(). """
+    with open_outfile(outfile, compress) as file:
+        write_json_stream(file, integ_stream, json_encoder(encoder, beautify))
+
+
+def write_json_stream(file, pairs, encoder: {}, level=0) -> None:
+    """ Writes an iterator of (key, value) pairs as a JSON object, to a binary file.
+    encoder is how to write it, see json_encoder().
+    If a value is itself an iterator of pairs it is written as a nested object, the same way. """
+    dumps = encoder["dumps"]
+    indent = encoder["indent"]
+    key_sep = encoder["key_sep"]
+    if indent is None:
+        first_sep = last_sep = b''
+        item_sep = encoder["item_sep"]
+    else:
+        first_sep = b'\n' + b' ' * indent * (level + 1)
+        item_sep = b',' + first_sep
+        last_sep = b'\n' + b' ' * indent * level
+    file.write(b'{')
+    sep = first_sep
+    for key, value in pairs:
+        file.write(sep + dumps(key) + key_sep)
+        sep = item_sep
+        if isinstance(value, Iterator):
+            write_json_stream(file, value, encoder, level + 1)
+        else:
+            value = dumps(value)
+            if indent is not None:
+                # nb: JSON strings never contain a raw newline, so this only re-indents
+                value = value.replace(b'\n', first_sep)
+            file.write(value)
+    if sep is item_sep:
+        file.write(last_sep)
+    file.write(b'}')
+
+
+def deal_with_integfile(integ_file: Path, member: str = None, engine: str = 'text') -> {}:
+    """ Processes entire IntegFile, return JSONs the whole thing.
+    member is the integ file to read inside a zip file, see open_integfile().
+    engine is 'text' or 'mmap', see iter_integfile(). """
+    return deal_with_events(iter_integfile(integ_file, member, engine))
+
+
+def deal_with_integfile_sections(integ_file: Path, pool_map=map, engine: str = 'text', filters: {} = None,
+                                 stats: {} = None) -> {}:
+    """ Same as deal_with_integfile(), but each ---Directory--- section is parsed by its own pool_map() call.
+    Pass a process pool's map to parse the databases of a single file in parallel.
+    With filters, the sections of databases it doesn't allow are never read, see new_filters().
+    If stats is given the bytes and lines of the header and the sections that are parsed are added to it.
+    Raises NotAnIntegFile if the file doesn't start like an integ file. """
+    if not integ_file.stat().st_size:
+        raise NotAnIntegFile(source_str(integ_file))
+    # The header and the sections are found in the same mmap
+    with open(integ_file, 'rb') as fp, mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        if not sniff_integfile(mm[:INTEG_HEADER_PEEK]):
+            raise NotAnIntegFile(source_str(integ_file))
+        integfile_profile = deal_with_header(BufferLines(mm), integ_file)
+        sections = scan_sections(integ_file, mm)
+        if filters and filters["database"]:
+            sections = [(offset, length) for offset, length in sections
+                        if name_allowed(filters["database"], section_database(mm, offset))]
+        if stats is not None:
+            count_buffer(stats, mm, 0, sections[0][0] if sections else len(mm))
+            for offset, length in sections:
+                count_buffer(stats, mm, offset, offset + length)
+    offsets, lengths = list(zip(*sections)) or ((), ())
+    results = pool_map(deal_with_section, repeat(integ_file), offsets, lengths, repeat(engine), repeat(filters))
+
+    def events():
+        for section_events in results:
+            for event in section_events:
+                if event[0] == "totals":
+                    # Same as the serial loop in iter_integlines(), in the same order.
+                    update_profile(integfile_profile, event[3])
+                yield event
+        yield ("profile", None, None, integfile_profile)
+
+    return deal_with_events(events())
+
+
+def scan_sections(integ_file: Path, buffer=None) -> list:
+    """ Returns a list of (byte offset, byte length) of each ---Directory--- section of the integ file.
+    The last section runs to the end of the file.  buffer is the file already mmapped, if it is. """
+    if buffer is None:
+        with open(integ_file, 'rb') as fp, mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return scan_sections(integ_file, mm)
+    offsets = []
+    position = buffer.find(b'\n---Directory ')
+    while position != -1:
+        offsets.append(position + 1)
+        position = buffer.find(b'\n---Directory ', position + 1)
+    filesize = len(buffer)
+    return [(start, end - start) for start, end in zip(offsets, offsets[1:] + [filesize])]
+
+
+def section_database(buffer, offset: int) -> str:
+    """ Returns the database of the scan_sections() section at offset, from its ---Directory--- line. """
+    end = buffer.find(b'\n', offset)
+    line = buffer[offset:end if end != -1 else len(buffer)].decode(locale.getpreferredencoding(False))
+    return line.split()[1].strip('-')
+
+
+def deal_with_section(integ_file: Path, offset: int, length: int, engine: str = 'text', filters: {} = None) -> list:
+    """ Parses one section of the integ file found by scan_sections(), returns a list of its events.
+    Safe to run in a worker process. """
+    section = read_section(integ_file, offset, length)
+    if engine == 'mmap':
+        # Not actually mmapped, but the section is bytes all the same
+        return list(iter_integlines(BufferLines(section), {"Elapsed_Seconds": 0}, deal_with_global_bytes, filters))
+    # TextIOWrapper so the lines are decoded exactly as open(integ_file, 'r') would
+    with io.TextIOWrapper(io.BytesIO(section)) as fp:
+        return list(iter_integlines(fp, {"Elapsed_Seconds": 0}, filters=filters))
+
+
+def read_section(integ_file: Path, offset: int, length: int) -> bytes:
+    """ Returns length bytes of the integ file from offset, without reading the rest of it. """
+    with open(integ_file, 'rb') as fp:
+        fp.seek(offset)
+        return fp.read(length)
+
+
+# The line each database's errors start with, see deal_with_database_errors()
+ERRORS_HEADER = '***** The following errors were detected *****'
+
+
+def scan_integfile_errors(integ_file: Path, member: str = None, filters: {} = None, stats: {} = None) -> {}:
+    """ Returns the errors of each database of the integ file, in the form {'database': {'global': 'error text'}},
+    the same as the 'errors' of deal_with_integfile(), without parsing the globals.
+    Uncompressed files are searched as bytes, see scan_errors(), compressed ones a line at a time.
+    With filters only the errors of the databases and globals it allows are kept, see new_filters().
+    If stats is given the bytes and lines read are added to it, see new_stats().
+    Raises NotAnIntegFile if the file doesn't start like an integ file. """
+    with mmap_integfile(integ_file) as mm:
+        if mm is not None:
+            if not sniff_integfile(mm[:INTEG_HEADER_PEEK]):
+                raise NotAnIntegFile(source_str(integ_file, member))
+            errors = scan_errors(mm)
+            if stats is not None:
+                count_buffer(stats, mm)
+    if mm is None:
+        with open_integfile(integ_file, member, stats) as fp:
+            if not sniff_integfile(fp.buffer.peek(INTEG_HEADER_PEEK)):
+                raise NotAnIntegFile(source_str(integ_file, member))
+            errors = scan_error_lines(fp)
+    if filters:
+        # There are only ever a few errors, it's quicker to filter them afterwards
+        errors = {database: {glbl: error for glbl, error in database_errors.items()
+                             if not filters["global"] or name_allowed(filters["global"], glbl)}
+                  for database, database_errors in errors.items()
+                  if not filters["database"] or name_allowed(filters["database"], database)}
+        errors = {database: database_errors for database, database_errors in errors.items() if database_errors}
+    return errors
+
+
+def scan_errors(buffer) -> {}:
+    """ Same as scan_integfile_errors(), for a bytes-like buffer of the whole integ file (ie: an mmap).
+    Only the errors after a database's totals count, so it jumps from one ERRORS_HEADER to the next with find(),
+    and only reads the lines around them.  A file without errors is one find() through the buffer. """
+    errors = {}
+    lines = BufferLines(buffer)
+    header = ERRORS_HEADER.encode()
+    position = buffer.find(header)
+    while position != -1:
+        totals = buffer.rfind(b'\n---Total for directory ', 0, position)
+        directory = buffer.rfind(b'\n---Directory ', 0, position)
+        # Anything else starting with a * in between means it's the end of the file, they're just repeats
+        if directory < totals and buffer.find(b'\n*', totals, position) == -1:
+            lines.pos = directory + 1
+            database = next(lines).split()[1].strip('-')
+            lines.pos = position
+            database_errors = deal_with_database_errors(lines)
+            if database_errors:
+                errors.setdefault(database, {}).update(database_errors["errors"])
+            position = lines.pos
+        position = buffer.find(header, position + 1)
+    return errors
+
+
+def scan_error_lines(fp) -> {}:
+    """ Same as scan_integfile_errors(), for the lines of an integ file (after the header).
+    Only the lines starting with - or * are looked at, the rest are skipped without being split. """
+    errors = {}
+    database = None
+    after_totals = False
+    for line in fp:
+        first = line[0]
+        if first == '-':
+            if line.startswith('---Directory '):
+                database = line.split()[1].strip('-')
+                after_totals = False
+            elif line.startswith('---Total for directory '):
+                after_totals = True
+        elif first == '*' and after_totals:
+            if not line.startswith(ERRORS_HEADER):
+                # The errors at the end of the file, they're just repeats
+                break
+            # The line after them, see deal_with_database_errors()
+            pushback = []
+            database_errors = deal_with_database_errors(fp, pushback)
+            if database_errors:
+                errors.setdefault(database, {}).update(database_errors["errors"])
+            if pushback:
+                if not pushback[0].startswith('---Directory '):
+                    break
+                database = pushback[0].split()[1].strip('-')
+                after_totals = False
+    return errors
+
+
+def deal_with_events(events) -> {}:
+    """ Builds the deal_with_integfile() JSON out of iter_integfile() events. """
+    integfile_data = {}
+    integfile_data["databases"] = {}
+    integfile_data["profile"] = {}
+    for event, database, name, values in events:
+        if event == "database":
+            integfile_data["databases"][database] = {}
+            integfile_data["databases"][database]["globals"] = {}
+            integfile_data["databases"][database]["totals"] = {}
+        elif event == "global":
+            integfile_data["databases"][database]["globals"][name] = {}
+            integfile_data["databases"][database]["globals"][name].update(values)
+        elif event == "totals":
+            integfile_data["databases"][database]["totals"].update(values)
+        elif event == "errors":
+            add_database_errors(integfile_data, database, values)
+        elif event == "summary":
+            add_summary(integfile_data, database, values)
+        elif event == "profile":
+            integfile_data["profile"].update(values)
+
+    return integfile_data
+
+
+def add_database_errors(integfile_data: {}, database: str, errors: {}) -> None:
+    """ Adds the errors of a database to deal_with_integfile() JSON, see deal_with_events().  They go in the
+    database, and in the roll-up of every database's errors.  errors is in the form {'global': 'error text'} """
+    integfile_data["databases"][database]["errors"] = errors
+    integfile_data.setdefault("errors", {}).setdefault(database, {}).update(errors)
+
+
+def add_summary(integfile_data: {}, database: str, summary: {}) -> None:
+    """ Adds a summary event's summary to deal_with_integfile() JSON, see summarize_events().  It's the whole
+    file's if database is None. """
+    if database is None:
+        integfile_data["summary"] = summary
+    else:
+        integfile_data["databases"][database]["summary"] = summary
+
+
+def integfile_to_events(integfile_data: {}):
+    """ The reverse of deal_with_events(), yields the iter_integfile() events of deal_with_integfile() JSON. """
+    for database, database_data in integfile_data["databases"].items():
+        yield ("database", database, None, None)
+        for name, values in database_data["globals"].items():
+            yield ("global", database, name, values)
+        if database_data["totals"]:
+            yield ("totals", database, None, database_data["totals"])
+        if "errors" in database_data:
+            yield ("errors", database, None, database_data["errors"])
+        if "summary" in database_data:
+            yield ("summary", database, None, database_data["summary"])
+    if "summary" in integfile_data:
+        yield ("summary", None, None, integfile_data["summary"])
+    yield ("profile", None, None, integfile_data["profile"])
+
+
+# The lists of globals in a summary, see summarize_events()
+SUMMARY_LISTS = ["Largest_Globals", "Most_Wasted_Globals"]
+
+
+def summarize_events(events, top: int = 10):
+    """ Passes iter_integfile() events through, adding a summary event at the end of each database and one for
+    the whole file before the profile.  The Total level of each global is collected into typed arrays, a column
+    per metric, so summarizing is a few sum()s and sorts in C however many globals there are.  A summary is:
+        {"Globals": 3, "Blocks": 301, "Size_KB": 2408, "Wasted_KB": 322, "Elapsed_Seconds": 0.3,
+         "Percent_Full": {"Min": 3, "P10": 3, "P50": 69, "P90": 89, "Max": 89, "Weighted_Mean": 86.6},
+         "Largest_Globals": [{"Database": "/db/", "Global": "GLOBAL3", "Size_KB": 1368, "Wasted_KB": 150,
+                              "Percent_Full": 89}, ...],
+         "Most_Wasted_Globals": [...]}
+    Wasted_KB is the empty part of each global, Size_KB * (100 - Percent_Full) / 100, ie: how fragmented it is.
+    The file's summary also has Databases, and Wall_Seconds from the start to the end of the integ file. """
+    metrics = {
+        "blocks": array('q'),
+        "size_kb": array('q'),
+        "wasted_kb": array('q'),
+        "percent_full": array('b'),
+        "elapsed": array('d'),
+    }
+    # A database's globals are all together, database_starts is where each one's start in the arrays
+    names = []
+    databases = []
+    database_starts = []
+    # This runs for every global, so look the appends up once
+    add_blocks = metrics["blocks"].append
+    add_size_kb = metrics["size_kb"].append
+    add_wasted_kb = metrics["wasted_kb"].append
+    add_percent_full = metrics["percent_full"].append
+    add_elapsed = metrics["elapsed"].append
+    add_name = names.append
+    for event in events:
+        kind = event[0]
+        if kind == "global":
+            values = event[3]
+            total = values["Data"].get("Total")
+            if total is not None:
+                size_kb = total["Size_KB"]
+                percent_full = total["Percent_Full"]
+                add_blocks(total["Blocks"])
+                add_size_kb(size_kb)
+                add_wasted_kb(size_kb * (100 - percent_full) // 100)
+                add_percent_full(percent_full)
+                add_elapsed(values["Time"].get("Elapsed_Seconds", 0.0))
+                add_name(event[2])
+            yield event
+            continue
+        if kind in ("database", "profile") and databases:
+            # The end of the database before
+            yield ("summary", databases[-1], None,
+                   summarize_metrics(metrics, names, databases, database_starts, database_starts[-1], len(names), top))
+        if kind == "database":
+            databases.append(event[1])
+            database_starts.append(len(names))
+        elif kind == "profile":
+            summary = summarize_metrics(metrics, names, databases, database_starts, 0, len(names), top)
+            values = event[3]
+            summary["Databases"] = len(databases)
+            summary["Wall_Seconds"] = profile_wall_seconds(values)
+            yield ("summary", None, None, summary)
+        yield event
+
+
+def summarize_metrics(metrics: {}, names: list, databases: list, database_starts: list, start: int, end: int,
+                      top: int) -> {}:
+    """ Summarizes the globals from start to end of the metric arrays, see summarize_events(). """
+    size_kb = metrics["size_kb"][start:end]
+    wasted_kb = metrics["wasted_kb"][start:end]
+    percent_full = sorted(metrics["percent_full"][start:end])
+    total_size_kb = sum(size_kb)
+    total_wasted_kb = sum(wasted_kb)
+    summary = {
+        "Globals": end - start,
+        "Blocks": sum(metrics["blocks"][start:end]),
+        "Size_KB": total_size_kb,
+        "Wasted_KB": total_wasted_kb,
+        "Elapsed_Seconds": round(math.fsum(metrics["elapsed"][start:end]), 3),
+        "Percent_Full": {
+            "Min": percentile(percent_full, 0),
+            "P10": percentile(percent_full, 10),
+            "P50": percentile(percent_full, 50),
+            "P90": percentile(percent_full, 90),
+            "Max": percentile(percent_full, 100),
+            # Weighted by size, so it's how full the space they take up is
+            "Weighted_Mean": round(100 * (1 - total_wasted_kb / total_size_kb), 1) if total_size_kb else None
+        }
+    }
+    for key, column in zip(SUMMARY_LISTS, (size_kb, wasted_kb)):
+        largest = heapq.nlargest(top, range(len(column)), key=column.__getitem__)
+        summary[key] = [{"Database": databases[bisect.bisect_right(database_starts, start + i) - 1],
+                         "Global": names[start + i],
+                         "Size_KB": size_kb[i], "Wasted_KB": wasted_kb[i],
+                         "Percent_Full": metrics["percent_full"][start + i]}
+                        for i in largest]
+    return summary
+
+
+def percentile(sorted_values, percent: int):
+    """ Returns the nearest-rank percentile of some sorted values, or None if there aren't any. """
+    if not sorted_values:
+        return None
+    return sorted_values[max(math.ceil(percent / 100 * len(sorted_values)) - 1, 0)]
+
+
+def profile_wall_seconds(profile: {}) -> float:
+    """ Returns the seconds from the start of an integ file to its end, or None if they don't have dates. """
+    try:
+        start = time.strptime(profile["Start_Date"] + " " + profile["Start_Time"], "%m/%d/%Y %H:%M:%S")
+        end = time.strptime(profile["End_Date"] + " " + profile["End_Time"], "%m/%d/%Y %H:%M:%S")
+    except (KeyError, ValueError):
+        # Old/VMS Cache doesn't give the end date, see deal_with_endofdatabase()
+        return None
+    return time.mktime(end) - time.mktime(start)
+
+
+def summarize_integfile(integfile_data: {}, top: int = 10) -> {}:
+    """ Adds the summaries of summarize_events() to deal_with_integfile() JSON, ie: after deal_with_integfile_sections(). """
+    for event, database, name, values in summarize_events(integfile_to_events(integfile_data), top):
+        if event == "summary":
+            add_summary(integfile_data, database, values)
+    return integfile_data
+
+
+class LevelStats():
+    """ One level of a global, ie: 'Data Level: # of blocks=18      144kb (72% full)'.
+    big_strings_count is only set for the Big_Strings level. """
+    __slots__ = ("name", "blocks", "size_kb", "percent_full", "big_strings_count")
+
+    def __init__(self, name: str, blocks: int, size_kb: int, percent_full: int, big_strings_count: int = None):
+        self.name = name
+        self.blocks = blocks
+        self.size_kb = size_kb
+        self.percent_full = percent_full
+        self.big_strings_count = big_strings_count
+
+    def __repr__(self):
+        return "LevelStats({!r}, blocks={}, size_kb={}, percent_full={})".format(
+            self.name, self.blocks, self.size_kb, self.percent_full)
+
+    def to_json(self) -> {}:
+        """ Returns the level the way deal_with_global_field() does. """
+        level_json = {"Blocks": self.blocks, "Size_KB": self.size_kb, "Percent_Full": self.percent_full}
+        if self.big_strings_count is not None:
+            level_json["Big_Stings_Count"] = self.big_strings_count
+        return level_json
+
+
+class GlobalStats():
+    """ A global of a database.  levels is a tuple of LevelStats, in file order, ie: Top_Bottom_Pnt_Level,
+    Data_Level, Big_Strings, Total.  The times are None if the global didn't finish, errors is None if it's OK.
+    Much smaller than the dict of dicts deal_with_global() returns, so a lot of them can be kept around. """
+    __slots__ = ("database", "name", "levels", "elapsed_seconds", "end_date", "end_time", "errors")
+
+    def __init__(self, database: str, name: str, levels: tuple = (), elapsed_seconds: float = None,
+                 end_date: str = None, end_time: str = None, errors: str = None):
+        self.database = database
+        self.name = name
+        self.levels = levels
+        self.elapsed_seconds = elapsed_seconds
+        self.end_date = end_date
+        self.end_time = end_time
+        self.errors = errors
+
+    def __repr__(self):
+        return "GlobalStats({!r}, {!r})".format(self.database, self.name)
+
+    def level(self, name: str) -> LevelStats:
+        """ Returns the level with the given name, ie: 'Total', or None. """
+        for level in self.levels:
+            if level.name == name:
+                return level
+        return None
+
+    @classmethod
+    def from_json(cls, database: str, name: str, values: {}):
+        """ Makes a GlobalStats out of deal_with_global() JSON. """
+        levels = tuple(LevelStats(level, level_values["Blocks"], level_values["Size_KB"], level_values["Percent_Full"],
+                                  level_values.get("Big_Stings_Count"))
+                       for level, level_values in values["Data"].items())
+        global_time = values["Time"]
+        return cls(database, name, levels, global_time.get("Elapsed_Seconds"), global_time.get("End_Date"),
+                   global_time.get("End_Time"), values.get("errors"))
+
+    def to_json(self) -> {}:
+        """ Returns the global the way deal_with_global() does. """
+        global_json = {"Data": {level.name: level.to_json() for level in self.levels}, "Time": {}}
+        if self.elapsed_seconds is not None:
+            global_json["Time"] = {"Elapsed_Seconds": self.elapsed_seconds, "End_Date": self.end_date,
+                                   "End_Time": self.end_time}
+        if self.errors is not None:
+            global_json["errors"] = self.errors
+        return global_json
+
+
+class DatabaseTotals():
+    """ The totals at the end of a database.  blocks is in the form {'Pointer_Level_blocks': 368, ...}.
+    The times are None if the database didn't finish. """
+    __slots__ = ("database", "blocks", "elapsed_seconds", "end_date", "end_time")
+
+    def __init__(self, database: str, blocks: {}, elapsed_seconds: float = None, end_date: str = None,
+                 end_time: str = None):
+        self.database = database
+        self.blocks = blocks
+        self.elapsed_seconds = elapsed_seconds
+        self.end_date = end_date
+        self.end_time = end_time
+
+    def __repr__(self):
+        return "DatabaseTotals({!r})".format(self.database)
+
+    @classmethod
+    def from_json(cls, database: str, values: {}):
+        """ Makes a DatabaseTotals out of deal_with_endofdatabase() JSON. """
+        blocks = {field: value for field, value in values.items()
+                  if field not in ("Elapsed_Seconds", "End_Date", "End_Time")}
+        return cls(database, blocks, values.get("Elapsed_Seconds"), values.get("End_Date"), values.get("End_Time"))
+
+    def to_json(self) -> {}:
+        """ Returns the totals the way deal_with_endofdatabase() does. """
+        totals_json = dict(self.blocks)
+        if self.elapsed_seconds is not None:
+            totals_json.update({"Elapsed_Seconds": self.elapsed_seconds, "End_Date": self.end_date,
+                                "End_Time": self.end_time})
+        return totals_json
+
+
+class DatabaseReport():
+    """ A database of an integ file.  globals is a list of GlobalStats in file order, totals is None until
+    the end of the database.  errors is in the form {'global': 'error text'}, or None. """
+    __slots__ = ("name", "globals", "totals", "errors")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.globals = []
+        self.totals = None
+        self.errors = None
+
+    def __repr__(self):
+        return "DatabaseReport({!r}, {} globals)".format(self.name, len(self.globals))
+
+    def to_json(self) -> {}:
+        """ Returns the database the way deal_with_events() does. """
+        database_json = {"globals": {glbl.name: glbl.to_json() for glbl in self.globals},
+                         "totals": self.totals.to_json() if self.totals else {}}
+        if self.errors is not None:
+            database_json["errors"] = self.errors
+        return database_json
+
+
+class IntegReport():
+    """ A parsed integ file, see parse().  databases is a dict of DatabaseReport by name, in file order.
+    profile is the same as in the JSON, ie: {'Start_Date': ..., 'System_Name': ..., 'Elapsed_Seconds': ...}. """
+    __slots__ = ("name", "databases", "profile")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.databases = {}
+        self.profile = {}
+
+    def __repr__(self):
+        return "IntegReport({!r}, {} databases)".format(self.name, len(self.databases))
+
+    def __iter__(self):
+        """ Iterates over the GlobalStats and DatabaseTotals, in file order. """
+        for database in self.databases.values():
+            yield from database.globals
+            if database.totals:
+                yield database.totals
+
+    @property
+    def errors(self) -> {}:
+        """ The errors of every database that has them, in the form {'database': {'global': 'error text'}}. """
+        return {name: database.errors for name, database in self.databases.items() if database.errors is not None}
+
+    def to_json(self) -> {}:
+        """ Returns the report the way deal_with_integfile() does.  Add it to a dict under its name for
+        output_to_file(), ie: {report.name: report.to_json()} """
+        integfile_json = {"databases": {name: database.to_json() for name, database in self.databases.items()},
+                          "profile": self.profile}
+        if self.errors:
+            integfile_json["errors"] = self.errors
+        return integfile_json
+
+
+def parse(integ_file, member: str = None, engine: str = 'text') -> IntegReport:
+    """ Parses an integ file into an IntegReport, for using integ2json as a library, ie:
+        report = integ2json.parse("/path/INTEG.txt")
+        for glbl in report.databases["/db/"].globals:
+            print(glbl.name, glbl.level("Total").size_kb)
+    integ_file is a path, member is the name of the integ file inside a zip file, see iter_integfile().
+    The globals are parsed straight into GlobalStats, see deal_with_global_record(). """
+    integ_file = Path(integ_file)
+    report = IntegReport(integfile_name(integ_file, member))
+    for event, database, name, values in iter_integfile(integ_file, member, engine, records=True):
+        if event == "database":
+            report.databases[database] = DatabaseReport(database)
+        elif event == "global":
+            values.database = database
+            report.databases[database].globals.append(values)
+        elif event == "totals":
+            report.databases[database].totals = DatabaseTotals.from_json(database, values)
+        elif event == "errors":
+            report.databases[database].errors = values
+        elif event == "profile":
+            report.profile = values
+    return report
+
+
+def iter_records(integ_file, member: str = None, engine: str = 'text'):
+    """ Yields a GlobalStats for each global and a DatabaseTotals at the end of each database, as the integ file
+    is parsed.  Nothing is kept, so memory use stays flat however big the file is.  See parse(). """
+    for event, database, name, values in iter_integfile(Path(integ_file), member, engine, records=True):
+        if event == "global":
+            values.database = database
+            yield values
+        elif event == "totals":
+            yield DatabaseTotals.from_json(database, values)
+
+
+def iter_integfile(integ_file: Path, member: str = None, engine: str = 'text', filters: {} = None, stats: {} = None,
+                   records: bool = False):
+    """ Parses the IntegFile, yields an event tuple for each section as soon as it is read.
+    With the 'mmap' engine uncompressed files are parsed as bytes, see iter_integfile_mmap().
+    If filters is given only the databases and globals it allows are parsed, see new_filters().
+    If stats is given the bytes and lines read are added to it as they're read, see new_stats().
+    If records, the values of global events are GlobalStats instead, see deal_with_global_record().
+
+    Every event is a tuple of (event, database, name, values):
+        ("database", database, None, None)      start of a ---Directory--- section
+        ("global", database, global_name, {})   output of deal_with_global()
+        ("totals", database, None, {})          output of deal_with_endofdatabase()
+        ("errors", database, None, {})          errors from deal_with_database_errors()
+        ("profile", None, None, {})             the profile, always the last event
+    Raises NotAnIntegFile, before the first event, if the file doesn't start like an integ file.
+    With --summary, summarize_events() adds a ("summary", database, None, {}) at the end of each database,
+     and a ("summary", None, None, {}) for the whole file just before the profile.
+    """
+    if engine == 'mmap':
+        yield from iter_integfile_mmap(integ_file, member, filters, stats, records)
+        return
+    # We use `with` to open the file because:
+    #  https://stackabuse.com/read-a-file-line-by-line-in-python/
+    with open_integfile(integ_file, member, stats) as fp:
+        # Peek at the header through the same buffer we're about to read, nothing's been read from it yet
+        if not sniff_integfile(fp.buffer.peek(INTEG_HEADER_PEEK)):
+            raise NotAnIntegFile(source_str(integ_file, member))
+        integfile_profile = deal_with_header(fp, integ_file)
+        yield from iter_integlines(fp, integfile_profile, deal_with_global_record if records else None, filters)
+    yield ("profile", None, None, integfile_profile)
+
+
+def iter_integfile_mmap(integ_file: Path, member: str = None, filters: {} = None, stats: {} = None,
+                        records: bool = False):
+    """ Same as iter_integfile(), but the file is mmapped and scanned as bytes.
+    Only the lines we have to are decoded, the field lines of a global never are, see deal_with_global_bytes().
+    With records the globals' lines are decoded, for deal_with_global_record().
+    Compressed and empty files can't be mmapped, they're read as text instead.
+    nb: like open(), lines end in \\n or \\r\\n, but unlike open() a lone \\r doesn't end a line. """
+    with mmap_integfile(integ_file) as mm:
+        if mm is None:
+            yield from iter_integfile(integ_file, member, filters=filters, stats=stats, records=records)
+            return
+        if not sniff_integfile(mm[:INTEG_HEADER_PEEK]):
+            raise NotAnIntegFile(source_str(integ_file))
+        lines = BufferLines(mm)
+        integfile_profile = deal_with_header(lines, integ_file)
+        yield from iter_integlines(lines, integfile_profile,
+                                   deal_with_global_record if records else deal_with_global_bytes, filters)
+        if stats is not None:
+            count_buffer(stats, mm, 0, lines.pos)
+    yield ("profile", None, None, integfile_profile)
+
+
+@contextmanager
+def mmap_integfile(integ_file: Path):
+    """ mmaps the integ file to scan it as bytes.  Yields the mmap, or None if the file is compressed or empty.
+    It's only opened once, whether it's compressed is peeked at through the same handle. """
+    with open(integ_file, 'rb') as fp:
+        if compression_type(integ_file, fp) or not os.fstat(fp.fileno()).st_size:
+            yield None
+            return
+        with mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            yield mm
+
+
+def count_buffer(stats: {}, buffer, start: int = 0, end: int = None) -> None:
+    """ Adds the bytes and lines of buffer[start:end] (ie: an mmap that's been parsed) to stats, see new_stats().
+    It's counted a chunk at a time, so the buffer is never copied all at once. """
+    end = len(buffer) if end is None else end
+    stats["Bytes"] += end - start
+    for chunk_start in range(start, end, 1024 * 1024):
+        stats["Lines"] += buffer[chunk_start:min(end, chunk_start + 1024 * 1024)].count(b'\n')
+
+
+class BufferLines():
+    """ Iterates over the lines of a bytes-like buffer (ie: an mmap), decoding them like a text file would.
+    Unlike a text file, pos can be read and moved, so the buffer can be scanned as bytes in between lines. """
+
+    def __init__(self, buffer):
+        self.buffer = buffer
+        self.pos = 0
+        self.encoding = locale.getpreferredencoding(False)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> str:
+        start = self.pos
+        if start >= len(self.buffer):
+            raise StopIteration
+        end = self.buffer.find(b'\n', start)
+        self.pos = end = len(self.buffer) if end == -1 else end + 1
+        if self.buffer[end - 2:end] == b'\r\n':
+            return self.buffer[start:end - 2].decode(self.encoding) + '\n'
+        return self.buffer[start:end].decode(self.encoding)
+
+
+def follow_integfile(integ_file: Path, interval: float = 1.0, timeout: float = None, filters: {} = None):
+    """ Same as iter_integfile(), but the file is still being written.  Events are yielded as each section is finished.
+    See follow_lines() for interval and timeout, and new_filters() for filters. """
+    with open(integ_file, 'r') as fp:
+        lines = follow_lines(fp, interval, timeout)
+        integfile_profile = deal_with_header(lines, integ_file)
+        yield from iter_integlines(lines, integfile_profile, filters=filters)
+    yield ("profile", None, None, integfile_profile)
+
+
+def follow_lines(fp, interval: float = 1.0, timeout: float = None):
+    """ Yields each complete line of fp, like `for line in fp`, but waits for more at the end of the file.
+    Checks for more every interval seconds, gives up once nothing new is written for timeout seconds (None is never).
+    Stops after the last line of an integ file:
+        No Errors were found.
+    """
+    partial = ""
+    waited = 0.0
+    while True:
+        line = fp.readline()
+        if not line:
+            if timeout is not None and waited >= timeout:
+                if partial:
+                    yield partial
+                return
+            time.sleep(interval)
+            waited += interval
+            continue
+        waited = 0.0
+        # The line might only be half written, hang on to it until we get the rest
+        partial += line
+        if not partial.endswith('\n'):
+            continue
+        line, partial = partial, ""
+        yield line
+        if line.rstrip() == "No Errors were found.":
+            return
+
+
+def deal_with_header(fp, integ_file) -> {}:
+    """ Processes the first lines of the IntegFile, returns the starting profile. """
+    """ The first couple of lines.,.
+      Sometimes:
+        Cache Database Integrity Check on 11/04/2018 at 19:00:01
+        System: HOSTNAME  Configuration: INSTANCENAME
+        Cache for OSTYPE (OS Information) CACHE_VERSION (Build NUMBER) BUILD_DATE
+      Othertimes only two lines:
+        Cache Database Integrity Check on 11/20/2018 at 19:43:01
+        System: SYS  Configuration: INSTANCENAME
+      At least there's always a whitespace, so just ignore the third line if it's empty.
+    """
+    line = {}
+    line[1] = next(fp, '').rstrip().split(' ')
+    line[2] = next(fp, '').rstrip().split(' ')
+    line[3] = next(fp, '').rstrip().split(' ')
+    # First 3 lines, we're lazy, there's probably a better way, but this works.
+    # Makes sure that those first three lines are 'valid'.
+    if ' '.join(line[1][0:5]) != "Cache Database Integrity Check on":
+        sys.exit("Unusual line#1 at the top of integfile: {}".format(integ_file))
+    if line[2][0] != "System:":
+        sys.exit("Unusual line#2 at the top of integfile: {}".format(integ_file))
+    if line[3][0] != "Cache":
+        if not line[3][0]:
+            # Sometimes line[3] doesnt exist at all, but it either not-exists or is "Cache"
+            pass
+        else:
+            sys.exit("Unusual line#3 at the top of integfile: {}".format(integ_file))
+
+    integfile_profile = {}
+    integfile_profile["Start_Date"] = line[1][5]
+    integfile_profile["Start_Time"] = line[1][7]
+    integfile_profile["End_Date"] = line[1][5]
+    integfile_profile["End_Time"] = line[1][7]
+    integfile_profile["System_Name"] = line[2][1]
+    # There's a weird double space on the next line, we need to account for it
+    #   eg: System: HOSTNAME  Configuration: CACHE
+    integfile_profile["System_Instance"] = line[2][4]
+    if line[3][0]:
+        # Remember, line 3 either exists with a version or is blank.
+        integfile_profile["System_Version"] = line[3][9]
+    integfile_profile["Elapsed_Seconds"] = 0
+    return integfile_profile
+
+
+def iter_integlines(fp, integfile_profile: {}, global_parser=None, filters: {} = None):
+    """ Processes the body of an IntegFile, yields events as described in iter_integfile().
+    integfile_profile End_Date/End_Time/Elapsed_Seconds are updated at the end of each database.
+    global_parser replaces deal_with_global(), ie: deal_with_global_bytes() for BufferLines.
+    The databases and globals that filters doesn't allow are skipped without being parsed, see new_filters(). """
+    global_parser = global_parser or deal_with_global
+    global_filter = filters["global"] if filters else None
+    database = None
+    # The line after a database's errors, deal_with_database_errors() reads it to know they've ended
+    pushback = []
+    for line in pushback_lines(fp, pushback):
+        line = line.rstrip()
+        if not line:
+            """
+            skip blank lines
+            """
+            continue
+
+        elif line[0] == 'N':
+            """
+            N: End of the file, and there were no errors.
+            NB: The 'No Errors were found in this directory.' lines are handled in the
+            end-of-directory sections below.
+            eg: "^No Errors were found.$"
+            """
+            continue
+
+        elif line[0] == '*':
+            """
+            *: End of the file, and there were errors
+            We dont have to deal with errors at the end of the file, they're just
+            repeats of errors we found during the run.
+            Just quit, no need to do any work here
+            """
+            break
+
+        elif line[0] == '-':
+            """
+            -: Start or End of a database check
+            eg:
+                Start: "^---Directory /usr/cachesys/mgr/user/---$"
+                End:   "^---Total for directory /usr/cachesys/mgr/user/---$"
+            """
+            database = yield from deal_with_directory_line(line, fp, pushback, database, integfile_profile, filters)
+
+        #  It's a global entry
+        elif 'Global' in line.split(' ')[0]:
+            global_name = line.strip().split(' ')[1]
+            if global_filter and not name_allowed(global_filter, global_name):
+                skip_global(fp)
+                continue
+            global_values = global_parser(fp, global_name)
+            yield ("global", database, global_name, global_values)
+
+        else:
+            sys.exit("Unexpected value in deal_with_integfile:" + line)
+
+
+def deal_with_directory_line(line: str, fp, pushback: list, database: str, integfile_profile: {}, filters: {} = None):
+    """ Yields the events of a ---Directory--- or ---Total for directory--- line for iter_integlines(), and
+    returns the database we're in after it.  A database that filters doesn't allow is skipped up to the next one.
+    After the totals its errors are read too, see deal_with_database_errors(). """
+    database_filter, global_filter = (filters["database"], filters["global"]) if filters else (None, None)
+    if "Directory" in line.split()[0].strip('-'):
+        database = line.split()[1].strip('-')
+        if database_filter and not name_allowed(database_filter, database):
+            skip_database(fp, pushback)
+            return database
+        yield ("database", database, None, None)
+    elif "Total" in line.split()[0].strip('-'):
+        endofdatabase = deal_with_endofdatabase(fp)
+        yield ("totals", database, None, endofdatabase)
+        update_profile(integfile_profile, endofdatabase)
+        # database_errors() returns a dict in the form {'errors': {'global': 'error text'}}.
+        database_errors = deal_with_database_errors(fp, pushback)
+        if database_errors and global_filter:
+            database_errors["errors"] = {glbl: error for glbl, error in database_errors["errors"].items()
+                                         if name_allowed(global_filter, glbl)}
+        if database_errors and database_errors["errors"]:
+            yield ("errors", database, None, database_errors["errors"])
+    return database
+
+
+def skip_database(fp, pushback: list) -> None:
+    """ Skips the rest of a database, up to the next ---Directory--- line, which is put in pushback.
+    Only the start of each line is looked at, and a BufferLines is skipped with find() without reading them. """
+    if isinstance(fp, BufferLines):
+        position = fp.buffer.find(b'\n---Directory ', fp.pos - 1)
+        fp.pos = len(fp.buffer) if position == -1 else position + 1
+        return
+    for line in fp:
+        if line.startswith('---Directory '):
+            pushback.append(line)
+            return
+
+
+def skip_global(fp) -> None:
+    """ Skips the rest of a global, up to and including its Elapsed Time line, see deal_with_global(). """
+    if isinstance(fp, BufferLines):
+        position = fp.buffer.find(b'Elapsed Time', fp.pos)
+        end = -1 if position == -1 else fp.buffer.find(b'\n', position)
+        fp.pos = len(fp.buffer) if end == -1 else end + 1
+        return
+    for line in fp:
+        if "Elapsed Time" in line:
+            return
+
+
+def new_filters(databases: list = None, exclude_databases: list = None, glbls: list = None,
+                exclude_glbls: list = None) -> {}:
+    """ Returns the filters of which databases and globals to parse, or None if there aren't any:
+        {"database": see new_name_filter(), "global": see new_name_filter()}
+    Each is a list of patterns, see new_name_filter().  They're all compiled regexes, so it pickles for a worker. """
+    if not (databases or exclude_databases or glbls or exclude_glbls):
+        return None
+    return {"database": new_name_filter(databases, exclude_databases),
+            "global": new_name_filter(glbls, exclude_glbls)}
+
+
+def new_name_filter(includes: list = None, excludes: list = None) -> tuple:
+    """ Returns (include regex, exclude regex) of lists of patterns, either is None if there are none of them,
+    or None if there aren't any patterns at all.  A pattern is a glob, ie: /prod/*, or a regex after re:,
+    ie: re:^/prod/.*/cache.  Globs match the whole name, regexes match anywhere in it (like re.search()).
+    A glob also matches the name that's exactly the same as it, so old/VMS directories like _DIR:[DATABASE1]
+     can be given as they are, even though [DATABASE1] is a glob character class. """
+    def compile_patterns(patterns):
+        if not patterns:
+            return None
+        regexes = []
+        for pattern in patterns:
+            if pattern.startswith('re:'):
+                regex = pattern[3:]
+            else:
+                regex = r'^(?:{}\Z|{})'.format(re.escape(pattern), fnmatch.translate(pattern))
+            try:
+                re.compile(regex)
+            except re.error as e:
+                sys.exit("Bad filter pattern {}: {}.  Exiting...".format(pattern, e))
+            regexes.append(regex)
+        return re.compile('|'.join('(?:{})'.format(regex) for regex in regexes))
+    if not (includes or excludes):
+        return None
+    return compile_patterns(includes), compile_patterns(excludes)
+
+
+def name_allowed(name_filter: tuple, name: str) -> bool:
+    """ Returns True if name matches the includes of the new_name_filter() and none of its excludes. """
+    include, exclude = name_filter
+    if include is not None and include.search(name) is None:
+        return False
+    return exclude is None or exclude.search(name) is None
+
+
+def pushback_lines(fp, pushback: list):
+    """ Yields the lines of fp, like `for line in fp`, except the lines put in pushback come first.
+    Nothing is read ahead, so fp can still be read directly in between. """
+    lines = iter(fp)
+    while True:
+        if pushback:
+            yield pushback.pop()
+            continue
+        line = next(lines, None)
+        if line is None:
+            return
+        yield line
+
+
+def update_profile(integfile_profile: {}, endofdatabase: {}) -> None:
+    """ Updates the profile with the totals of a database that just finished. """
+    # At the end of each database, update the end_date/time fields
+    #  This helps because I'm lazy and dont want to do it at the end of the file.
+    integfile_profile["End_Date"] = endofdatabase["End_Date"]
+    integfile_profile["End_Time"] = endofdatabase["End_Time"]
+    integfile_profile["Elapsed_Seconds"] += endofdatabase["Elapsed_Seconds"]
+
+
+def stream_events(events):
+    """ Yields the (key, value) pairs of deal_with_events()' output, parsing the file as they are consumed.
+    'databases' is itself a stream, the 'profile' and 'errors' roll-up are only known once it is used up. """
+    trailer = {}
+    yield "databases", stream_databases(events, trailer)
+    yield "profile", trailer["profile"]
+    if "errors" in trailer:
+        yield "errors", trailer["errors"]
+    if "summary" in trailer:
+        yield "summary", trailer["summary"]
+
+
+def stream_databases(events, trailer: {}):
+    """ Turns iter_integfile() events into a stream of (database, stream of database sections) pairs.
+    The profile and errors roll-up are stored in trailer as they go past. """
+    lookahead = []
+
+    def next_event():
+        # There's only ever one event we've read 'too far', between a database's sections.
+        return lookahead.pop() if lookahead else next(events, None)
+
+    for event in iter(next_event, None):
+        if event[0] == "database":
+            yield event[1], stream_database(event[1], next_event, lookahead, trailer)
+        elif event[0] == "summary":
+            trailer["summary"] = event[3]
+        elif event[0] == "profile":
+            trailer["profile"] = event[3]
+
+
+def stream_database(database: str, next_event, lookahead: list, trailer: {}):
+    """ Yields the (section, value) pairs of one database for stream_databases(), its globals as a stream.
+    next_event() is the next of the events, the first that isn't this database's is put back in lookahead. """
+    yield "globals", stream_globals(next_event, lookahead)
+    event = next_event()
+    if event is not None and event[0] == "totals":
+        yield "totals", event[3]
+        event = next_event()
+    else:
+        yield "totals", {}
+    if event is not None and event[0] == "errors":
+        yield "errors", event[3]
+        trailer.setdefault("errors", {}).setdefault(database, {}).update(event[3])
+        event = next_event()
+    if event is not None and event[0] == "summary" and event[1] is not None:
+        yield "summary", event[3]
+        event = next_event()
+    if event is not None:
+        lookahead.append(event)
+
+
+def stream_globals(next_event, lookahead: list):
+    """ Yields the (global, values) of the global events from next_event(), up to the first that isn't one,
+    which is put back in lookahead.  See stream_database(). """
+    for event in iter(next_event, None):
+        if event[0] != "global":
+            lookahead.append(event)
+            return
+        yield event[2], event[3]
+
+
+def deal_with_global(fp, global_name):
+    """ Collects values of a Global from the integ file, returns JSON. """
+    global_values = {}
+    global_values["Data"] = {}
+    global_values["Time"] = {}
+    for line in fp:
+        line = line.strip()
+        if not line:
+            continue
+        elif line[0] == "*":
+            """
+            Starting with a * means this line is an error.
+            example error:
+                **********Global CacheTempClassDesc is Not OK**********
+                The pointer block contains the wrong global
+                ^G^G
+
+            Read until the blank line, that's all of the error.
+            We can scrap the first line with the asterix, we already know the global.
+            """
+            global_values["errors"] = deal_with_global_error(fp)
+
+        elif "Elapsed Time" in str(line.strip()):
+            """
+            If the string starts with 'Elapsed Time ='
+            that's the end of the global entry, eg:
+                Elapsed Time = 0.0 seconds, Completed 11/04/2018 19:00:01
+            OLD VERSIONS OF CACHE:
+                Elapsed Time = 0.0 seconds 19:43:01.
+            """
+            elapsed_seconds, end_date, end_time = deal_with_global_time(line)
+            global_values["Time"] = {"Elapsed_Seconds": elapsed_seconds, "End_Date": end_date, "End_Time": end_time}
+            break
+
+        else:
+            """
+             Not elapsed time, one of the other fields
+              eg:
+                Global: EXAMPLE
+                 Top/Bottom Pnt Level: # of blocks=1      8kb (0% full)
+                 Data Level:           # of blocks=1      8kb (0% full)
+                 Big Strings:            # of blocks=10     80kb (80% full) # = 2
+                 Total:                # of blocks=12     96kb (67% full)
+                 Elapsed Time = 0.0 seconds, Completed 11/04/2018 19:00:01
+            """
+            field, field_values = deal_with_global_field(line)
+            global_values["Data"][field] = field_values
+
+    return global_values
+
+
+def deal_with_global_error(fp):
+    """ Reads the error of a global, the lines after its '**********Global X is Not OK**********' line up to
+    the next blank line.  Returns them, each with a space in front, or {} if the file ended first. """
+    error_msg = ""
+    for line in fp:
+        if line.strip() == "":
+            return error_msg
+        error_msg = error_msg + " " + line
+    return {}
+
+
+def deal_with_global_time(line: str) -> tuple:
+    """ Returns (Elapsed_Seconds, End_Date, End_Time) from the stripped Elapsed Time line at the end of a global.
+    Old/VMS Cache doesn't give the date, it's UNKDATE. """
+    line = line.split()
+    if line[5] == "Completed":
+        return float(line[3]), line[6], line[7]
+    return float(line[3]), "UNKDATE", line[5]
+
+
+def deal_with_global_record(fp, global_name: str) -> GlobalStats:
+    """ Same as deal_with_global(), but returns a GlobalStats built straight from the fields, without making
+    the dicts of the JSON first.  Its database is left for the caller to fill in, see iter_records(). """
+    levels = []
+    elapsed_seconds = end_date = end_time = errors = None
+    for line in fp:
+        line = line.strip()
+        if not line:
+            continue
+        elif line[0] == "*":
+            errors = deal_with_global_error(fp)
+        elif "Elapsed Time" in line:
+            elapsed_seconds, end_date, end_time = deal_with_global_time(line)
+            break
+        else:
+            levels.append(deal_with_global_level(line))
+    return GlobalStats(None, global_name, tuple(levels), elapsed_seconds, end_date, end_time, errors)
+
+
+def deal_with_global_level(line: str) -> LevelStats:
+    """ Same as deal_with_global_field(), but returns a LevelStats. """
+    match = GLOBAL_FIELD_PATTERN.match(line)
+    if match:
+        field, blocks, size, size_symbol, percent_full, big_strings_count = match.groups()
+        try:
+            field = FIELD_NAMES[field]
+        except KeyError:
+            FIELD_NAMES[field] = re.sub('[^0-9a-zA-Z]+', '_', field.strip())
+            field = FIELD_NAMES[field]
+        if field != "Big_Strings":
+            return LevelStats(field, int(blocks.replace(',', '')),
+                              int(size.replace(',', '')) * SIZE_MULTIPLIER[size_symbol], int(percent_full))
+        if big_strings_count is not None:
+            return LevelStats(field, int(blocks.replace(',', '')),
+                              int(size.replace(',', '')) * SIZE_MULTIPLIER[size_symbol], int(percent_full),
+                              int(big_strings_count.replace(',', '')))
+    # Not the usual shape, do it the long way.
+    field, field_values = deal_with_global_field_slow(line)
+    return LevelStats(field, field_values["Blocks"], field_values["Size_KB"], field_values["Percent_Full"],
+                      field_values.get("Big_Stings_Count"))
+
+
+# Every field line of a global matches this, in one go.  eg:
+#   Top/Bottom Pnt Level: # of blocks=1      8kb (0% full)
+#   Big Strings:            # of blocks=10     80kb (80% full) # = 2
+# Groups are: field, blocks, size, size symbol, percent full, big strings count
+GLOBAL_FIELD_PATTERN = re.compile(
+    r'([^:]+):\s*# of blocks=([0-9,]+)\s+([0-9,]+)(kb|MB|GB|TB|PB|EB)\s+\(([0-9]+)% full\)(?:\s+# = ([0-9,]+))?$')
+SIZE_MULTIPLIER = {
+    'kb': 1,
+    'MB': int(1024),
+    'GB': int(1024**2),
+    'TB': int(1024**3),
+    'PB': int(1024**4),
+    'EB': int(1024**5)
+}  # If you have more than exabytes in one database seek profressional help because dang
+# Field names we've already turned into JSON keys, ie: 'Top/Bottom Pnt Level' -> 'Top_Bottom_Pnt_Level'
+FIELD_NAMES = {}
+
+
+def deal_with_global_field(line: str) -> tuple:
+    """ Processes one field line of a Global, returns (field, values).
+    line must already be stripped, eg: 'Data Level:           # of blocks=1      8kb (0% full)' """
+    match = GLOBAL_FIELD_PATTERN.match(line)
+    if not match:
+        # Not the usual shape, do it the long way.
+        return deal_with_global_field_slow(line)
+    field, blocks, size, size_symbol, percent_full, big_strings_count = match.groups()
+    try:
+        field = FIELD_NAMES[field]
+    except KeyError:
+        FIELD_NAMES[field] = re.sub('[^0-9a-zA-Z]+', '_', field.strip())
+        field = FIELD_NAMES[field]
+    field_values = {
+        "Blocks": int(blocks.replace(',', '')),
+        "Size_KB": int(size.replace(',', '')) * SIZE_MULTIPLIER[size_symbol],
+        "Percent_Full": int(percent_full)
+    }
+    if field == "Big_Strings":
+        if big_strings_count is None:
+            return deal_with_global_field_slow(line)
+        field_values["Big_Stings_Count"] = int(big_strings_count.replace(',', ''))
+    return field, field_values
+
+
+def deal_with_global_field_slow(line: str) -> tuple:
+    """ Processes one field line of a Global word by word, returns (field, values).
+    Same result as deal_with_global_field(), which only falls back to this for unusual lines. """
+    line = line.split(':')
+    field = line[0].strip()
+    field = re.sub('[^0-9a-zA-Z]+', '_', field)
+    value_tmp = line[1].strip().split()
+    # Value contains: '# of blocks=1      8kb (0% full)'
+    field_values = {}
+    field_values["Blocks"] = int(re.sub('blocks=|,', '', value_tmp[2]))
+
+    size = value_tmp[3]
+    size_symbol = re.sub('[0-9,]', '', size)  # ie: 2,349kb becomes kb
+    size_in_kb = int(re.sub('[^0-9]', '', size)) * SIZE_MULTIPLIER[size_symbol]
+    field_values["Size_KB"] = int(size_in_kb)
+    # Turn '(80%' into 80 and make it an int.
+    #  The int-casting is because the JSON output will think it's a str otherwise (?)
+    percent_full = int(re.sub('[%(]', '', value_tmp[4]))
+    field_values["Percent_Full"] = percent_full
+    if field == "Big_Strings":
+        # If field is big strings, we need that number on the end too, that is the
+        #   total number of big strings in use.
+        big_stings_count = int(re.sub('blocks=|,', '', value_tmp[8]))
+        field_values["Big_Stings_Count"] = big_stings_count
+    return field, field_values
+
+
+# deal_with_global_bytes() version of GLOBAL_FIELD_PATTERN, for unstripped lines
+GLOBAL_FIELD_BYTES_PATTERN = re.compile(
+    rb'[ \t]*([^:]+):\s*# of blocks=([0-9,]+)\s+([0-9,]+)(kb|MB|GB|TB|PB|EB)\s+\(([0-9]+)% full\)(?:\s+# = ([0-9,]+))?\s*$')
+# Blank lines, which iter_integlines() would skip anyway
+BLANK_LINES_BYTES_PATTERN = re.compile(rb'(?:[ \t\r\f\v]*\n)*')
+SIZE_MULTIPLIER_BYTES = {size_symbol.encode(): multiplier for size_symbol, multiplier in SIZE_MULTIPLIER.items()}
+
+
+def deal_with_global_bytes(lines: BufferLines, global_name: str) -> {}:
+    """ Same as deal_with_global(), but scans the bytes of lines.buffer instead of decoding each line.
+    Anything unusual (blank lines, errors, odd fields) is handed to deal_with_global() instead. """
+    buffer = lines.buffer
+    global_values = {}
+    global_values["Data"] = {}
+    global_values["Time"] = {}
+    start = lines.pos
+    while True:
+        end = buffer.find(b'\n', start)
+        if end == -1:
+            return deal_with_global(lines, global_name)
+        if buffer.find(b'Elapsed Time', start, end) != -1:
+            break
+        match = GLOBAL_FIELD_BYTES_PATTERN.match(buffer, start, end)
+        if not match:
+            return deal_with_global(lines, global_name)
+        field, blocks, size, size_symbol, percent_full, big_strings_count = match.groups()
+        try:
+            field = FIELD_NAMES[field]
+        except KeyError:
+            FIELD_NAMES[field] = re.sub('[^0-9a-zA-Z]+', '_', field.decode(lines.encoding).strip())
+            field = FIELD_NAMES[field]
+        global_values["Data"][field] = {
+            "Blocks": int(blocks.replace(b',', b'')),
+            "Size_KB": int(size.replace(b',', b'')) * SIZE_MULTIPLIER_BYTES[size_symbol],
+            "Percent_Full": int(percent_full)
+        }
+        if field == "Big_Strings":
+            if big_strings_count is None:
+                return deal_with_global(lines, global_name)
+            global_values["Data"][field]["Big_Stings_Count"] = int(big_strings_count.replace(b',', b''))
+        start = end + 1
+
+    # The end of the global, same as deal_with_global()
+    line = buffer[start:end].split()
+    if line[5] == b"Completed":
+        global_values["Time"]["Elapsed_Seconds"] = float(line[3])
+        global_values["Time"]["End_Date"] = line[6].decode(lines.encoding)
+        global_values["Time"]["End_Time"] = line[7].decode(lines.encoding)
+    else:
+        global_values["Time"]["Elapsed_Seconds"] = float(line[3])
+        global_values["Time"]["End_Date"] = "UNKDATE"
+        global_values["Time"]["End_Time"] = line[5].decode(lines.encoding)
+    lines.pos = BLANK_LINES_BYTES_PATTERN.match(buffer, end + 1).end()
+    return global_values
+
+
+def deal_with_endofdatabase(fp):
+    """ Process end of Database section, returns it JSON formatted """
+    """
+     End of the database
+        AIX:
+        ---Total for directory /db/database/---
+               368 Pointer Level blocks        2944kb (11% full)
+            26,364 Data Level blocks            205MB (79% full)
+               475 Big String blocks           3800kb (63% full) # = 393
+            27,222 Total blocks                 212MB (77% full)
+             2,090 Free blocks                   16MB
+
+        Elapsed time = 1.4 seconds 11/04/2018 19:00:04
+
+        No Errors were found in this directory.
+
+        VMS:
+        ---Total for directory _DIR:[DATABASE]---
+            23,753 Pointer Level blocks         185MB (67% full)
+         8,805,663 Data Level blocks          68794MB (72% full)
+             1,556 Big String blocks             12MB (67% full) # = 1,296
+         8,831,852 Total blocks               68998MB (72% full)
+            54,728 Free blocks                  427MB
+
+        Elapsed time = 7765.6 seconds 21:52:27
+
+        No Errors were found in this directory.
+    """
+    return_dict = {}
+    for line in fp:
+        line = line.strip()
+        if not line:
+            continue
+        else:
+            if line.split(' ')[0] == "Elapsed":
+                # End of the data for the database, return the value after getting the
+                #  elapsed times
+                # Remember that there are 7 entries, but it's indexed from 0
+                if len(line.split(' ')) == 7:
+                    Elapsed_Seconds = float(line.split(' ')[3])
+                    End_Date = line.split(' ')[5]
+                    End_Time = line.split(' ')[6]
+                elif len(line.split(' ')) == 6:
+                    # old/vms Cache version.  No date!
+                    Elapsed_Seconds = float(line.split(' ')[3])
+                    End_Date = "UNKDATE"
+                    End_Time = line.split(' ')[5]
+                else:
+                    sys.exit("Issue with the length of line in deal_with_endofdatabase. Line:" + line)
+
+                return_dict.update({
+                    "Elapsed_Seconds": Elapsed_Seconds,
+                    "End_Date": End_Date,
+                    "End_Time": End_Time
+                    })
+                break
+
+            else:
+                # replace multiple spaces with a :
+                #  line becomes: 368 Pointer Level blocks:2944kb (11% full)
+                line = re.sub('  +', ':', line)
+                value = line.split(' ')[0]
+                value = re.sub('[,]', '', value)
+                # Try to cast value as an int, then a float.  nb: I dont think this works.
+                try:
+                    value = int(value)
+                except Exception:
+                    try:
+                        value = float(value)
+                    except Exception:
+                        value = str(value)
+                # turn "368 Pointer Level blocks:2944kb (11% full)" into
+                #   "368 Pointer Level blocks":
+                field = line.split(':')[0]
+                # Now turn "368 Pointer Level blocks" into "Pointer_Level_blocks":
+                field = field.split(' ', 1)[1]
+                field = re.sub('[ ]', '_', str(field))
+                # Now add '"Pointer_Level_blocks": 368' to our return_dict
+                return_dict.update({field: value})
+
+    return return_dict
+
+
+def deal_with_database_errors(fp, pushback: list = None):
+    """ Checks to see if there are database errors, returns JSON of said errors. """
+    """
+    Deal with all of the errors we just detected.
+    No Errors Example:
+        No Errors were found in this directory.
+
+    Errors Example:
+        ***** The following errors were detected *****
+         **********Global CacheTempClassDesc is Not OK**********
+         The pointer block contains the wrong global
+
+    The errors end at the first line that isn't one, ie: the next ---Directory--- or the errors at the end of
+    the file.  We've read it by then, so it's put in pushback for whoever's reading the file to have next.
+    """
+    return_dict = {}
+    for line in fp:
+        line = line.strip()
+        if not line:
+            continue
+        else:
+            first_word = line.split(' ')[0]
+            if first_word == 'No':
+                break
+            elif first_word == '*****':
+                pass  # Skip the first line we just got, it's just telling us there are errors
+            elif first_word == "**********Global":
+                global_with_errors = line.split(' ')[1]
+                errormessage = ""  # reset error message
+                for line in fp:
+                    line = line.strip()
+                    if line == "":
+                        # End of error message
+                        break
+                    else:
+                        errormessage = errormessage + " " + line
+                return_dict.setdefault("errors", {})[global_with_errors] = errormessage
+            else:
+                # Not ours
+                if pushback is not None:
+                    pushback.append(line)
+                break
+
+    return return_dict
+
+
+# The tables of the trend index, see trend_main().  There's a row in globals for every level of every global
+#  of every report, dated with the start of the report so a report's rows all line up.
+TREND_SCHEMA = """
+CREATE TABLE IF NOT EXISTS reports (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    system TEXT NOT NULL,
+    instance TEXT NOT NULL,
+    date TEXT NOT NULL,
+    UNIQUE (system, instance, date)
+);
+CREATE TABLE IF NOT EXISTS globals (
+    report INTEGER NOT NULL REFERENCES reports (id),
+    system TEXT NOT NULL,
+    instance TEXT NOT NULL,
+    database TEXT NOT NULL,
+    global TEXT NOT NULL,
+    level TEXT NOT NULL,
+    date TEXT NOT NULL,
+    blocks INTEGER,
+    size_kb INTEGER,
+    percent_full INTEGER
+);
+CREATE INDEX IF NOT EXISTS globals_by_name ON globals (system, database, global, level, date);
+CREATE INDEX IF NOT EXISTS globals_by_date ON globals (date, level, percent_full);
+"""
+
+
+def trend_main(argv: list) -> None:
+    """ The trend subcommand, keeps an index of many reports so globals can be compared over time.
+        integ2json.py trend add INDEX FILES...      add integ files, or integ2json JSON files, to the index
+        integ2json.py trend growth INDEX -D DB -G GLOBAL   how a global has grown
+        integ2json.py trend full INDEX -p 90 --since 2199-01-01   globals that crossed 90% full
+    """
+    args = parse_trend_args(argv)
+    with closing(open_trend_index(args.index)) as conn:
+        if args.action == 'add':
+            trend_add(conn, args.files)
+        elif args.action == 'growth':
+            trend_growth(conn, args.database, args.glbl, args.level, args.system)
+        elif args.action == 'full':
+            trend_full(conn, args.percent, args.since, args.level, args.system)
+
+
+def open_trend_index(index: Path) -> sqlite3.Connection:
+    """ Opens the trend index, making it if it doesn't exist. """
+    import sqlite3
+    conn = sqlite3.connect(index)
+    conn.executescript(TREND_SCHEMA)
+    return conn
+
+
+def trend_add(conn: sqlite3.Connection, files: list) -> None:
+    """ Adds integ files to the trend index.  Reports that are already in it are skipped, without parsing them.
+    A .json file is taken to be integ2json output, and each integ file in it is added. """
+    for file in (Path(x).resolve() for x in files):
+        if file.suffix == '.json':
+            with open(file, 'r') as fp:
+                integ_json = json.load(fp)
+            for integfile, integfile_data in integ_json.items():
+                trend_add_report(conn, integfile, integfile_data["profile"], integfile_data)
+            continue
+        for member in integfile_members(file):
+            # The header is all we need to tell if we've seen it before
+            profile = integfile_header(file, member)
+            if profile is None:
+                print("Skipping file {} because it's not an integrity file.".format(source_str(file, member)))
+                continue
+            if trend_report_id(conn, profile) is not None:
+                print("Skipping file {} because it's already in the index.".format(source_str(file, member)))
+                continue
+            trend_add_report(conn, integfile_name(file, member), profile, deal_with_integfile(file, member))
+
+
+def trend_report_id(conn: sqlite3.Connection, profile: {}) -> int:
+    """ Returns the id of the report with this profile in the trend index, or None. """
+    row = conn.execute("SELECT id FROM reports WHERE system = ? AND instance = ? AND date = ?",
+                       (profile["System_Name"], profile["System_Instance"], trend_date(profile))).fetchone()
+    return row[0] if row else None
+
+
+def trend_add_report(conn: sqlite3.Connection, integfile: str, profile: {}, integfile_data: {}) -> None:
+    """ Adds the deal_with_integfile() JSON of one report to the trend index, in one transaction. """
+    if trend_report_id(conn, profile) is not None:
+        print("Skipping {} because it's already in the index.".format(integfile))
+        return
+    system = profile["System_Name"]
+    instance = profile["System_Instance"]
+    date = trend_date(profile)
+    with conn:
+        report = conn.execute("INSERT INTO reports (name, system, instance, date) VALUES (?, ?, ?, ?)",
+                              (integfile, system, instance, date)).lastrowid
+        rows = ((report, system, instance, database, glbl, level, date,
+                 level_values.get("Blocks"), level_values.get("Size_KB"), level_values.get("Percent_Full"))
+                for database, database_data in integfile_data["databases"].items()
+                for glbl, glbl_data in database_data["globals"].items()
+                for level, level_values in glbl_data["Data"].items())
+        cursor = conn.executemany("INSERT INTO globals VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+    print("Added {} ({} {} {}, {:,} rows)".format(integfile, system, instance, date, cursor.rowcount))
+
+
+def trend_date(profile: {}) -> str:
+    """ Returns when the report started, in a form that sorts, ie: 01/22/2199 19:00:01 is '2199-01-22 19:00:01'. """
+    month, day, year = profile["Start_Date"].split('/')
+    return "{}-{}-{} {}".format(year, month, day, profile["Start_Time"])
+
+
+def trend_growth(conn: sqlite3.Connection, database: str, glbl: str, level: str = 'Total', system: str = None) -> None:
+    """ Prints the size of a global in every report in the trend index as csv, then how fast it's growing
+    on each system (to stderr, so the csv stays clean). """
+    import csv
+    query = ("SELECT system, instance, date, blocks, size_kb, percent_full FROM globals "
+             "WHERE database = ? AND global = ? AND level = ?")
+    params = [database, glbl, level]
+    if system:
+        query += " AND system = ?"
+        params.append(system)
+    rows = conn.execute(query + " ORDER BY system, instance, date", params).fetchall()
+    writer = csv.writer(sys.stdout)
+    writer.writerow(["System", "Instance", "Date", "Blocks", "Size_KB", "Percent_Full"])
+    writer.writerows(rows)
+    # The first and last row of each system, they're sorted by date
+    first_rows = {}
+    last_rows = {}
+    for row in rows:
+        first_rows.setdefault(row[:2], row)
+        last_rows[row[:2]] = row
+    for system_instance, first in first_rows.items():
+        last = last_rows[system_instance]
+        days = (time.mktime(time.strptime(last[2], "%Y-%m-%d %H:%M:%S"))
+                - time.mktime(time.strptime(first[2], "%Y-%m-%d %H:%M:%S"))) / 86400
+        if days > 0 and first[4] is not None and last[4] is not None:
+            print("# {} {} growth: {:+,.0f} KB/day over {:.1f} days".format(
+                *system_instance, (last[4] - first[4]) / days, days), file=sys.stderr)
+
+
+def trend_full(conn: sqlite3.Connection, percent: int = 90, since: str = None, level: str = 'Total',
+               system: str = None) -> None:
+    """ Prints the globals that went over percent full since the given date (YYYY-MM-DD) as csv.
+    That's every report where it's at least percent full, and it wasn't in its report before. """
+    import csv
+    query = """
+        SELECT system, instance, database, global, date, previous_percent_full, percent_full FROM (
+            SELECT system, instance, database, global, date, percent_full,
+                   LAG(percent_full) OVER (PARTITION BY system, instance, database, global ORDER BY date)
+                       AS previous_percent_full
+            FROM globals WHERE level = ?{})
+        WHERE percent_full >= ? AND (previous_percent_full IS NULL OR previous_percent_full < ?){}
+        ORDER BY date, system, instance, database, global"""
+    params = [level]
+    system_filter = ""
+    if system:
+        system_filter = " AND system = ?"
+        params.append(system)
+    params += [percent, percent]
+    since_filter = ""
+    if since:
+        since_filter = " AND date >= ?"
+        params.append(since)
+    writer = csv.writer(sys.stdout)
+    writer.writerow(["System", "Instance", "Database", "Global", "Date", "Previous_Percent_Full", "Percent_Full"])
+    writer.writerows(conn.execute(query.format(system_filter, since_filter), params))
+
+
+def parse_trend_args(argv: list):
+    """ Deal with the args of the trend subcommand. """
+    parser = argparse.ArgumentParser(prog='integ2json.py trend',
+                                     description='Keep an index of many integ reports, to see how globals change over time')
+    actions = parser.add_subparsers(dest='action', required=True)
+    add = actions.add_parser('add', help='Add integ files, or integ2json JSON files, to the index')
+    add.add_argument('index', help='The index, an sqlite file (made if it does not exist)', type=Path)
+    add.add_argument('files', help='List of Integrity files', nargs="+")
+    growth = actions.add_parser('growth', help='Show the size of a global in every report, and how fast it is growing')
+    growth.add_argument('index', help='The index, an sqlite file', type=Path)
+    growth.add_argument('-D', '--database', help='The database of the global, ie: /database/db1/', required=True)
+    growth.add_argument('-G', '--global', help='The name of the global', dest='glbl', required=True)
+    full = actions.add_parser('full', help='Show the globals that went over a percent full')
+    full.add_argument('index', help='The index, an sqlite file', type=Path)
+    full.add_argument('-p', '--percent', help='How full is full (default 90)', type=int, default=90)
+    full.add_argument('--since', help='Only reports from this date on, ie: 2199-01-22')
+    for action in (growth, full):
+        action.add_argument('-l', '--level', help='The level of the global (default Total)', default='Total')
+        action.add_argument('--system', help='Only this system')
+    args = parser.parse_args(argv)
+    if not args.action == 'add' and not args.index.exists():
+        sys.exit("Index {} does not exist.  Exiting...".format(args.index))
+    return args
+
+
+def watch_main(argv: list) -> None:
+    """ The watch subcommand, a daemon that converts integ files as they turn up in some directories.
+        integ2json.py watch -o OUTDIR DIRS...
+    Runs until it's interrupted. """
+    import asyncio
+    args = parse_watch_args(argv)
+    print("Watching {} for integ files".format(", ".join(str(directory) for directory in args.dirs)), flush=True)
+    try:
+        asyncio.run(watch_integfiles(args))
+    except KeyboardInterrupt:
+        print("Stopped watching.")
+
+
+async def watch_integfiles(args) -> None:
+    """ Polls args.dirs every args.interval seconds, and converts the files that match args.pattern once they've
+    stopped growing for args.settle seconds.  At most args.jobs files are converted at once, in a process pool.
+    The queue between them only holds a few files, so when the pool is behind the polling waits for it.
+    The pool is shut down whenever there's nothing to do, so the daemon stays small while it's idle. """
+    import asyncio
+    queue = asyncio.Queue(maxsize=args.jobs * 2)
+    # The files we've dealt with, with their (size, mtime) when we did, so we notice when they change
+    done = {}
+    # The files still being written, with their (size, mtime) and when we first saw that
+    growing = {}
+    # The pool, and how many files the workers are converting in it
+    pool_state = {"Pool": None, "Busy": 0}
+    workers = [asyncio.create_task(watch_worker(args, queue, pool_state)) for _ in range(args.jobs)]
+    try:
+        while True:
+            for integ_file in await asyncio.to_thread(scan_watched_dirs, args.dirs, args.pattern):
+                await watch_integfile(integ_file, args, queue, done, growing)
+            if pool_state["Busy"] == 0 and queue.empty():
+                shutdown_watch_pool(pool_state)
+            await asyncio.sleep(args.interval)
+    finally:
+        for worker in workers:
+            worker.cancel()
+        shutdown_watch_pool(pool_state, cancel_futures=True)
+
+
+async def watch_worker(args, queue: asyncio.Queue, pool_state: {}) -> None:
+    """ Converts the (integ_file, member, outfile)s on the queue, one at a time, until it's cancelled.
+    See watch_integfiles(). """
+    while True:
+        integ_file, member, outfile = await queue.get()
+        pool_state["Busy"] += 1
+        try:
+            await watch_convert(integ_file, member, outfile, args, pool_state)
+        finally:
+            pool_state["Busy"] -= 1
+            queue.task_done()
+
+
+async def watch_convert(integ_file: Path, member: str, outfile: Path, args, pool_state: {}) -> None:
+    """ Converts an integ file in the pool, which is started if it isn't running, and prints how it went.
+    A file that fails is only reported, and if it broke the pool a new one is started for the next file. """
+    import asyncio
+    from concurrent.futures import ProcessPoolExecutor
+    from concurrent.futures.process import BrokenProcessPool
+    try:
+        if pool_state["Pool"] is None:
+            pool_state["Pool"] = ProcessPoolExecutor(max_workers=args.jobs)
+        table = new_pseudonym_table(args.deidentify) if args.deidentify else None
+        file_json, stats = await asyncio.get_running_loop().run_in_executor(
+            pool_state["Pool"], convert_integfile, integ_file, member, outfile, args, table)
+    except (Exception, SystemExit) as e:
+        # A bad file mustn't take the daemon down with it, parsing errors are sys.exit()s
+        print(f'Failed to convert {source_str(integ_file, member)}: {e}', flush=True)
+        if isinstance(e, BrokenProcessPool):
+            pool_state["Pool"] = None
+        return
+    if "Skipped" in stats:
+        print(f'Skipping file {source_str(integ_file, member)} because {stats["Skipped"]}.', flush=True)
+        return
+    print(f'Converted {source_str(integ_file, member)} to {outfile} in {stats["Seconds"]:.2f}s', flush=True)
+
+
+def shutdown_watch_pool(pool_state: {}, cancel_futures: bool = False) -> None:
+    """ Shuts down the pool of watch_integfiles() if it's running, it's started again when it's needed. """
+    if pool_state["Pool"] is not None:
+        pool_state["Pool"].shutdown(wait=False, cancel_futures=cancel_futures)
+        pool_state["Pool"] = None
+
+
+async def watch_integfile(integ_file: Path, args, queue: asyncio.Queue, done: {}, growing: {}) -> None:
+    """ Queues integ_file for conversion once it's stopped growing, unless it's already been done.
+    Waits if the queue is full. """
+    try:
+        stat = integ_file.stat()
+    except FileNotFoundError:
+        growing.pop(integ_file, None)
+        return
+    size_mtime = (stat.st_size, stat.st_mtime_ns)
+    if done.get(integ_file) == size_mtime:
+        return
+    if not has_settled(integ_file, size_mtime, args.settle, growing):
+        return
+    done[integ_file] = size_mtime
+    # Whether it's really an integ file is found out when it's converted, see convert_integfile()
+    try:
+        members = integfile_members(integ_file)
+    except (Exception, SystemExit):
+        # Gone or unreadable
+        return
+    for member in members:
+        outfile = default_outfile(integ_file, member, args.outdir, output_suffix(args))
+        if outfile.exists() and outfile.stat().st_mtime_ns >= stat.st_mtime_ns:
+            # Converted before we started, and it hasn't changed since
+            continue
+        await queue.put((integ_file, member, outfile))
+
+
+def has_settled(integ_file: Path, size_mtime: tuple, settle: float, growing: {}) -> bool:
+    """ Returns True once integ_file's (size, mtime) hasn't changed for settle seconds, and forgets about it.
+    Until then it's kept in growing, with when it was first seen like that. """
+    now = time.monotonic()
+    if growing.get(integ_file, (None, None))[0] != size_mtime:
+        growing[integ_file] = (size_mtime, now)
+        return False
+    if now - growing[integ_file][1] < settle:
+        return False
+    del growing[integ_file]
+    return True
+
+
+def scan_watched_dirs(dirs: list, pattern: str) -> list:
+    """ Returns the files in dirs whose names match pattern, ie: 'INTEG_*'.  Subdirectories aren't scanned. """
+    integ_files = []
+    for directory in dirs:
+        try:
+            with os.scandir(directory) as entries:
+                integ_files.extend(Path(entry.path) for entry in entries
+                                   if fnmatch.fnmatch(entry.name, pattern) and entry.is_file())
+        except OSError as e:
+            print(f'Failed to scan {directory}: {e}', flush=True)
+    return integ_files
+
+
+def parse_watch_args(argv: list):
+    """ Deal with the args of the watch subcommand. """
+    parser = argparse.ArgumentParser(prog='integ2json.py watch',
+                                     description='Watch directories, and convert integ files as they turn up in them')
+    parser.add_argument('-o', '--outdir',
+                        help='Location to put the JSON files (default is location of integ file)',
+                        metavar='outdir',
+                        type=Path)
+    parser.add_argument('-p', '--pattern',
+                        help="Only files whose names match this, ie: 'INTEG_*.txt' (default is every file)",
+                        default='*')
+    parser.add_argument('-j', '--jobs',
+                        help='Number of files to convert at the same time, in separate processes (default 1).',
+                        metavar='N',
+                        type=int,
+                        default=1)
+    parser.add_argument('--interval',
+                        help='How often to look for new files (default 5 seconds).',
+                        metavar='seconds',
+                        type=float,
+                        default=5.0)
+    parser.add_argument('--settle',
+                        help='How long a file has to stop growing before it is converted (default 10 seconds).',
+                        metavar='seconds',
+                        type=float,
+                        default=10.0)
+    parser.add_argument('-d', '--deidentify',
+                        help='Deidentify databases/globals/etcetc with hashes (generic numbering needs every file, '
+                             'use integ2json.py for that).',
+                        choices=['hash'])
+    parser.add_argument('-b', '--beautify',
+                        help='Beautify JSON output',
+                        action='store_true',
+                        default=False)
+    parser.add_argument('-F', '--format',
+                        help='Output format (see integ2json.py -h).',
+                        choices=list(FORMAT_SUFFIX),
+                        default='json')
+    parser.add_argument('--encoder',
+                        help='The JSON encoder: json (default) is the stdlib, orjson or ujson are faster, auto is the fastest one '
+                             'installed.  orjson and ujson write compact JSON without spaces, and orjson doesn\'t escape non-ASCII, '
+                             '--beautify always uses json.',
+                        choices=JSON_ENCODERS,
+                        default='json')
+    parser.add_argument('-z', '--compress',
+                        help='Compress the outfiles as they are written, with gzip (.gz) or zstd (.zst, needs the zstandard module).',
+                        choices=list(COMPRESS_SUFFIX))
+    parser.add_argument('--stream',
+                        help='Write the JSON as the integ file is parsed, so memory use stays flat.',
+                        action='store_true',
+                        default=False)
+    parser.add_argument('-e', '--engine',
+                        help='How to read the integ files (see integ2json.py -h).',
+                        choices=['text', 'mmap'],
+                        default='text')
+    parser.add_argument('dirs',
+                        help='Directories to watch',
+                        type=Path,
+                        nargs="+")
+    args = parser.parse_args(argv)
+    # convert_integfile() takes the args of main()
+    args.stats = False
+    args.profile = False
+    args.summary = False
+    args.errors_only = False
+    args.databases = args.exclude_databases = args.glbls = args.exclude_glbls = None
+    if args.jobs < 1:
+        sys.exit("Jobs must be 1 or more.  Exiting...")
+    check_output_args(args)
+    for directory in args.dirs:
+        if not directory.is_dir():
+            sys.exit("Directory {} does not exist.  Exiting...".format(directory))
+    if args.outdir and not args.outdir.is_dir():
+        sys.exit("File path {} does not exist.  Exiting...".format(args.outdir))
+    return args
+
+
+def diff_main(argv: list) -> None:
+    """ The diff subcommand, what changed between two integ reports, ie: last night's and tonight's.
+        integ2json.py diff OLD NEW [-o OUTFILE]
+    Only the changes are output, see diff_reports().  A count of them is printed to stderr. """
+    args = parse_diff_args(argv)
+    # Both files are parsed at the same time, each in its own process
+    with make_pool(args.jobs) as pool:
+        pool_map = pool.map if pool else map
+        try:
+            old, new = pool_map(diff_index, [args.old, args.new], repeat(args.level), repeat(args.engine))
+        except NotAnIntegFile as e:
+            sys.exit("File {} is not an integrity file.  Exiting...".format(e))
+    diff = diff_reports(old, new)
+    dumps = json_encoder(args.encoder, args.beautify)["dumps"]
+    if args.outfile:
+        with open_outfile(args.outfile) as file:
+            file.write(dumps(diff))
+    else:
+        sys.stdout.buffer.write(dumps(diff) + b'\n')
+    counts = {"changed": 0, "Added_Globals": 0, "Removed_Globals": 0, "New_Errors": 0, "Cleared_Errors": 0}
+    for database_diff in diff["databases"].values():
+        counts["changed"] += len(database_diff.get("globals", {}))
+        for key in DIFF_DATABASE_LISTS:
+            counts[key] += len(database_diff.get(key, ()))
+    print("{} databases changed ({} added, {} removed), {changed} globals changed, {Added_Globals} added, "
+          "{Removed_Globals} removed, {New_Errors} new errors, {Cleared_Errors} cleared".format(
+              len(diff["databases"]), len(diff.get("Added_Databases", ())), len(diff.get("Removed_Databases", ())),
+              **counts), file=sys.stderr)
+
+
+# The values of each global that are compared, from the level that's being compared
+DIFF_METRICS = ["Blocks", "Size_KB", "Percent_Full", "Elapsed_Seconds"]
+# What's listed for each database besides the changed globals and totals, see diff_database()
+DIFF_DATABASE_LISTS = ["Added_Globals", "Removed_Globals", "New_Errors", "Cleared_Errors"]
+
+
+def diff_index(integ_file: Path, level: str = 'Total', engine: str = 'text') -> {}:
+    """ Returns the parts of an integ file that diff_reports() compares, the values of each global as a tuple of
+    DIFF_METRICS so it's a fraction of the size of the JSON:
+        {"name": "INTEG.txt", "profile": {...},
+         "databases": {"/db/": {"globals": {"GLOBAL1": (19, 152, 69, 0.0)}, "totals": {...}, "errors": {...}}}}
+    A .json file is integ2json output, its first integ file is used.  Safe to run in a worker process. """
+    if integ_file.suffix == '.json':
+        with open(integ_file, 'r') as fp:
+            integ_json = json.load(fp)
+        name, integfile_data = next(iter(integ_json.items()))
+        events = integfile_to_events(integfile_data)
+    else:
+        name = integfile_name(integ_file)
+        events = iter_integfile(integ_file, engine=engine)
+    index = {"name": name, "profile": {}, "databases": {}}
+    databases = index["databases"]
+    for event, database, glbl, values in events:
+        if event == "global":
+            level_values = values["Data"].get(level, {})
+            databases[database]["globals"][glbl] = (
+                level_values.get("Blocks"), level_values.get("Size_KB"), level_values.get("Percent_Full"),
+                values["Time"].get("Elapsed_Seconds"))
+        elif event == "database":
+            databases[database] = {"globals": {}, "totals": {}, "errors": {}}
+        elif event == "totals":
+            databases[database]["totals"] = values
+        elif event == "errors":
+            databases[database]["errors"].update(values)
+        elif event == "profile":
+            index["profile"] = values
+    return index
+
+
+def diff_reports(old: {}, new: {}) -> {}:
+    """ Compares two diff_index()es, returns only what changed:
+        {"Old": "INTEG_1.txt", "New": "INTEG_2.txt", "profile": {"Elapsed_Seconds": 12.0},
+         "databases": {"/db/": {see diff_database()}}, "Added_Databases": [...], "Removed_Databases": [...]}
+    Globals and databases are matched by name in dicts, so it's one pass over each report. """
+    diff = {"Old": old["name"], "New": new["name"]}
+    profile_diff = diff_values(old["profile"], new["profile"], ["Elapsed_Seconds"])
+    if profile_diff:
+        diff["profile"] = profile_diff
+    diff["databases"] = {}
+    added_databases = []
+    for database, new_data in new["databases"].items():
+        old_data = old["databases"].get(database)
+        if old_data is None:
+            added_databases.append(database)
+            continue
+        database_diff = diff_database(old_data, new_data)
+        if database_diff:
+            diff["databases"][database] = database_diff
+    removed_databases = [database for database in old["databases"] if database not in new["databases"]]
+    if added_databases:
+        diff["Added_Databases"] = added_databases
+    if removed_databases:
+        diff["Removed_Databases"] = removed_databases
+    return diff
+
+
+def diff_database(old_data: {}, new_data: {}) -> {}:
+    """ Compares a database in two diff_index()es, returns what changed, leaving out anything that didn't:
+        {"totals": {"Total_blocks": 120, "Elapsed_Seconds": 2.5},
+         "globals": {"GLOBAL1": {"Blocks": 100, "Size_KB": 800, "Percent_Full": -3}},
+         "Added_Globals": {"GLOBAL9": {"Blocks": 5, ...}}, "Removed_Globals": ["GLOBAL2"],
+         "New_Errors": {"GLOBAL3": "error text"}, "Cleared_Errors": {"GLOBAL4": "error text"}}
+    The changes are new minus old. """
+    database_diff = {}
+    old_totals = old_data["totals"]
+    new_totals = new_data["totals"]
+    totals_diff = diff_values(old_totals, new_totals, [field for field, value in new_totals.items()
+                                                       if isinstance(value, (int, float))])
+    if totals_diff:
+        database_diff["totals"] = totals_diff
+    old_globals = old_data["globals"]
+    new_globals = new_data["globals"]
+    globals_diff = {}
+    added_globals = {}
+    for glbl, new_values in new_globals.items():
+        old_values = old_globals.get(glbl)
+        if old_values is None:
+            added_globals[glbl] = dict(zip(DIFF_METRICS, new_values))
+        elif old_values != new_values:
+            global_diff = diff_global(old_values, new_values)
+            if global_diff:
+                globals_diff[glbl] = global_diff
+    if globals_diff:
+        database_diff["globals"] = globals_diff
+    lists = {
+        "Added_Globals": added_globals,
+        "Removed_Globals": [glbl for glbl in old_globals if glbl not in new_globals],
+        "New_Errors": {glbl: error for glbl, error in new_data["errors"].items()
+                       if old_data["errors"].get(glbl) != error},
+        "Cleared_Errors": {glbl: error for glbl, error in old_data["errors"].items()
+                           if glbl not in new_data["errors"]}
+    }
+    for key in DIFF_DATABASE_LISTS:
+        if lists[key]:
+            database_diff[key] = lists[key]
+    return database_diff
+
+
+def diff_global(old_values: tuple, new_values: tuple) -> {}:
+    """ Returns new minus old of each of the DIFF_METRICS of a global that changed, see diff_database().
+    Same as diff_values(), straight from the tuples of diff_index(), there can be millions of these. """
+    global_diff = {}
+    for metric, old_value, new_value in zip(DIFF_METRICS, old_values, new_values):
+        if old_value != new_value and old_value is not None and new_value is not None:
+            change = new_value - old_value
+            global_diff[metric] = round(change, 3) if type(change) is float else change
+    return global_diff
+
+
+def diff_values(old: {}, new: {}, fields: list) -> {}:
+    """ Returns new minus old of each of the fields that changed.  Fields that either of them doesn't have are
+    left out.  Floats are rounded, they're only ever to a tenth of a second. """
+    changes = {}
+    for field in fields:
+        old_value = old.get(field)
+        new_value = new.get(field)
+        if old_value is None or new_value is None or old_value == new_value:
+            continue
+        change = new_value - old_value
+        changes[field] = round(change, 3) if isinstance(change, float) else change
+    return changes
+
+
+def parse_diff_args(argv: list):
+    """ Deal with the args of the diff subcommand. """
+    parser = argparse.ArgumentParser(prog='integ2json.py diff',
+                                     description='Show what changed between two integ reports: the growth of each '
+                                                 'database and global, added and removed globals, and new or cleared errors')
+    parser.add_argument('old', help='The older integ file, or integ2json JSON file', type=Path)
+    parser.add_argument('new', help='The newer integ file, or integ2json JSON file', type=Path)
+    parser.add_argument('-o', '--outfile',
+                        help='Write the changes to this file (default is stdout)',
+                        type=Path)
+    parser.add_argument('-l', '--level',
+                        help='The level of each global to compare (default Total)',
+                        default='Total')
+    parser.add_argument('-j', '--jobs',
+                        help='Number of files to parse at the same time, in separate processes (default 2).',
+                        metavar='N',
+                        type=int,
+                        default=2)
+    parser.add_argument('-e', '--engine',
+                        help='How to read the integ files (see integ2json.py -h).',
+                        choices=['text', 'mmap'],
+                        default='text')
+    parser.add_argument('-b', '--beautify',
+                        help='Beautify JSON output',
+                        action='store_true',
+                        default=False)
+    parser.add_argument('--encoder',
+                        help='The JSON encoder (see integ2json.py -h).',
+                        choices=JSON_ENCODERS,
+                        default='json')
+    args = parser.parse_args(argv)
+    for integ_file in (args.old, args.new):
+        if not integ_file.is_file():
+            sys.exit(f"Integrity file does not exist: {integ_file}")
+    if args.jobs < 0:
+        sys.exit("Jobs must be 0 or more.  Exiting...")
+    args.compress = None
+    check_output_args(args)
+    return args
+
+
+LOOKUP_INDEX_SUFFIX = ".idx"
+# Bump this when what's in the index changes, older indexes are rebuilt
+LOOKUP_INDEX_VERSION = 1
+LOOKUP_INDEX_SCHEMA = """
+CREATE TABLE IF NOT EXISTS source (
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    version INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS sections (
+    database TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    name TEXT NOT NULL,
+    offset INTEGER NOT NULL,
+    length INTEGER NOT NULL,
+    PRIMARY KEY (database, kind, name)
+) WITHOUT ROWID;
+"""
+# The Global: line each global starts with, see lookup_index_rows().  nb: \n not ^, so re can search for it as a
+#  plain string, which is several times faster.
+GLOBAL_LINE_BYTES_PATTERN = re.compile(rb'\nGlobal: (\S+)')
+
+
+def lookup_main(argv: list) -> None:
+    """ The lookup subcommand, finds one database's totals or some of its globals in a huge integ file without
+    parsing the rest of it.
+        integ2json.py lookup FILE DATABASE [GLOBAL...]
+    The byte offsets of every database and global are kept in an index next to the file, made the first time
+    and again whenever the file changes, see open_lookup_index().  Compressed files can't be seeked into, so they
+    are parsed with --database/--global filters instead. """
+    args = parse_lookup_args(argv)
+    if_str = integfile_name(args.integfile)
+    # Before there's an index next to it
+    if not is_integfile(args.integfile):
+        sys.exit("File {} is not an integrity file.  Exiting...".format(args.integfile))
+    if compression_type(args.integfile):
+        print("{} is compressed, it can't be indexed, parsing it instead.".format(args.integfile), file=sys.stderr)
+        lookup_json = lookup_parse(args.integfile, args.database, args.glbls, args.all)
+    else:
+        with closing(open_lookup_index(args.integfile, args.index, args.reindex)) as conn:
+            if args.database is None:
+                return
+            lookup_json = lookup_sections(conn, args.integfile, args.database, args.glbls, args.all)
+    if not lookup_json["databases"]:
+        sys.exit("No database {} in {}.  Exiting...".format(args.database, args.integfile))
+    dumps = json_encoder(args.encoder, args.beautify)["dumps"]
+    sys.stdout.buffer.write(dumps({if_str: lookup_json}) + b'\n')
+
+
+def open_lookup_index(integ_file: Path, index: Path = None, reindex: bool = False) -> sqlite3.Connection:
+    """ Opens the lookup index of the integ file, index is where it is (default INTEG.txt.idx next to the file).
+    It's (re)built if it's new, or the file's size or mtime aren't the ones it was built from, or reindex.
+    If it can't be written it's built in memory, and is gone again after this lookup.
+    Raises NotAnIntegFile if the file doesn't start like an integ file. """
+    import sqlite3
+    index = index or integ_file.with_name(integ_file.name + LOOKUP_INDEX_SUFFIX)
+    try:
+        conn = sqlite3.connect(index)
+        conn.executescript(LOOKUP_INDEX_SCHEMA)
+    except sqlite3.Error as e:
+        print("Can't write index {} ({}), it's only kept in memory.".format(index, e), file=sys.stderr)
+        conn = sqlite3.connect(':memory:')
+        conn.executescript(LOOKUP_INDEX_SCHEMA)
+    stat = integ_file.stat()
+    source = (stat.st_size, stat.st_mtime_ns, LOOKUP_INDEX_VERSION)
+    if reindex or conn.execute("SELECT size, mtime_ns, version FROM source").fetchone() != source:
+        start = time.perf_counter()
+        # Quicker than deleting every row
+        conn.executescript("DROP TABLE source; DROP TABLE sections;" + LOOKUP_INDEX_SCHEMA)
+        with conn:
+            if stat.st_size:
+                with open(integ_file, 'rb') as fp, mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    if not sniff_integfile(mm[:INTEG_HEADER_PEEK]):
+                        raise NotAnIntegFile(source_str(integ_file))
+                    conn.executemany("INSERT OR REPLACE INTO sections VALUES (?, ?, ?, ?, ?)",
+                                     lookup_index_rows(integ_file, mm))
+            conn.execute("INSERT INTO source VALUES (?, ?, ?)", source)
+        counts = dict(conn.execute("SELECT kind, count(*) FROM sections GROUP BY kind").fetchall())
+        print("Indexed {} ({:,} databases, {:,} globals) in {:.2f}s".format(
+            integ_file, counts.get("database", 0), counts.get("global", 0), time.perf_counter() - start),
+            file=sys.stderr)
+    return conn
+
+
+def lookup_index_rows(integ_file: Path, buffer) -> Iterator:
+    """ Yields a (database, kind, name, offset, length) row of the lookup index for each section of the mmapped
+    integ file.  kind is 'database' for the whole ---Directory--- section (see scan_sections()), 'global' from a
+    global's Global: line up to the next one, and 'totals' from the ---Total for directory--- line to the end
+    of the section, which has the database's errors too.  name is the global's, '' for the others. """
+    encoding = locale.getpreferredencoding(False)
+    for offset, length in scan_sections(integ_file, buffer):
+        database = section_database(buffer, offset)
+        end = offset + length
+        yield (database, "database", "", offset, length)
+        totals = buffer.find(b'\n---Total for directory ', offset, end)
+        totals = end if totals == -1 else totals + 1
+        glbl = glbl_offset = None
+        for match in GLOBAL_LINE_BYTES_PATTERN.finditer(buffer, offset, totals):
+            if glbl is not None:
+                yield (database, "global", glbl, glbl_offset, match.start() + 1 - glbl_offset)
+            glbl, glbl_offset = match.group(1).decode(encoding), match.start() + 1
+        if glbl is not None:
+            yield (database, "global", glbl, glbl_offset, totals - glbl_offset)
+        if totals < end:
+            yield (database, "totals", "", totals, end - totals)
+
+
+def lookup_sections(conn: sqlite3.Connection, integ_file: Path, database: str, glbls: list = None,
+                    whole: bool = False) -> {}:
+    """ Returns the deal_with_integfile() JSON of just the database and globals asked for, each read straight from
+    its offset in the lookup index.  Without glbls it's the database's totals and errors, or all of it if whole.
+    database and glbls are names or patterns, see new_name_filter(). """
+    integfile_data = {"databases": {}}
+    for database in lookup_names(conn, "database", [database]):
+        if whole:
+            offset, length = lookup_offset(conn, database, "database", "")
+            section = deal_with_events(deal_with_section(integ_file, offset, length))
+            integfile_data["databases"].update(section["databases"])
+            continue
+        database_data = integfile_data["databases"][database] = {}
+        if glbls:
+            database_data["globals"] = {}
+            for glbl in lookup_names(conn, "global", glbls, database):
+                offset, length = lookup_offset(conn, database, "global", glbl)
+                with io.TextIOWrapper(io.BytesIO(read_section(integ_file, offset, length))) as fp:
+                    # The Global: line
+                    next(fp)
+                    database_data["globals"][glbl] = deal_with_global(fp, glbl)
+            continue
+        totals = lookup_offset(conn, database, "totals", "")
+        database_data["totals"] = {}
+        if totals:
+            with io.TextIOWrapper(io.BytesIO(read_section(integ_file, *totals))) as fp:
+                # The ---Total for directory--- line
+                next(fp)
+                database_data["totals"] = deal_with_endofdatabase(fp)
+                database_errors = deal_with_database_errors(fp)
+            if database_errors:
+                database_data["errors"] = database_errors["errors"]
+    return integfile_data
+
+
+def lookup_names(conn: sqlite3.Connection, kind: str, patterns: list, database: str = None) -> list:
+    """ Returns the names of the databases (or the globals of database) in the lookup index that match patterns.
+    Each one is looked up in the index as a plain name first, so old/VMS directories like _DIR:[DATABASE1] find
+     themselves.  Only the ones that aren't a name are matched against every name as patterns. """
+    if kind == "database":
+        query, params = "SELECT database FROM sections WHERE kind = 'database'", ()
+    else:
+        query, params = "SELECT name FROM sections WHERE database = ? AND kind = 'global'", (database,)
+    column = "database" if kind == "database" else "name"
+    names = []
+    name_patterns = []
+    for pattern in dict.fromkeys(patterns):
+        found = [name for (name,) in conn.execute(query + " AND {} = ?".format(column), params + (pattern,))]
+        if found:
+            names.extend(found)
+        elif pattern.startswith('re:') or any(c in pattern for c in '*?['):
+            name_patterns.append(pattern)
+    if name_patterns:
+        name_filter = new_name_filter(name_patterns)
+        found = set(names)
+        names.extend(name for (name,) in conn.execute(query + " ORDER BY offset", params)
+                     if name not in found and name_allowed(name_filter, name))
+    return names
+
+
+def lookup_offset(conn: sqlite3.Connection, database: str, kind: str, name: str) -> tuple:
+    """ Returns the (offset, length) of a section in the lookup index, or None. """
+    return conn.execute("SELECT offset, length FROM sections WHERE database = ? AND kind = ? AND name = ?",
+                        (database, kind, name)).fetchone()
+
+
+def lookup_parse(integ_file: Path, database: str, glbls: list = None, whole: bool = False) -> {}:
+    """ Same as lookup_sections(), for files that can't be indexed.  The whole file is read, but only the database
+    and globals asked for are parsed, see new_filters(). """
+    events = check_integfile(iter_integfile(integ_file, filters=new_filters([database], None, glbls)))
+    integfile_data = deal_with_events(events)
+    del integfile_data["profile"]
+    # The errors are in each database, like lookup_sections(), not rolled up as well
+    integfile_data.pop("errors", None)
+    for database_data in integfile_data["databases"].values():
+        if glbls:
+            database_data.pop("totals")
+            database_data.pop("errors", None)
+        elif not whole:
+            database_data.pop("globals")
+    return integfile_data
+
+
+def parse_lookup_args(argv: list):
+    """ Deal with the args of the lookup subcommand. """
+    parser = argparse.ArgumentParser(prog='integ2json.py lookup',
+                                     description='Look up one database or some globals in a huge integ file, without '
+                                                 'parsing all of it.  The first lookup indexes where each database and '
+                                                 'global is, and the index is rebuilt whenever the file changes.')
+    parser.add_argument('integfile', help='The integ file', type=Path)
+    parser.add_argument('database',
+                        help='The database, or a pattern (see integ2json.py --database).  Without it the index is just '
+                             'made, if it is not up to date.',
+                        nargs='?')
+    parser.add_argument('glbls',
+                        help='Globals of the database, or patterns.  Without them the database\'s totals and errors '
+                             'are shown.',
+                        metavar='global',
+                        nargs='*')
+    parser.add_argument('-a', '--all',
+                        help='All of the database, its globals, totals and errors.',
+                        action='store_true',
+                        default=False)
+    parser.add_argument('-i', '--index',
+                        help='Where the index is kept, an sqlite file (default is the integ file + {}).'.format(
+                            LOOKUP_INDEX_SUFFIX),
+                        type=Path)
+    parser.add_argument('-r', '--reindex',
+                        help='Rebuild the index, even if it is up to date.',
+                        action='store_true',
+                        default=False)
+    parser.add_argument('-b', '--beautify',
+                        help='Beautify JSON output',
+                        action='store_true',
+                        default=False)
+    parser.add_argument('--encoder',
+                        help='The JSON encoder (see integ2json.py -h).',
+                        choices=JSON_ENCODERS,
+                        default='json')
+    args = parser.parse_args(argv)
+    if not args.integfile.is_file():
+        sys.exit(f"Integrity file does not exist: {args.integfile}")
+    if args.all and args.glbls:
+        sys.exit("--all is the whole database, it can't be used with globals.  Exiting...")
+    # Bad patterns are found before anything's indexed
+    new_filters([args.database] if args.database else None, None, args.glbls)
+    args.compress = None
+    check_output_args(args)
+    return args
+
+
+def serve_main(argv: list) -> None:
+    """ The serve subcommand, a local HTTP server of the JSON of the integ files in some directories, so dashboards
+    and scripts don't have to reparse them every time they ask.
+        integ2json.py serve [-p PORT] DIRS...
+        GET /reports                            {"reports": [the integ files in DIRS]}
+        GET /reports/FILE                       {integ_name: deal_with_integfile() JSON}
+        GET /reports/FILE/databases/DATABASE    one database's JSON, ie: /reports/INTEG.txt/databases/%2Fdb%2F
+        GET /reports/FILE/errors                {"errors": {...}}, the same as --errors-only
+    FILE is relative to one of DIRS, nothing outside them is served.  Runs until it's interrupted. """
+    import asyncio
+    args = parse_serve_args(argv)
+    try:
+        asyncio.run(serve_reports(args))
+    except KeyboardInterrupt:
+        print("Stopped serving.")
+
+
+async def serve_reports(args) -> None:
+    """ Answers the HTTP requests of serve_main() on args.host and args.port, one connection per request.
+    Files are parsed when they're asked for, and kept in a cache of args.cache_reports of them, see cached_report(). """
+    import asyncio
+    cache = new_report_cache(args.cache_reports, args.jobs, args.engine)
+    dumps = json_encoder(args.encoder)["dumps"]
+    server = await asyncio.start_server(lambda reader, writer: serve_request(reader, writer, args.dirs, args.pattern,
+                                                                             cache, dumps),
+                                        args.host, args.port)
+    host, port = server.sockets[0].getsockname()[:2]
+    print("Serving {} on http://{}:{}/reports".format(", ".join(str(directory) for directory in args.dirs), host, port),
+          flush=True)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        if cache["pool"] is not None:
+            cache["pool"].shutdown(wait=False, cancel_futures=True)
+
+
+async def serve_request(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, dirs: list, pattern: str,
+                        cache: {}, dumps) -> None:
+    """ Reads one HTTP request, writes the JSON answer to it (see serve_route()) and closes the connection. """
+    from http import HTTPStatus
+    start = time.perf_counter()
+    target = None
+    try:
+        request_line = (await reader.readline()).decode('latin-1')
+        # The headers, none of them matter to us
+        while (await reader.readline()).strip():
+            pass
+        method, target, http_version = request_line.split()
+        status, body = await serve_route(method, target, dirs, pattern, cache)
+    except ValueError:
+        # Not HTTP, or a line longer than the reader's limit
+        status, body = HTTPStatus.BAD_REQUEST, {"error": "Bad request"}
+    except ConnectionError:
+        writer.close()
+        return
+    payload = dumps(body)
+    writer.write("HTTP/1.1 {} {}\r\nContent-Type: application/json\r\nContent-Length: {}\r\n"
+                 "Connection: close\r\n\r\n".format(status.value, status.phrase, len(payload)).encode('latin-1'))
+    writer.write(payload)
+    try:
+        await writer.drain()
+    except ConnectionError:
+        pass
+    writer.close()
+    print("{} {} {:.3f}s".format(target, status.value, time.perf_counter() - start), flush=True)
+
+
+async def serve_route(method: str, target: str, dirs: list, pattern: str, cache: {}) -> tuple:
+    """ Returns the (HTTPStatus, JSON) answer to a request for target, from the first of SERVE_ROUTES whose
+    pattern matches its path.  See serve_main(). """
+    from http import HTTPStatus
+    if method != 'GET':
+        return HTTPStatus.METHOD_NOT_ALLOWED, {"error": "Only GET is supported"}
+    path = urlsplit(target).path
+    for path_pattern, route in SERVE_ROUTES:
+        match = path_pattern.fullmatch(path)
+        if match:
+            return await route(match, dirs, pattern, cache)
+    return HTTPStatus.NOT_FOUND, {"error": "Not found: {}".format(path)}
+
+
+async def route_reports(match: re.Match, dirs: list, pattern: str, cache: {}) -> tuple:
+    """ /reports: the names of the integ files in dirs. """
+    import asyncio
+    from http import HTTPStatus
+    integ_files = await asyncio.to_thread(scan_watched_dirs, dirs, pattern)
+    return HTTPStatus.OK, {"reports": sorted({integ_file.name for integ_file in integ_files})}
+
+
+async def route_report(match: re.Match, dirs: list, pattern: str, cache: {}) -> tuple:
+    """ /reports/NAME: the JSON of the integ file. """
+    from http import HTTPStatus
+    integ_file, answer = await served_report(dirs, cache, unquote(match["name"]))
+    if integ_file is None:
+        return answer
+    return HTTPStatus.OK, {integfile_name(integ_file): answer}
+
+
+async def route_errors(match: re.Match, dirs: list, pattern: str, cache: {}) -> tuple:
+    """ /reports/NAME/errors: the errors of the integ file. """
+    from http import HTTPStatus
+    integ_file, answer = await served_report(dirs, cache, unquote(match["name"]))
+    if integ_file is None:
+        return answer
+    return HTTPStatus.OK, {"errors": answer.get("errors", {})}
+
+
+async def route_database(match: re.Match, dirs: list, pattern: str, cache: {}) -> tuple:
+    """ /reports/NAME/databases/DATABASE: the JSON of one database of the integ file. """
+    from http import HTTPStatus
+    name, database = unquote(match["name"]), unquote(match["database"])
+    integ_file, answer = await served_report(dirs, cache, name)
+    if integ_file is None:
+        return answer
+    if database not in answer["databases"]:
+        return HTTPStatus.NOT_FOUND, {"error": "No database {} in {}".format(database, name)}
+    return HTTPStatus.OK, answer["databases"][database]
+
+
+async def served_report(dirs: list, cache: {}, name: str) -> tuple:
+    """ Returns (integ_file, its JSON) for the integ file called name, see cached_report().
+    If it can't, it's (None, the (HTTPStatus, JSON) answer saying why). """
+    from http import HTTPStatus
+    integ_file = served_file(dirs, name)
+    if integ_file is None:
+        return None, (HTTPStatus.NOT_FOUND, {"error": "No integ file {}".format(name)})
+    try:
+        return integ_file, await cached_report(cache, integ_file)
+    except NotAnIntegFile:
+        return None, (HTTPStatus.NOT_FOUND, {"error": "{} is not an integrity file".format(name)})
+    except (Exception, SystemExit) as e:
+        # A bad file mustn't take the server down with it, parsing errors are sys.exit()s
+        return None, (HTTPStatus.INTERNAL_SERVER_ERROR, {"error": "Failed to parse {}: {}".format(name, e)})
+
+
+# The answers of serve_route(), the first one whose pattern matches the path of the request is used.
+# Names are split off before they're unquoted, database names are full of /s and they might not be quoted.
+SERVE_ROUTES = [
+    (re.compile(r'/reports/*'), route_reports),
+    (re.compile(r'/reports/(?P<name>.*?)/databases/(?P<database>.*)', re.S), route_database),
+    (re.compile(r'/reports/(?P<name>.*)/errors', re.S), route_errors),
+    (re.compile(r'/reports/(?P<name>.*)', re.S), route_report)
+]
+
+
+def served_file(dirs: list, name: str) -> Path:
+    """ Returns the file called name in the first of dirs that has it, or None.  Never anything outside dirs. """
+    for directory in dirs:
+        directory = directory.resolve()
+        integ_file = (directory / name).resolve()
+        if integ_file.is_relative_to(directory) and integ_file.is_file():
+            return integ_file
+    return None
+
+
+def new_report_cache(max_reports: int = 16, jobs: int = 1, engine: str = 'text') -> {}:
+    """ Returns an empty cache of parsed integ files, see cached_report():
+        {"max_reports": 16, "jobs": 1, "engine": "text", "pool": ProcessPoolExecutor, made when it's first needed,
+         "reports": {integ_file: ((size, mtime_ns), JSON)}, least recently used first,
+         "parsing": {(integ_file, (size, mtime_ns)): the future of the JSON}} """
+    from collections import OrderedDict
+    return {"max_reports": max_reports, "jobs": jobs, "engine": engine, "pool": None,
+            "reports": OrderedDict(), "parsing": {}}
+
+
+async def cached_report(cache: {}, integ_file: Path) -> {}:
+    """ Returns the deal_with_integfile() JSON of integ_file, from the cache unless it's changed since.
+    Otherwise it's parsed in the cache's pool, and every request for it while that's happening waits for the same
+    parse.  Once it's done it's cached, and the least recently used file is dropped if there are too many.
+    Raises NotAnIntegFile, or whatever else parsing it does. """
+    import asyncio
+    from concurrent.futures import ProcessPoolExecutor
+    from concurrent.futures.process import BrokenProcessPool
+    stat = integ_file.stat()
+    version = (stat.st_size, stat.st_mtime_ns)
+    reports = cache["reports"]
+    if integ_file in reports and reports[integ_file][0] == version:
+        reports.move_to_end(integ_file)
+        return reports[integ_file][1]
+    key = (integ_file, version)
+    future = cache["parsing"].get(key)
+    if future is None:
+        if cache["pool"] is None:
+            cache["pool"] = ProcessPoolExecutor(max_workers=cache["jobs"])
+        future = asyncio.get_running_loop().run_in_executor(cache["pool"], deal_with_integfile, integ_file, None,
+                                                            cache["engine"])
+        cache["parsing"][key] = future
+
+        def parsed(future):
+            del cache["parsing"][key]
+            if future.cancelled():
+                return
+            if isinstance(future.exception(), BrokenProcessPool):
+                cache["pool"] = None
+            elif future.exception() is None and cache["max_reports"] > 0:
+                # Unless a newer version of it finished first
+                if integ_file not in reports or reports[integ_file][0][1] <= version[1]:
+                    reports[integ_file] = (version, future.result())
+                    reports.move_to_end(integ_file)
+                while len(reports) > cache["max_reports"]:
+                    reports.popitem(last=False)
+        future.add_done_callback(parsed)
+    # Shielded, so one request going away doesn't cancel the parse the others are waiting for
+    return await asyncio.shield(future)
+
+
+def parse_serve_args(argv: list):
+    """ Deal with the args of the serve subcommand. """
+    parser = argparse.ArgumentParser(prog='integ2json.py serve',
+                                     description='Serve the JSON of the integ files in some directories over HTTP, '
+                                                 'parsing each one once and keeping the recent ones in memory')
+    parser.add_argument('--host',
+                        help='The address to listen on (default 127.0.0.1, only this machine)',
+                        default='127.0.0.1')
+    parser.add_argument('-p', '--port',
+                        help='The port to listen on (default 8080, 0 is any free one)',
+                        type=int,
+                        default=8080)
+    parser.add_argument('--pattern',
+                        help="Only list files whose names match this in /reports, ie: 'INTEG_*.txt' (default is every file)",
+                        default='*')
+    parser.add_argument('--cache-reports',
+                        help='How many parsed files to keep in memory (default 16).  A file is parsed again once '
+                             'it changes.',
+                        metavar='N',
+                        type=int,
+                        default=16)
+    parser.add_argument('-j', '--jobs',
+                        help='Number of files to parse at the same time, in separate processes (default 2).',
+                        metavar='N',
+                        type=int,
+                        default=2)
+    parser.add_argument('-e', '--engine',
+                        help='How to read the integ files (see integ2json.py -h).',
+                        choices=['text', 'mmap'],
+                        default='text')
+    parser.add_argument('--encoder',
+                        help='The JSON encoder (see integ2json.py -h).',
+                        choices=JSON_ENCODERS,
+                        default='json')
+    parser.add_argument('dirs',
+                        help='Directories of integ files to serve',
+                        type=Path,
+                        nargs="+")
+    args = parser.parse_args(argv)
+    if args.jobs < 1:
+        sys.exit("Jobs must be 1 or more.  Exiting...")
+    if args.cache_reports < 0:
+        sys.exit("Cache reports must be 0 or more.  Exiting...")
+    for directory in args.dirs:
+        if not directory.is_dir():
+            sys.exit("Directory {} does not exist.  Exiting...".format(directory))
+    args.beautify = False
+    args.compress = None
+    check_output_args(args)
+    return args
+
+
+def args_filters(args) -> {}:
+    """ Returns the filters of the --database/--global args, see new_filters(). """
+    return new_filters(args.databases, args.exclude_databases, args.glbls, args.exclude_glbls)
+
+
+def check_output_args(args) -> None:
+    """ Makes sure the encoder and compression asked for are installed, before there's any output. """
+    json_encoder(args.encoder, args.beautify)
+    if args.compress == 'zstd' and optional_module('zstandard') is None:
+        sys.exit("zstd compression needs the zstandard module, it is not installed.  Exiting...")
+
+
+# Subcommands are picked by the first arg, anything else is a list of integ files for main()
+SUBCOMMANDS = {
+    'trend': trend_main,
+    'watch': watch_main,
+    'diff': diff_main,
+    'lookup': lookup_main,
+    'serve': serve_main
+}
+
+
+def parse_args(args):
+    """ Deal with the args."""
+
+    parser = argparse.ArgumentParser(
+                        description='Convert Intersystems Cache Integrity Files to JSON',
+                        epilog='Subcommands: {} (see integ2json.py SUBCOMMAND -h)'.format(', '.join(SUBCOMMANDS)))
+    parser.add_argument('-s', '--singlefile',
+                        help='Store everything in a single JSON file (-o is mandatory).',
+                        action='store_true')
+    parser.add_argument('-d', '--deidentify',
+                        help='Deidentify databases/globals/etcetc.  hash replaces each name with a hash of it, '
+                             'generic numbers them in the order they are found (eg: global_0).  '
+                             'Either way a name gets the same pseudonym everywhere it is used.',
+                        choices=['hash', 'generic'])
+    parser.add_argument('--pseudonyms',
+                        help='With --deidentify, keep the pseudonyms in this JSON file so they stay the same between runs '
+                             '(it is made if it does not exist).  It maps the pseudonyms back to the real names, keep it private.',
+                        metavar='file',
+                        type=Path)
+    parser.add_argument('-b', '--beautify',
+                        help='Beautify JSON output (significantly increases size of output file)',
+                        action='store_true',
+                        default=False)
+    parser.add_argument('-F', '--format',
+                        help='Output format: one JSON document (default), ndjson with a line of JSON per global and database total, '
+                             'or csv with a row per global level and database total.',
+                        choices=list(FORMAT_SUFFIX),
+                        default='json')
+    parser.add_argument('--encoder',
+                        help='The JSON encoder: json (default) is the stdlib, orjson or ujson are faster, auto is the fastest one '
+                             'installed.  orjson and ujson write compact JSON without spaces, and orjson doesn\'t escape non-ASCII, '
+                             '--beautify always uses json.',
+                        choices=JSON_ENCODERS,
+                        default='json')
+    parser.add_argument('-z', '--compress',
+                        help='Compress the outfiles as they are written, with gzip (.gz) or zstd (.zst, needs the zstandard module).',
+                        choices=list(COMPRESS_SUFFIX))
+    parser.add_argument('--stream',
+                        help='Write the JSON as the integ file is parsed, so memory use stays flat. '
+                             'With --beautify, databases and globals are kept in file order.',
+                        action='store_true',
+                        default=False)
+    parser.add_argument('-j', '--jobs',
+                        help='Number of files to convert at the same time, in separate processes (0 is one per CPU).',
+                        metavar='N',
+                        type=int,
+                        default=1)
+    parser.add_argument('--split',
+                        help='Parse the databases of each file in parallel, instead of one file per job (use with --jobs).',
+                        action='store_true',
+                        default=False)
+    parser.add_argument('-e', '--engine',
+                        help='How to read the integ files: text (default), or mmap which scans uncompressed files as bytes '
+                             '(faster on very large files, same output).',
+                        choices=['text', 'mmap'],
+                        default='text')
+    parser.add_argument('-c', '--cache',
+                        help='Keep a cache of converted files in outdir, and only convert files that have changed since the last run '
+                             '(-o is mandatory).',
+                        action='store_true',
+                        default=False)
+    parser.add_argument('-f', '--follow',
+                        help='Parse a single integ file while it is still being written, outputting each database and global '
+                             'as a line of JSON as soon as it is finished (to stdout, or a .ndjson file in outdir).',
+                        action='store_true',
+                        default=False)
+    parser.add_argument('--follow-interval',
+                        help='With --follow, how often to check for more of the file (default 1 second).',
+                        metavar='seconds',
+                        type=float,
+                        default=1.0)
+    parser.add_argument('--follow-timeout',
+                        help='With --follow, give up if nothing is written for this long (default is to wait forever).',
+                        metavar='seconds',
+                        type=float,
+                        default=None)
+    parser.add_argument('--summary',
+                        help='Add a summary to each database and file: the total size, how full the globals are '
+                             '(percentiles), how much space is wasted, and the largest and emptiest globals.',
+                        action='store_true',
+                        default=False)
+    parser.add_argument('--top',
+                        help='With --summary, how many globals to list (default 10).',
+                        metavar='N',
+                        type=int,
+                        default=10)
+    parser.add_argument('--database',
+                        help='Only parse the databases that match this pattern, a glob (ie: /prod/*) or a regex after re: '
+                             '(ie: re:^/prod/).  A name exactly the same as the pattern always matches, ie: _DIR:[DATABASE1].  '
+                             'Can be given more than once.  The rest are skipped without being parsed.',
+                        dest='databases',
+                        metavar='pattern',
+                        action='append')
+    parser.add_argument('--exclude-database',
+                        help='Skip the databases that match this pattern (see --database).',
+                        dest='exclude_databases',
+                        metavar='pattern',
+                        action='append')
+    parser.add_argument('--global',
+                        help='Only parse the globals that match this pattern (see --database).',
+                        dest='glbls',
+                        metavar='pattern',
+                        action='append')
+    parser.add_argument('--exclude-global',
+                        help='Skip the globals that match this pattern (see --database).',
+                        dest='exclude_glbls',
+                        metavar='pattern',
+                        action='append')
+    parser.add_argument('--errors-only',
+                        help='Only find the errors of each database, without parsing the globals, for alerting.  '
+                             'Outputs the same errors as a full conversion, in the form {"errors": {database: {global: error}}}.',
+                        action='store_true',
+                        default=False)
+    parser.add_argument('--shard-reports',
+                        help='Batch mode for many servers: group the files by the System and Configuration in their headers, '
+                             'and write each group to shards of at most N files, with a manifest of which shard each file '
+                             'is in (-o is mandatory).  Each file is written as it is parsed, so memory use stays flat.',
+                        metavar='N',
+                        type=int)
+    parser.add_argument('--shard-mb',
+                        help='Same as --shard-reports, but a shard is finished once it is this many MB.  '
+                             'They can be used together.',
+                        metavar='MB',
+                        type=float)
+    parser.add_argument('--stats',
+                        help='Print the time each phase took for each file (detect, parse, deidentify and output), '
+                             'with the bytes, lines, databases and globals per second, and the peak memory.',
+                        action='store_true',
+                        default=False)
+    parser.add_argument('--profile',
+                        help='Profile the conversion of each file with cProfile, to a .pstats file next to its outfile '
+                             '(see python -m pstats).',
+                        action='store_true',
+                        default=False)
+    parser.add_argument('-o', '--outdir',
+                        help='Location to put the JSON files (default is location of integ file)',
+                        metavar='outdir',
+                        type=Path)
+    parser.add_argument('--stdin',
+                        help='Read the names of the integ files from stdin, one per line, and convert each one as soon as '
+                             'its name is read, so a whole batch is converted by one process (ie: find ... | integ2json.py --stdin).',
+                        action='store_true',
+                        default=False)
+    parser.add_argument('files',
+                        help='List of Integrity files',
+                        nargs="*")
+    args = parser.parse_args(args)
+    check_args(args)
+    return args
+
+
+def check_args(args) -> None:
+    """ Sanity checks the args of parse_args(), exits if they don't make sense together. """
+    check_files_args(args)
+    check_cache_args(args)
+    check_mode_args(args)
+    check_shard_args(args)
+    check_output_args(args)
+    # Bad patterns are found now, not in every worker
+    args_filters(args)
+    if args.outdir:
+        if not args.outdir.is_dir():
+            sys.exit("File path {} does not exist.  Exiting...".format(args.outdir))
+        # Make sure we can write to the directory, without making a file in it to find out
+        if not os.access(args.outdir, os.W_OK | os.X_OK):
+            sys.exit("Files path {} is not writeable.  Exiting...".format(args.outdir))
+
+
+def check_files_args(args) -> None:
+    """ Makes sure there are integ files, from the command line or stdin, and that follow has just one. """
+    if args.stdin:
+        if args.files:
+            sys.exit("Integ files can not be given with the stdin flag, they're read from stdin.  Exiting...")
+        if args.singlefile or args.follow or args.shard_reports is not None or args.shard_mb is not None:
+            sys.exit("The stdin flag can not be used with singlefile, follow, shard-reports or shard-mb.  Exiting...")
+    elif not args.files:
+        sys.exit("No integ files given, list them or use the stdin flag.  Exiting...")
+    if args.follow:
+        if len(args.files) != 1:
+            sys.exit("The follow flag can only be used with a single integ file.  Exiting...")
+        if args.singlefile or args.stats or args.profile or args.compress:
+            sys.exit("The follow flag can not be used with singlefile, stats, profile or compress.  Exiting...")
+
+
+def check_cache_args(args) -> None:
+    """ Makes sure singlefile and the cache have an outdir to keep their files in, and work with the other args. """
+    if args.singlefile:
+        if not args.outdir:
+            sys.exit("If singlefile flag is used, outdir must be set.  Exiting...")
+    if args.cache:
+        if not args.outdir:
+            sys.exit("If cache flag is used, outdir must be set.  Exiting...")
+        if args.stream and args.singlefile:
+            sys.exit("The cache flag can not be used with stream and singlefile together.  Exiting...")
+        # Generic pseudonyms are numbered from 0 every run, so the cached files' would clash with the new ones'
+        if args.singlefile and args.deidentify == 'generic' and not args.pseudonyms:
+            sys.exit("The cache flag can only be used with singlefile and generic deidentify if pseudonyms is set.  Exiting...")
+
+
+def check_mode_args(args) -> None:
+    """ Makes sure the ways of converting the files that were asked for work together. """
+    if args.jobs < 0:
+        sys.exit("Jobs must be 0 or more.  Exiting...")
+    if args.pseudonyms and not args.deidentify:
+        sys.exit("If pseudonyms is set, deidentify must be used.  Exiting...")
+    if args.stream and args.split:
+        sys.exit("The stream flag can not be used with split.  Exiting...")
+    if args.errors_only:
+        if args.stream or args.follow or args.summary or args.format != 'json':
+            sys.exit("The errors-only flag can not be used with stream, follow, summary or a flat format.  Exiting...")
+
+
+def check_shard_args(args) -> None:
+    """ Makes sure the shards have room for something and an outdir, and aren't asked for with what they don't do. """
+    if args.shard_reports is None and args.shard_mb is None:
+        return
+    if (args.shard_reports is not None and args.shard_reports < 1) or (args.shard_mb is not None and args.shard_mb <= 0):
+        sys.exit("Shards must have room for something.  Exiting...")
+    if not args.outdir:
+        sys.exit("If shard-reports or shard-mb is used, outdir must be set.  Exiting...")
+    if args.singlefile or args.cache or args.follow or args.errors_only or args.profile:
+        sys.exit("Shards can not be used with singlefile, cache, follow, errors-only or profile.  Exiting...")
+
+
+def run(argv: list = None) -> None:
+    """ Runs the subcommand or conversion on the command line, argv is the args after the program name.
+    It's run by integ2json.py, which is only this, so that the code is an imported module: Python keeps the compiled
+     bytecode of a module, whereas a script is compiled again every time it's run. """
+    argv = sys.argv[1:] if argv is None else argv
+    if argv and argv[0] in SUBCOMMANDS:
+        SUBCOMMANDS[argv[0]](argv[1:])
+    else:
+        main(parse_args(argv))
@@ -0,0 +1,31 @@
+import shutil
+from pathlib import Path
+
+import pytest
+
+from helpers import TESTFILES, write_integfile, write_vms_integfile
+
+
+@pytest.fixture
+def integ_dir(tmp_path) -> Path:
+    """ A directory with the AIX sample, the zipped one, the empty file and a VMS one. """
+    integ_dir = tmp_path / 'integ'
+    integ_dir.mkdir()
+    shutil.copy(TESTFILES / 'INTEG_example_cache201721_AIX.txt', integ_dir / 'INTEG_aix.txt')
+    shutil.copy(TESTFILES / 'INTEG_example_cache201721_AIX.zip', integ_dir / 'INTEG_aix_zipped.zip')
+    shutil.copy(TESTFILES / 'INTEG_example_emptyfile.txt', integ_dir / 'INTEG_emptyfile.txt')
+    write_vms_integfile(integ_dir / 'INTEG_vms.txt')
+    return integ_dir
+
+
+@pytest.fixture
+def vms_file(tmp_path) -> Path:
+    """ An old/VMS integ file, see write_vms_integfile(). """
+    return write_vms_integfile(tmp_path / 'INTEG_vms.txt')
+
+
+@pytest.fixture
+def synthetic_file(tmp_path) -> Path:
+    """ A generated integ file with errors and big strings, big enough to have a few of everything. """
+    return write_integfile(tmp_path / 'INTEG_synthetic.txt', databases=6, globals_per_database=40, errors=5,
+                           big_strings=0.3, seed=1)
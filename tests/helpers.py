@@ -0,0 +1,51 @@
+""" What the tests share: running integ2json.py like it's run from the command line, and making integ files to run it
+on, see conftest.py for the fixtures. """
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+REPO = Path(__file__).resolve().parent.parent
+TESTFILES = REPO / 'testfiles'
+# The names of the JSON files of the integ_dir fixture, the zip member's is named after the member
+INTEG_DIR_OUTFILES = {'INTEG_aix.json', 'INTEG_example_cache201721_AIX.json', 'INTEG_vms.json'}
+VMS_DATABASE = '_DIR:[DATABASE1]'
+
+sys.path.insert(0, str(REPO))
+import gen_integfile  # noqa: E402
+
+
+def integ2json(*argv, check: bool = True, **kwargs) -> subprocess.CompletedProcess:
+    """ Runs integ2json.py with argv, like it's run from the command line. """
+    return subprocess.run([sys.executable, str(REPO / 'integ2json.py'), *map(str, argv)],
+                          capture_output=True, text=True, check=check, **kwargs)
+
+
+def load_outdir(outdir: Path) -> {}:
+    """ Returns the JSON of every .json file in outdir, by file name. """
+    return {outfile.name: json.loads(outfile.read_text()) for outfile in sorted(outdir.glob('*.json'))}
+
+
+def write_integfile(integ_file: Path, **kwargs) -> Path:
+    """ Writes a synthetic integ file, see gen_integfile.generate_integfile() for the kwargs. """
+    with open(integ_file, 'w') as fp:
+        gen_integfile.generate_integfile(fp, **kwargs)
+    return integ_file
+
+
+def write_vms_integfile(integ_file: Path) -> Path:
+    """ Writes an integ file like an old/VMS Cache would, with directories like _DIR:[DATABASE1]. """
+    return write_integfile(integ_file, databases=4, globals_per_database=30, errors=3, old_format=True)
+
+
+def integ_files(integ_dir: Path) -> list:
+    """ Returns the integ files in integ_dir, integ2json.py only takes files. """
+    return sorted(integ_dir.glob('INTEG_*'))
+
+
+def convert(integ_dir: Path, outdir: Path, *argv) -> {}:
+    """ Converts the integ files in integ_dir (or just the one integ file) to outdir with argv, returns the JSON
+    written there. """
+    outdir.mkdir()
+    integ2json('-o', outdir, *argv, *(integ_files(integ_dir) if integ_dir.is_dir() else [integ_dir]))
+    return load_outdir(outdir)
@@ -0,0 +1,77 @@
+""" [user-007] With --cache only the files that have changed since the last run are converted again. """
+import pytest
+
+from helpers import convert, integ2json, integ_files, load_outdir, write_integfile
+
+
+@pytest.fixture
+def two_files(tmp_path):
+    integ_dir = tmp_path / 'integ'
+    integ_dir.mkdir()
+    write_integfile(integ_dir / 'INTEG_a.txt', databases=2, globals_per_database=20, seed=1)
+    write_integfile(integ_dir / 'INTEG_b.txt', databases=2, globals_per_database=20, seed=2)
+    return integ_dir
+
+
+def rerun(integ_dir, outdir, *argv) -> str:
+    """ Runs integ2json.py with --cache again, returns what it printed. """
+    return integ2json('-o', outdir, '-c', *argv, *integ_files(integ_dir)).stdout
+
+
+def test_cache_skips_unchanged(two_files, tmp_path):
+    outdir = tmp_path / 'out'
+    want = convert(two_files, outdir, '-c')
+    assert (outdir / 'integ2json_cache.json').exists()
+    printed = rerun(two_files, outdir)
+    assert printed.count("because it hasn't changed") == 2
+    # It's the contents that count, not the mtime
+    (two_files / 'INTEG_a.txt').touch()
+    assert rerun(two_files, outdir).count("because it hasn't changed") == 2
+    write_integfile(two_files / 'INTEG_b.txt', databases=3, globals_per_database=20, seed=3)
+    printed = rerun(two_files, outdir)
+    assert 'INTEG_a.txt because it hasn\'t changed' in printed
+    assert 'Converted {}'.format(two_files / 'INTEG_b.txt') in printed
+    outfiles = load_outdir(outdir)
+    assert outfiles['INTEG_a.json'] == want['INTEG_a.json']
+    assert len(outfiles['INTEG_b.json']['INTEG_b.txt']['databases']) == 3
+
+
+def test_cache_missing_outfile(two_files, tmp_path):
+    """ A file whose outfile has gone is converted again, even though it hasn't changed. """
+    outdir = tmp_path / 'out'
+    want = convert(two_files, outdir, '-c')
+    (outdir / 'INTEG_a.json').unlink()
+    assert 'Converted {}'.format(two_files / 'INTEG_a.txt') in rerun(two_files, outdir)
+    assert load_outdir(outdir) == want
+
+
+def test_cache_singlefile(two_files, tmp_path):
+    """ The cached files are still in integ2json.json, without parsing them again. """
+    outdir = tmp_path / 'out'
+    want = convert(two_files, outdir, '-s', '-c')['integ2json.json']
+    assert len(want) == 2
+    assert rerun(two_files, outdir, '-s').count("because it hasn't changed") == 2
+    assert load_outdir(outdir)['integ2json.json'] == want
+
+
+def test_cache_singlefile_generic_needs_pseudonyms(integ_dir, tmp_path):
+    """ Generic pseudonyms start from 0 every run, so cached files' JSON would clash with the new files'. """
+    done = integ2json('-o', tmp_path, '-s', '-c', '-d', 'generic', *integ_files(integ_dir), check=False)
+    assert done.returncode != 0
+    assert 'pseudonyms' in done.stderr
+    assert not (tmp_path / 'integ2json.json').exists()
+
+
+@pytest.mark.parametrize('deidentify', [['-d', 'hash'], ['-d', 'generic', '--pseudonyms', 'PSEUDONYMS']])
+def test_cache_singlefile_deidentify(integ_dir, tmp_path, deidentify):
+    """ A file added between runs is converted, the cached one is kept, and it's the same as converting both. """
+    deidentify = [str(tmp_path / arg) if arg == 'PSEUDONYMS' else arg for arg in deidentify]
+    vms_file = integ_dir / 'INTEG_vms.txt'
+    aside = vms_file.rename(tmp_path / vms_file.name)
+    outdir = tmp_path / 'cached'
+    convert(integ_dir, outdir, '-s', '-c', *deidentify)
+    aside.rename(vms_file)
+    integ2json('-o', outdir, '-s', '-c', *deidentify, *integ_files(integ_dir))
+    cached = load_outdir(outdir)['integ2json.json']
+    assert len(cached) == 3
+    assert convert(integ_dir, tmp_path / 'uncached', '-s', *deidentify)['integ2json.json'] == cached
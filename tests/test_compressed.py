@@ -0,0 +1,53 @@
+""" [user-005] gzip files and the members of zip files are read straight from them, and give the same JSON as the
+plain integ file.  Which they are is decided from their first bytes, not their names. """
+import gzip
+import shutil
+import zipfile
+
+import pytest
+
+from helpers import TESTFILES, convert
+
+SAMPLE = TESTFILES / 'INTEG_example_cache201721_AIX.txt'
+
+
+@pytest.fixture
+def report(tmp_path) -> {}:
+    """ The JSON of the AIX sample, without its file name. """
+    (report,) = convert(SAMPLE, tmp_path / 'plain')['INTEG_example_cache201721_AIX.json'].values()
+    return report
+
+
+def write_gzip(integ_file):
+    with open(SAMPLE, 'rb') as fp, gzip.open(integ_file, 'wb') as gz:
+        shutil.copyfileobj(fp, gz)
+    return integ_file
+
+
+def test_gzip(tmp_path, report):
+    integ_file = write_gzip(tmp_path / 'INTEG_aix.txt.gz')
+    assert convert(integ_file, tmp_path / 'out') == {'INTEG_aix.json': {'INTEG_aix.txt': report}}
+
+
+def test_zip(tmp_path, report):
+    assert convert(TESTFILES / 'INTEG_example_cache201721_AIX.zip', tmp_path / 'out') == \
+        {'INTEG_example_cache201721_AIX.json': {'INTEG_example_cache201721_AIX.txt': report}}
+
+
+def test_zip_members(tmp_path, report):
+    """ Each member is converted to its own file, the ones that aren't integ files are skipped. """
+    integ_file = tmp_path / 'INTEG_many.zip'
+    with zipfile.ZipFile(integ_file, 'w', zipfile.ZIP_DEFLATED) as zip_file:
+        zip_file.write(SAMPLE, 'INTEG_one.txt')
+        zip_file.write(SAMPLE, 'reports/INTEG_two.txt')
+        zip_file.writestr('README.txt', 'Not an integ file\n')
+    assert convert(integ_file, tmp_path / 'out') == {'INTEG_one.json': {'INTEG_one.txt': report},
+                                                     'INTEG_two.json': {'INTEG_two.txt': report}}
+
+
+def test_magic_not_names(tmp_path, report):
+    """ A gzip file called .txt is still unzipped, and a text file called .zip is read as text. """
+    gzip_file = write_gzip(tmp_path / 'INTEG_gzip.txt')
+    text_file = shutil.copy(SAMPLE, tmp_path / 'INTEG_text.zip')
+    assert convert(gzip_file, tmp_path / 'gzip') == {'INTEG_gzip.json': {'INTEG_gzip.txt': report}}
+    assert convert(text_file, tmp_path / 'text') == {'INTEG_text.json': {'INTEG_text.zip': report}}
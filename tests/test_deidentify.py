@@ -0,0 +1,73 @@
+""" [user-010] --deidentify replaces every name with its pseudonym, and nothing else.  A name gets the same pseudonym
+everywhere, and --pseudonyms keeps them between runs. """
+import json
+
+import pytest
+
+from helpers import convert, integ2json, integ_files, load_outdir
+
+
+def pseudonymize(file_json: {}, table: {}) -> {}:
+    """ Replaces the names in the JSON of a converted file with their pseudonyms in table, a --pseudonyms file. """
+    def rename(names: {}, kind: str, rename_value=None) -> {}:
+        return {table[kind][name]: rename_value(value) if rename_value else value for name, value in names.items()}
+
+    def rename_database(database_json: {}) -> {}:
+        database_json = dict(database_json, globals=rename(database_json["globals"], "global"))
+        if "errors" in database_json:
+            database_json["errors"] = rename(database_json["errors"], "global")
+        return database_json
+
+    deidentified = {}
+    for integ_name, report in file_json.items():
+        report = dict(report, databases=rename(report["databases"], "database", rename_database))
+        report["profile"] = dict(report["profile"], System_Name=table["SystemName"][report["profile"]["System_Name"]],
+                                 System_Instance=table["SystemInstance"][report["profile"]["System_Instance"]])
+        if "errors" in report:
+            report["errors"] = rename(report["errors"], "database", lambda errors: rename(errors, "global"))
+        deidentified[table["integfile"][integ_name]] = report
+    return deidentified
+
+
+@pytest.mark.parametrize('method', ['hash', 'generic'])
+def test_deidentify_only_names(integ_dir, tmp_path, method):
+    pseudonyms = tmp_path / 'pseudonyms.json'
+    want = convert(integ_dir, tmp_path / 'plain')
+    outfiles = convert(integ_dir, tmp_path / 'deidentified', '-d', method, '--pseudonyms', pseudonyms)
+    table = json.loads(pseudonyms.read_text())
+    assert table["method"] == method
+    assert outfiles == {name: pseudonymize(file_json, table) for name, file_json in want.items()}
+    text = json.dumps(outfiles)
+    assert not any(name in text for kind in ("integfile", "database", "global") for name in table[kind])
+
+
+def test_deidentify_generic_numbering(integ_dir, tmp_path):
+    """ Names are numbered in the order they're found, and a global in two databases is the same pseudonym. """
+    (report,) = convert(integ_dir / 'INTEG_vms.txt', tmp_path / 'out', '-d', 'generic')['INTEG_vms.json'].values()
+    assert list(report["databases"]) == ['database_{}'.format(number) for number in range(4)]
+    for database_json in report["databases"].values():
+        assert list(database_json["globals"]) == ['global_{}'.format(number) for number in range(30)]
+
+
+def test_deidentify_pseudonyms_kept(integ_dir, tmp_path):
+    """ With --pseudonyms, a file converted on its own later gets the pseudonyms it had before. """
+    pseudonyms = tmp_path / 'pseudonyms.json'
+    together = convert(integ_dir, tmp_path / 'together', '-d', 'generic', '--pseudonyms', pseudonyms)
+    for integ_file in integ_files(integ_dir):
+        outdir = tmp_path / integ_file.name
+        outdir.mkdir()
+        integ2json('-o', outdir, '-d', 'generic', '--pseudonyms', pseudonyms, integ_file)
+        for name, file_json in load_outdir(outdir).items():
+            assert file_json == together[name]
+
+
+@pytest.mark.parametrize('file_format', ['ndjson', 'csv'])
+def test_deidentify_formats(integ_dir, tmp_path, file_format):
+    """ Names are replaced as the file is parsed, so the flat formats are deidentified too. """
+    pseudonyms = tmp_path / 'pseudonyms.json'
+    outdir = tmp_path / 'out'
+    convert(integ_dir, outdir, '-d', 'hash', '--pseudonyms', pseudonyms, '-F', file_format)
+    table = json.loads(pseudonyms.read_text())
+    text = ''.join(outfile.read_text() for outfile in outdir.iterdir())
+    assert table["global"] and table["database"]
+    assert not any(name in text for kind in ("integfile", "database", "global") for name in table[kind])
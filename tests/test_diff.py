@@ -0,0 +1,92 @@
+""" [user-020] diff shows only what changed between two reports: the growth of each global and database, the globals
+and databases that were added or removed, and the errors that are new or cleared. """
+import json
+
+import pytest
+
+from helpers import convert, integ2json, write_integfile
+
+METRICS = ["Blocks", "Size_KB", "Percent_Full", "Elapsed_Seconds"]
+
+
+@pytest.fixture
+def reports(tmp_path) -> tuple:
+    """ Two nights' reports, the second has another database and more globals in each. """
+    old = write_integfile(tmp_path / 'INTEG_old.txt', databases=3, globals_per_database=8, errors=3, seed=1)
+    new = write_integfile(tmp_path / 'INTEG_new.txt', databases=4, globals_per_database=10, errors=3, seed=2)
+    return old, new
+
+
+def diff(*argv) -> {}:
+    return json.loads(integ2json('diff', *argv).stdout)
+
+
+def subtract(old: {}, new: {}, fields) -> {}:
+    """ new minus old of the fields that changed. """
+    changes = {field: new[field] - old[field] for field in fields
+               if field in old and field in new and old[field] != new[field]}
+    return {field: round(change, 3) if isinstance(change, float) else change for field, change in changes.items()}
+
+
+def global_values(global_json: {}) -> {}:
+    return {**global_json["Data"]["Total"], "Elapsed_Seconds": global_json["Time"]["Elapsed_Seconds"]}
+
+
+def want_database(old_json: {}, new_json: {}, old_errors: {}, new_errors: {}) -> {}:
+    """ The diff of a database, worked out from the JSON of it in each report. """
+    old_globals = old_json["globals"]
+    new_globals = new_json["globals"]
+    want = {
+        "totals": subtract(old_json["totals"], new_json["totals"],
+                           [field for field, value in new_json["totals"].items() if isinstance(value, (int, float))]),
+        "globals": {glbl: subtract(global_values(old_globals[glbl]), global_values(new_globals[glbl]), METRICS)
+                    for glbl in new_globals if glbl in old_globals},
+        "Added_Globals": {glbl: {metric: global_values(global_json)[metric] for metric in METRICS}
+                          for glbl, global_json in new_globals.items() if glbl not in old_globals},
+        "Removed_Globals": [glbl for glbl in old_globals if glbl not in new_globals],
+        "New_Errors": {glbl: error for glbl, error in new_errors.items() if old_errors.get(glbl) != error},
+        "Cleared_Errors": {glbl: error for glbl, error in old_errors.items() if glbl not in new_errors},
+    }
+    want["globals"] = {glbl: changes for glbl, changes in want["globals"].items() if changes}
+    return {key: value for key, value in want.items() if value}
+
+
+def test_diff_itself(reports):
+    old, _ = reports
+    assert diff(old, old) == {"Old": 'INTEG_old.txt', "New": 'INTEG_old.txt', "databases": {}}
+
+
+@pytest.mark.parametrize('argv', [[], ['-j', '1'], ['-e', 'mmap']])
+def test_diff(reports, tmp_path, argv):
+    old, new = reports
+    (old_json,) = convert(old, tmp_path / 'old')['INTEG_old.json'].values()
+    (new_json,) = convert(new, tmp_path / 'new')['INTEG_new.json'].values()
+    got = diff(old, new, *argv)
+    assert got.pop("Old") == 'INTEG_old.txt' and got.pop("New") == 'INTEG_new.txt'
+    assert got.pop("profile") == subtract(old_json["profile"], new_json["profile"], ["Elapsed_Seconds"])
+    assert got.pop("Added_Databases") == ['/database/db3/']
+    want = {}
+    for database, database_json in old_json["databases"].items():
+        want[database] = want_database(database_json, new_json["databases"][database],
+                                       old_json["errors"].get(database, {}), new_json["errors"].get(database, {}))
+    assert got == {"databases": want}
+    assert all(database_diff["Added_Globals"].keys() == {'GLOBAL8', 'GLOBAL9'} for database_diff in want.values())
+
+
+def test_diff_removed(reports):
+    old, new = reports
+    got = diff(new, old)
+    assert got["Removed_Databases"] == ['/database/db3/']
+    assert all(database_diff["Removed_Globals"] == ['GLOBAL8', 'GLOBAL9'] for database_diff in got["databases"].values())
+    assert "Added_Databases" not in got
+
+
+def test_diff_json(reports, tmp_path):
+    """ integ2json's JSON of the reports gives the same diff as the reports, and -o writes it to a file. """
+    old, new = reports
+    outdir = tmp_path / 'json'
+    convert(old.parent, outdir)
+    outfile = tmp_path / 'diff.json'
+    printed = integ2json('diff', outdir / 'INTEG_old.json', outdir / 'INTEG_new.json', '-o', outfile)
+    assert json.loads(outfile.read_text()) == diff(old, new)
+    assert '3 databases changed (1 added, 0 removed), 24 globals changed, 6 added, 0 removed' in printed.stderr
@@ -0,0 +1,85 @@
+""" [user-018] The JSON encoders and compressing the outfiles: json, the default, writes what it always has, the faster
+ones the same JSON without the spaces, and gzip or zstd outfiles are the same JSON compressed. """
+import gzip
+import json
+
+import pytest
+
+from helpers import integ2json
+
+import integ2json as integ2json_module
+
+# The ways of writing outfiles the encoders have to do the same in
+MODES = [[], ['--stream'], ['-s'], ['-j', '2']]
+
+
+def outfile_bytes(integ_file, outdir, *argv) -> bytes:
+    """ Converts integ_file to outdir with argv, returns the bytes of the one outfile. """
+    outdir.mkdir()
+    integ2json('-o', outdir, *argv, integ_file)
+    (outfile,) = outdir.iterdir()
+    return outfile.read_bytes()
+
+
+def test_json_default(synthetic_file, tmp_path):
+    """ The stdlib json, compact or beautified. """
+    compact = outfile_bytes(synthetic_file, tmp_path / 'compact')
+    assert compact == outfile_bytes(synthetic_file, tmp_path / 'json', '--encoder', 'json')
+    assert compact == json.dumps(json.loads(compact)).encode()
+    beautified = outfile_bytes(synthetic_file, tmp_path / 'beautified', '-b')
+    assert beautified == json.dumps(json.loads(compact), indent=4, sort_keys=True).encode()
+    # --beautify always uses json
+    assert outfile_bytes(synthetic_file, tmp_path / 'auto', '-b', '--encoder', 'auto') == beautified
+
+
+@pytest.mark.parametrize('argv', MODES)
+@pytest.mark.parametrize('encoder', ['orjson', 'ujson', 'auto'])
+def test_encoder_same_json(synthetic_file, tmp_path, encoder, argv):
+    if encoder != 'auto':
+        pytest.importorskip(encoder)
+    want = outfile_bytes(synthetic_file, tmp_path / 'json', *argv)
+    got = outfile_bytes(synthetic_file, tmp_path / encoder, '--encoder', encoder, *argv)
+    assert json.loads(got) == json.loads(want)
+    # The same keys in the same order, just without the spaces
+    assert got == json.dumps(json.loads(want), separators=(',', ':')).encode()
+
+
+@pytest.mark.parametrize('encoder', ['orjson', 'ujson'])
+def test_encoder_not_installed(synthetic_file, tmp_path, encoder):
+    if integ2json_module.optional_module(encoder):
+        pytest.skip('{} is installed'.format(encoder))
+    run = integ2json('-o', tmp_path, '--encoder', encoder, synthetic_file, check=False)
+    assert run.returncode == 1
+    assert 'The {} encoder is not installed.'.format(encoder) in run.stderr
+
+
+def test_ujson_escapes():
+    """ ujson is asked to escape non-ASCII like json does, but not the / of every database directory. """
+    pytest.importorskip('ujson')
+    value = {"/database/db0/": "café"}
+    assert integ2json_module.json_encoder('ujson')["dumps"](value) == \
+        json.dumps(value, separators=(',', ':')).encode()
+
+
+@pytest.mark.parametrize('argv', MODES)
+def test_gzip(synthetic_file, tmp_path, argv):
+    want = outfile_bytes(synthetic_file, tmp_path / 'json', *argv)
+    got = outfile_bytes(synthetic_file, tmp_path / 'gzip', '-z', 'gzip', *argv)
+    assert gzip.decompress(got) == want
+    assert next((tmp_path / 'gzip').iterdir()).name.endswith('.json.gz')
+
+
+def test_zstd(synthetic_file, tmp_path):
+    zstandard = pytest.importorskip('zstandard')
+    want = outfile_bytes(synthetic_file, tmp_path / 'json')
+    got = outfile_bytes(synthetic_file, tmp_path / 'zstd', '-z', 'zstd')
+    assert zstandard.ZstdDecompressor().decompressobj().decompress(got) == want
+    assert next((tmp_path / 'zstd').iterdir()).name == 'INTEG_synthetic.json.zst'
+
+
+def test_zstd_not_installed(synthetic_file, tmp_path):
+    if integ2json_module.optional_module('zstandard'):
+        pytest.skip('zstandard is installed')
+    run = integ2json('-o', tmp_path, '-z', 'zstd', synthetic_file, check=False)
+    assert run.returncode == 1
+    assert 'zstd compression needs the zstandard module' in run.stderr
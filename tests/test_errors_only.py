@@ -0,0 +1,45 @@
+""" [user-019] --errors-only finds the same errors a full conversion does, without parsing the globals, whatever kind of
+file they're in and however they're converted. """
+import gzip
+import shutil
+
+import pytest
+
+from helpers import convert, integ2json, write_integfile
+
+
+@pytest.fixture
+def errors_dir(integ_dir, synthetic_file):
+    """ integ_dir, and the synthetic file with errors, gzipped too, and one without errors. """
+    shutil.copy(synthetic_file, integ_dir)
+    with open(synthetic_file, 'rb') as fp, gzip.open(integ_dir / 'INTEG_gzipped.txt.gz', 'wb') as gz:
+        shutil.copyfileobj(fp, gz)
+    write_integfile(integ_dir / 'INTEG_ok.txt', databases=3, globals_per_database=10)
+    return integ_dir
+
+
+def by_integfile(outdir_json: {}) -> {}:
+    """ The JSON of each integ file, whichever outfile it's in, ie: with --singlefile they're all in one. """
+    return {if_str: integfile_json for file_json in outdir_json.values() for if_str, integfile_json in file_json.items()}
+
+
+@pytest.mark.parametrize('argv', [[], ['-e', 'mmap'], ['-j', '2'], ['-s']])
+def test_errors_only(errors_dir, tmp_path, argv):
+    full = by_integfile(convert(errors_dir, tmp_path / 'full', *argv))
+    got = by_integfile(convert(errors_dir, tmp_path / 'errors', '--errors-only', *argv))
+    assert got == {if_str: {"errors": integfile_json.get("errors", {})} for if_str, integfile_json in full.items()}
+    # There's something to find
+    assert len(got['INTEG_gzipped.txt']["errors"]) > 1
+    assert got['INTEG_ok.txt'] == {"errors": {}}
+
+
+@pytest.mark.parametrize('flag', ['--stream', '--summary', '--follow'])
+def test_errors_only_refused(synthetic_file, tmp_path, flag):
+    run = integ2json('-o', tmp_path, '--errors-only', flag, synthetic_file, check=False)
+    assert run.returncode == 1
+    assert 'The errors-only flag can not be used with' in run.stderr
+
+
+def test_errors_only_flat_format_refused(synthetic_file, tmp_path):
+    run = integ2json('-o', tmp_path, '--errors-only', '-f', 'csv', synthetic_file, check=False)
+    assert run.returncode == 1
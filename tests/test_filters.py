@@ -0,0 +1,65 @@
+""" [user-021] --database, --global and their excludes only parse the databases and globals that match, as globs or
+re: regexes, with every engine, and filter the errors the same way. """
+import re
+from fnmatch import fnmatchcase
+from pathlib import Path
+
+import pytest
+
+from helpers import VMS_DATABASE, convert
+
+ENGINES = [[], ['-e', 'mmap'], ['--split', '-j', '2'], ['--stream']]
+
+
+def convert_report(integ_file: Path, outdir: Path, *argv) -> {}:
+    """ Converts the one integ file, returns its JSON. """
+    (file_json,) = convert(integ_file, outdir, *argv).values()
+    (integ_json,) = file_json.values()
+    return integ_json
+
+
+def filtered(integ_json: {}, database_matches, global_matches) -> ({}, {}):
+    """ The databases and errors of a full conversion, with only the databases and globals that match. """
+    databases = {}
+    for database, database_json in integ_json["databases"].items():
+        if database_matches(database):
+            globals_ = {glbl: global_json for glbl, global_json in database_json["globals"].items()
+                        if global_matches(glbl)}
+            databases[database] = {**database_json, "globals": globals_}
+    errors = {database: {glbl: error for glbl, error in database_errors.items() if global_matches(glbl)}
+              for database, database_errors in integ_json.get("errors", {}).items() if database_matches(database)}
+    return databases, {database: database_errors for database, database_errors in errors.items() if database_errors}
+
+
+@pytest.mark.parametrize('argv', ENGINES[:3])
+def test_filters_vms_names(vms_file, tmp_path, argv):
+    """ A VMS directory is a glob character class as a pattern, it's matched as it is. """
+    databases = convert_report(vms_file, tmp_path / 'all', *argv)["databases"]
+    assert VMS_DATABASE in databases
+    only = convert_report(vms_file, tmp_path / 'only', '--database', VMS_DATABASE, *argv)
+    assert only["databases"] == {VMS_DATABASE: databases[VMS_DATABASE]}
+    without = convert_report(vms_file, tmp_path / 'without', '--exclude-database', VMS_DATABASE, *argv)
+    assert without["databases"] == {name: data for name, data in databases.items() if name != VMS_DATABASE}
+
+
+@pytest.mark.parametrize('argv', ENGINES)
+@pytest.mark.parametrize('filters, database_matches, global_matches', [
+    (['--database', '/database/db[13]/'], lambda database: database in ('/database/db1/', '/database/db3/'), None),
+    (['--database', 're:db[0-2]', '--exclude-database', '*db1*'],
+     lambda database: database in ('/database/db0/', '/database/db2/'), None),
+    (['--global', 'GLOBAL1*'], None, lambda glbl: fnmatchcase(glbl, 'GLOBAL1*')),
+    (['--exclude-global', 're:^GLOBAL[0-9]$', '--exclude-global', 'GLOBAL3?'], None,
+     lambda glbl: not re.search('^GLOBAL[0-9]$', glbl) and not fnmatchcase(glbl, 'GLOBAL3?')),
+    (['--database', '/database/db2/', '--global', 're:[05]$'], lambda database: database == '/database/db2/',
+     lambda glbl: glbl.endswith(('0', '5'))),
+])
+def test_filters(synthetic_file, tmp_path, argv, filters, database_matches, global_matches):
+    all_json = convert_report(synthetic_file, tmp_path / 'all')
+    got = convert_report(synthetic_file, tmp_path / 'some', *filters, *argv)
+    databases, errors = filtered(all_json, database_matches or (lambda database: True),
+                                 global_matches or (lambda glbl: True))
+    # Something's filtered out, and something isn't
+    assert 0 < sum(len(database_json["globals"]) for database_json in databases.values()) < 240
+    assert {database: database_json["globals"] for database, database_json in got["databases"].items()} == \
+        {database: database_json["globals"] for database, database_json in databases.items()}
+    assert got.get("errors", {}) == errors
@@ -0,0 +1,73 @@
+""" [user-008] --follow parses an integ file while it's still being written, and outputs the same globals, totals
+and errors as converting the finished file. """
+import io
+import json
+import threading
+import time
+
+from helpers import convert, integ2json
+
+import gen_integfile
+
+
+def write_slowly(integ_file, text: str, pieces: int = 20) -> None:
+    """ Writes text to integ_file a piece at a time, most of them ending half way through a line. """
+    size = len(text) // pieces + 1
+    with open(integ_file, 'w') as fp:
+        for start in range(0, len(text), size):
+            fp.write(text[start:start + size])
+            fp.flush()
+            time.sleep(0.02)
+
+
+def follow_to_json(events: list) -> {}:
+    """ Puts the events of --follow back together into the JSON of a report. """
+    integ_json = {"databases": {}}
+    for event in events:
+        if event["event"] == "database":
+            integ_json["databases"][event["database"]] = {"globals": {}}
+        elif event["event"] == "global":
+            integ_json["databases"][event["database"]]["globals"][event["global"]] = \
+                {"Data": event["Data"], "Time": event["Time"]}
+        elif event["event"] == "totals":
+            integ_json["databases"][event["database"]]["totals"] = event["totals"]
+        elif event["event"] == "errors":
+            integ_json["databases"][event["database"]]["errors"] = event["errors"]
+        elif event["event"] == "profile":
+            integ_json["profile"] = event["profile"]
+    return integ_json
+
+
+def test_follow_while_written(tmp_path):
+    text = io.StringIO()
+    gen_integfile.generate_integfile(text, databases=3, globals_per_database=20, big_strings=0.3)
+    integ_file = tmp_path / 'INTEG_running.txt'
+    integ_file.write_text('')
+    writer = threading.Thread(target=write_slowly, args=(integ_file, text.getvalue()))
+    writer.start()
+    try:
+        # It stops by itself at the last line, the timeout is only in case it doesn't
+        done = integ2json('--follow', '--follow-interval', '0.01', '--follow-timeout', '10', integ_file, timeout=60)
+    finally:
+        writer.join()
+    events = [json.loads(line) for line in done.stdout.splitlines()]
+    assert {event["file"] for event in events} == {'INTEG_running.txt'}
+    assert sum(event["event"] == "global" for event in events) == 60
+    (want,) = convert(integ_file, tmp_path / 'out')['INTEG_running.json'].values()
+    followed = follow_to_json(events)
+    assert followed["profile"] == want["profile"]
+    for database, database_json in want["databases"].items():
+        assert followed["databases"][database]["globals"] == database_json["globals"]
+        assert followed["databases"][database]["totals"] == database_json["totals"]
+
+
+def test_follow_errors_and_timeout(synthetic_file, tmp_path):
+    """ A file with errors doesn't end with 'No Errors were found.', so it's the timeout that stops it. """
+    (want,) = convert(synthetic_file, tmp_path / 'out')['INTEG_synthetic.json'].values()
+    done = integ2json('--follow', '--follow-interval', '0.05', '--follow-timeout', '0.2', '-o', tmp_path,
+                      synthetic_file, timeout=60)
+    assert 'INTEG_synthetic.ndjson' in done.stdout
+    with open(tmp_path / 'INTEG_synthetic.ndjson') as fp:
+        followed = follow_to_json([json.loads(line) for line in fp])
+    errors = {database: followed["databases"][database]["errors"] for database in want["errors"]}
+    assert errors == want["errors"]
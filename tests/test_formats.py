@@ -0,0 +1,71 @@
+""" [user-009] --format ndjson and csv hold the same globals and database totals as the JSON. """
+import csv
+import json
+
+import pytest
+
+from helpers import convert, integ2json, integ_files
+
+
+@pytest.fixture
+def report(synthetic_file, tmp_path) -> {}:
+    (report,) = convert(synthetic_file, tmp_path / 'json')['INTEG_synthetic.json'].values()
+    return report
+
+
+def test_ndjson(synthetic_file, tmp_path, report):
+    convert(synthetic_file, tmp_path / 'out', '-F', 'ndjson')
+    with open(tmp_path / 'out' / 'INTEG_synthetic.ndjson') as fp:
+        records = [json.loads(line) for line in fp]
+    assert {record["file"] for record in records} == {'INTEG_synthetic.txt'}
+    globals_json = {}
+    for record in records:
+        database = report["databases"][record["database"]]
+        if record["event"] == "totals":
+            assert record["totals"] == database["totals"]
+        else:
+            assert record["event"] == "global"
+            globals_json[(record["database"], record["global"])] = {"Data": record["Data"], "Time": record["Time"]}
+    # The errors aren't in the flat formats, there's --errors-only for them
+    assert globals_json == {(database, glbl): {"Data": global_json["Data"], "Time": global_json["Time"]}
+                            for database, database_json in report["databases"].items()
+                            for glbl, global_json in database_json["globals"].items()}
+
+
+def test_csv(synthetic_file, tmp_path, report):
+    convert(synthetic_file, tmp_path / 'out', '-F', 'csv')
+    with open(tmp_path / 'out' / 'INTEG_synthetic.csv', newline='') as fp:
+        rows = list(csv.DictReader(fp))
+    global_rows = [row for row in rows if row["Record"] == "global"]
+    assert len(global_rows) == sum(len(global_json["Data"]) for database_json in report["databases"].values()
+                                   for global_json in database_json["globals"].values())
+    for row in global_rows:
+        global_json = report["databases"][row["Database"]]["globals"][row["Global"]]
+        level = global_json["Data"][row["Level"]]
+        assert (int(row["Blocks"]), int(row["Size_KB"]), int(row["Percent_Full"])) == \
+            (level["Blocks"], level["Size_KB"], level["Percent_Full"])
+        # Spelt the way the JSON always has
+        assert row["Big_Strings_Count"] == str(level.get("Big_Stings_Count", ""))
+        assert float(row["Elapsed_Seconds"]) == global_json["Time"]["Elapsed_Seconds"]
+    for row in rows:
+        if row["Record"] == "totals":
+            totals = report["databases"][row["Database"]]["totals"]
+            assert int(row["Blocks"]) == totals[row["Level"] + "_blocks"]
+
+
+@pytest.mark.parametrize('file_format', ['ndjson', 'csv'])
+def test_formats_same_every_way(integ_dir, tmp_path, file_format):
+    """ One file at a time, in a pool, or all of them in one file, the lines are the same. """
+    outdir = tmp_path / 'plain'
+    convert(integ_dir, outdir, '-F', file_format)
+    want = {outfile.name: outfile.read_text() for outfile in outdir.iterdir()}
+    assert len(want) == 3
+    outdir = tmp_path / 'jobs'
+    convert(integ_dir, outdir, '-F', file_format, '-j', '2')
+    assert {outfile.name: outfile.read_text() for outfile in outdir.iterdir()} == want
+    integ2json('-o', tmp_path, '-s', '-F', file_format, *integ_files(integ_dir))
+    lines = (tmp_path / ('integ2json.' + file_format)).read_text().splitlines()
+    if file_format == 'csv':
+        assert lines.count(lines[0]) == 1
+        want = {name: text.split('\n', 1)[1] for name, text in want.items()}
+    assert sorted(lines[file_format == 'csv':]) == sorted(line for text in want.values() for line in text.splitlines())
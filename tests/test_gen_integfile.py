@@ -0,0 +1,52 @@
+""" [user-011] gen_integfile.py writes the integ files it's asked for, the same ones for the same seed, and
+bench_integ2json.py runs on them. """
+import io
+import json
+import subprocess
+import sys
+
+import pytest
+
+from helpers import REPO, convert, write_integfile
+
+import gen_integfile
+
+
+def generate(**kwargs) -> str:
+    text = io.StringIO()
+    lines = gen_integfile.generate_integfile(text, **kwargs)
+    assert lines == text.getvalue().count('\n')
+    return text.getvalue()
+
+
+def test_same_seed_same_file():
+    assert generate(seed=3, errors=4) == generate(seed=3, errors=4)
+    assert generate(seed=3, errors=4) != generate(seed=4, errors=4)
+
+
+@pytest.mark.parametrize('old_format', [False, True])
+def test_generated_file(tmp_path, old_format):
+    integ_file = write_integfile(tmp_path / 'INTEG_gen.txt', databases=5, globals_per_database=12, errors=7,
+                                 big_strings=0.5, old_format=old_format)
+    (report,) = convert(integ_file, tmp_path / 'out')['INTEG_gen.json'].values()
+    assert len(report["databases"]) == 5
+    assert all(len(database_json["globals"]) == 12 for database_json in report["databases"].values())
+    assert sum(len(errors) for errors in report["errors"].values()) == 7
+    big_strings = [global_json for database_json in report["databases"].values()
+                   for global_json in database_json["globals"].values() if "Big_Strings" in global_json["Data"]]
+    assert 0 < len(big_strings) < 60
+    if old_format:
+        assert list(report["databases"])[0] == '_DIR:[DATABASE0]'
+        assert "System_Version" not in report["profile"]
+    else:
+        assert list(report["databases"])[0] == '/database/db0/'
+        assert report["profile"]["System_Version"] == '2017.2.1'
+
+
+def test_bench(tmp_path):
+    """ A tiny run of the benchmarks, and comparing it with itself. """
+    results = tmp_path / 'results.json'
+    bench = [sys.executable, str(REPO / 'bench_integ2json.py'), '-r', '1', '-d', '1', '-g', '5', '--cold-runs', '1']
+    subprocess.run([*bench, '-o', results], check=True, capture_output=True)
+    assert {"Global_Fields", "Integfile", "Cold_Start"} <= set(json.loads(results.read_text()))
+    subprocess.run([*bench, '--compare', results, '--tolerance', '100'], check=True, capture_output=True)
@@ -0,0 +1,40 @@
+""" [user-004] The precompiled pattern for the field lines of a global gives the same values as parsing them word
+by word. """
+import pytest
+
+from helpers import TESTFILES, write_integfile, write_vms_integfile
+
+import integ2json
+
+# Lines the pattern isn't written for, they're handed to deal_with_global_field_slow()
+ODD_LINES = [
+    "Data Level:\t# of blocks=1,170\t9,360kb (89% full)",
+    "Data Level: # of blocks=12 96kb (100% full) trailing words",
+    "Big Strings:          # of blocks=295,835     2311MB (68% full)  # = 241,005",
+]
+
+
+def field_lines(integ_file) -> list:
+    """ Returns the stripped field lines of the globals in integ_file. """
+    with open(integ_file) as fp:
+        return [line.strip() for line in fp if '# of blocks=' in line and ':' in line.split('#')[0]]
+
+
+@pytest.fixture
+def lines(tmp_path) -> list:
+    lines = field_lines(TESTFILES / 'INTEG_example_cache201721_AIX.txt')
+    lines += field_lines(write_vms_integfile(tmp_path / 'INTEG_vms.txt'))
+    lines += field_lines(write_integfile(tmp_path / 'INTEG_big.txt', databases=2, globals_per_database=200,
+                                         big_strings=0.5))
+    return lines + ODD_LINES
+
+
+def test_global_field_same_as_slow(lines):
+    assert len(lines) > 1000
+    for line in lines:
+        assert integ2json.deal_with_global_field(line) == integ2json.deal_with_global_field_slow(line), line
+
+
+def test_global_field_sizes():
+    assert integ2json.deal_with_global_field("Total:                # of blocks=297,006      2,320MB (89% full)") == \
+        ("Total", {"Blocks": 297006, "Size_KB": 2320 * 1024, "Percent_Full": 89})
@@ -0,0 +1,17 @@
+""" [user-002] Converting the files in a process pool with --jobs gives the same JSON as one at a time. """
+import pytest
+
+from helpers import INTEG_DIR_OUTFILES, convert
+
+
+@pytest.mark.parametrize('argv', [['-j', '2'], ['-j', '0'], ['-j', '2', '--stream'], ['-j', '2', '-d', 'hash']])
+def test_jobs_same_output(integ_dir, tmp_path, argv):
+    deidentify = argv[2:] if '-d' in argv else []
+    want = convert(integ_dir, tmp_path / 'plain', *deidentify)
+    assert set(want) == INTEG_DIR_OUTFILES
+    assert convert(integ_dir, tmp_path / 'jobs', *argv) == want
+
+
+def test_jobs_same_singlefile(integ_dir, tmp_path):
+    want = convert(integ_dir, tmp_path / 'plain', '-s')
+    assert convert(integ_dir, tmp_path / 'jobs', '-s', '-j', '2') == want
@@ -0,0 +1,70 @@
+""" [user-013] The library API: parse() gives the same JSON as the command line, and iter_records() yields the same
+globals and database totals, in file order. """
+import gzip
+import shutil
+
+import pytest
+
+from helpers import TESTFILES, convert, write_vms_integfile
+
+import integ2json
+
+SAMPLE_ZIP = TESTFILES / 'INTEG_example_cache201721_AIX.zip'
+SAMPLE_MEMBER = 'INTEG_example_cache201721_AIX.txt'
+
+
+@pytest.fixture(params=['aix', 'zip', 'gzip', 'vms', 'synthetic'])
+def source(request, tmp_path, synthetic_file) -> tuple:
+    """ (integ_file, member, the JSON of the command line) of each kind of integ file. """
+    member = None
+    if request.param == 'aix':
+        integ_file = TESTFILES / SAMPLE_MEMBER
+    elif request.param == 'zip':
+        integ_file, member = SAMPLE_ZIP, SAMPLE_MEMBER
+    elif request.param == 'gzip':
+        integ_file = tmp_path / 'INTEG_gzip.txt.gz'
+        with open(TESTFILES / SAMPLE_MEMBER, 'rb') as fp, gzip.open(integ_file, 'wb') as gz:
+            shutil.copyfileobj(fp, gz)
+    elif request.param == 'vms':
+        integ_file = write_vms_integfile(tmp_path / 'INTEG_vms.txt')
+    else:
+        integ_file = synthetic_file
+    (cli_json,) = convert(integ_file, tmp_path / 'cli').values()
+    return integ_file, member, cli_json
+
+
+@pytest.mark.parametrize('engine', ['text', 'mmap'])
+def test_parse_same_as_cli(source, engine):
+    integ_file, member, cli_json = source
+    report = integ2json.parse(integ_file, member, engine)
+    assert {report.name: report.to_json()} == cli_json
+
+
+@pytest.mark.parametrize('engine', ['text', 'mmap'])
+def test_iter_records_same_as_cli(source, engine):
+    integ_file, member, cli_json = source
+    (report_json,) = cli_json.values()
+    want = []
+    for database, database_json in report_json["databases"].items():
+        want.extend(("global", database, glbl, global_json) for glbl, global_json in database_json["globals"].items())
+        if database_json["totals"]:
+            want.append(("totals", database, None, database_json["totals"]))
+    records = [("global", record.database, record.name, record.to_json()) if isinstance(record, integ2json.GlobalStats)
+               else ("totals", record.database, None, record.to_json())
+               for record in integ2json.iter_records(integ_file, member, engine)]
+    assert records == want
+
+
+def test_records(synthetic_file):
+    """ The records are slotted, and the levels and errors are where they say they are. """
+    report = integ2json.parse(synthetic_file)
+    assert len(report.databases) == 6
+    assert sum(len(errors) for errors in report.errors.values()) == 5
+    for record in report:
+        assert not hasattr(record, '__dict__')
+    globals_ = [record for record in report if isinstance(record, integ2json.GlobalStats)]
+    assert len(globals_) == 240
+    for glbl in globals_:
+        # The generator's totals are the sum of the other levels
+        assert glbl.level("Total").blocks == sum(level.blocks for level in glbl.levels if level.name != "Total")
+        assert (glbl.errors is not None) == (glbl.name in (report.databases[glbl.database].errors or {}))
@@ -0,0 +1,99 @@
+""" [user-022] lookup finds a database or some of its globals, by name or pattern, out of an index of where they are in
+the file.  The index is made the first time, and again when the file changes. """
+import gzip
+import json
+import os
+import shutil
+from fnmatch import fnmatchcase
+
+from helpers import VMS_DATABASE, convert, integ2json, write_integfile
+
+
+def lookup(*argv) -> {}:
+    (lookup_json,) = json.loads(integ2json('lookup', *argv).stdout).values()
+    return lookup_json['databases']
+
+
+def full_databases(integ_file, outdir) -> {}:
+    """ The databases of the whole file converted. """
+    (file_json,) = convert(integ_file, outdir).values()
+    (integ_json,) = file_json.values()
+    return integ_json["databases"]
+
+
+def test_lookup_vms_names(vms_file, tmp_path):
+    database = full_databases(vms_file, tmp_path / 'all')[VMS_DATABASE]
+    assert lookup(vms_file, VMS_DATABASE, '-a') == {VMS_DATABASE: database}
+    globals_json = lookup(vms_file, VMS_DATABASE, 'GLOBAL1', 'GLOBAL2')[VMS_DATABASE]['globals']
+    assert globals_json == {name: database['globals'][name] for name in ('GLOBAL1', 'GLOBAL2')}
+    # The same out of the index the first lookup made
+    assert (tmp_path / 'INTEG_vms.txt.idx').exists()
+    assert lookup(vms_file, VMS_DATABASE, '-a') == {VMS_DATABASE: database}
+
+
+def test_lookup(synthetic_file, tmp_path):
+    databases = full_databases(synthetic_file, tmp_path / 'all')
+    for database, database_json in databases.items():
+        assert lookup(synthetic_file, database, '-a') == {database: database_json}
+        # Without globals it's the totals and errors
+        assert lookup(synthetic_file, database) == \
+            {database: {key: value for key, value in database_json.items() if key != "globals"}}
+        globals_json = lookup(synthetic_file, database, 'GLOBAL1*', 'GLOBAL22')[database]["globals"]
+        assert globals_json == {glbl: global_json for glbl, global_json in database_json["globals"].items()
+                                if fnmatchcase(glbl, 'GLOBAL1*') or glbl == 'GLOBAL22'}
+
+
+def test_lookup_index(tmp_path):
+    integ_file = write_integfile(tmp_path / 'INTEG_lookup.txt', databases=3, globals_per_database=10, seed=1)
+    index = tmp_path / 'INTEG_lookup.txt.idx'
+    first = integ2json('lookup', integ_file, '/database/db1/', '-a')
+    assert 'Indexed {} (3 databases, 30 globals)'.format(integ_file) in first.stderr
+    assert index.exists()
+    # It's up to date, so it's used as it is
+    again = integ2json('lookup', integ_file, '/database/db1/', '-a')
+    assert 'Indexed' not in again.stderr
+    assert again.stdout == first.stdout
+    # A new report in its place
+    stat = integ_file.stat()
+    write_integfile(integ_file, databases=4, globals_per_database=12, seed=2)
+    os.utime(integ_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    changed = integ2json('lookup', integ_file, '/database/db1/', '-a')
+    assert 'Indexed {} (4 databases, 48 globals)'.format(integ_file) in changed.stderr
+    database_json = full_databases(integ_file, tmp_path / 'new')['/database/db1/']
+    assert json.loads(changed.stdout) == {'INTEG_lookup.txt': {"databases": {'/database/db1/': database_json}}}
+    # -r rebuilds it anyway
+    assert 'Indexed' in integ2json('lookup', integ_file, '-r').stderr
+
+
+def test_lookup_index_elsewhere(synthetic_file, tmp_path):
+    index = tmp_path / 'elsewhere' / 'lookup.idx'
+    index.parent.mkdir()
+    assert lookup(synthetic_file, '/database/db2/', '-a', '-i', index) == lookup(synthetic_file, '/database/db2/', '-a')
+    assert index.exists()
+
+
+def test_lookup_compressed(synthetic_file, tmp_path):
+    """ Compressed files can't be indexed, they're parsed with filters instead. """
+    gzip_file = tmp_path / 'INTEG_synthetic.txt.gz'
+    with open(synthetic_file, 'rb') as fp, gzip.open(gzip_file, 'wb') as gz:
+        shutil.copyfileobj(fp, gz)
+    run = integ2json('lookup', gzip_file, '/database/db3/', '-a')
+    assert "is compressed, it can't be indexed" in run.stderr
+    assert json.loads(run.stdout)['INTEG_synthetic.txt'] == \
+        json.loads(integ2json('lookup', synthetic_file, '/database/db3/', '-a').stdout)['INTEG_synthetic.txt']
+    assert not (tmp_path / 'INTEG_synthetic.txt.gz.idx').exists()
+
+
+def test_lookup_not_found(synthetic_file):
+    run = integ2json('lookup', synthetic_file, '/nope/', check=False)
+    assert run.returncode == 1
+    assert 'No database /nope/ in' in run.stderr
+
+
+def test_lookup_not_integ(tmp_path):
+    not_integ = tmp_path / 'INTEG_not.txt'
+    not_integ.write_text('Not an integ file\n')
+    run = integ2json('lookup', not_integ, '/database/db0/', check=False)
+    assert run.returncode == 1
+    assert 'is not an integrity file' in run.stderr
+    assert not (tmp_path / 'INTEG_not.txt.idx').exists()
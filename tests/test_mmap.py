@@ -0,0 +1,27 @@
+""" [user-006] The mmap engine gives the same JSON as the text one.  Compressed and empty files fall back to text. """
+import pytest
+
+from helpers import INTEG_DIR_OUTFILES, TESTFILES, convert
+
+SAMPLE = TESTFILES / 'INTEG_example_cache201721_AIX.txt'
+
+
+@pytest.mark.parametrize('argv', [[], ['--stream'], ['-d', 'hash'], ['-j', '2']])
+def test_mmap_same_output(integ_dir, tmp_path, argv):
+    want = convert(integ_dir, tmp_path / 'text', *argv)
+    assert set(want) == INTEG_DIR_OUTFILES
+    assert convert(integ_dir, tmp_path / 'mmap', '-e', 'mmap', *argv) == want
+
+
+def test_mmap_errors(synthetic_file, tmp_path):
+    assert convert(synthetic_file, tmp_path / 'mmap', '-e', 'mmap') == convert(synthetic_file, tmp_path / 'text')
+
+
+def test_mmap_crlf(tmp_path):
+    """ Lines ending in CRLF, ie: a file copied off Windows. """
+    integ_file = tmp_path / 'INTEG_crlf.txt'
+    integ_file.write_bytes(SAMPLE.read_bytes().replace(b'\n', b'\r\n'))
+    want = convert(integ_file, tmp_path / 'text')
+    assert list(want['INTEG_crlf.json'].values()) == list(convert(SAMPLE, tmp_path / 'sample')[
+        'INTEG_example_cache201721_AIX.json'].values())
+    assert convert(integ_file, tmp_path / 'mmap', '-e', 'mmap') == want
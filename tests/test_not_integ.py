@@ -0,0 +1,61 @@
+""" [user-017] Whether a file is an integ file is found out as it's parsed: ones that aren't, empty ones, compressed
+ones and zip members that aren't are skipped, however the files are converted.  Files whose outfile exists already are
+skipped too. """
+import gzip
+import shutil
+import zipfile
+
+import pytest
+
+from helpers import TESTFILES, integ2json, integ_files, load_outdir
+
+SAMPLE = TESTFILES / 'INTEG_example_cache201721_AIX.txt'
+
+
+@pytest.fixture
+def mixed_dir(tmp_path):
+    """ The AIX sample, and next to it things named like integ files that aren't. """
+    mixed_dir = tmp_path / 'mixed'
+    mixed_dir.mkdir()
+    shutil.copy(SAMPLE, mixed_dir / 'INTEG_aix.txt')
+    (mixed_dir / 'INTEG_not.txt').write_text('Not an integ file\nat all\n')
+    (mixed_dir / 'INTEG_empty.txt').write_text('')
+    with gzip.open(mixed_dir / 'INTEG_not.txt.gz', 'wt') as gz:
+        gz.write('Not an integ file\nat all\n')
+    with zipfile.ZipFile(mixed_dir / 'INTEG_mixed.zip', 'w') as zf:
+        zf.write(SAMPLE, 'INTEG_inner.txt')
+        zf.writestr('README.txt', 'Not an integ file\n')
+    return mixed_dir
+
+
+@pytest.mark.parametrize('argv', [[], ['-e', 'mmap'], ['--stream'], ['-j', '2']])
+def test_not_integ_skipped(mixed_dir, tmp_path, argv):
+    outdir = tmp_path / 'out'
+    outdir.mkdir()
+    printed = integ2json('-o', outdir, *argv, *integ_files(mixed_dir)).stdout
+    assert set(load_outdir(outdir)) == {'INTEG_aix.json', 'INTEG_inner.json'}
+    for skipped in ('INTEG_not.txt', 'INTEG_empty.txt', 'INTEG_not.txt.gz', 'INTEG_mixed.zip:README.txt'):
+        assert "Skipping file {} because it's not an integrity file.".format(mixed_dir / skipped) in printed
+    # Nothing's left behind of the ones that aren't
+    assert sorted(path.name for path in outdir.iterdir()) == ['INTEG_aix.json', 'INTEG_inner.json']
+
+
+def test_not_integ_singlefile(mixed_dir, tmp_path):
+    integ2json('-o', tmp_path, '-s', *integ_files(mixed_dir))
+    assert set(load_outdir(tmp_path)['integ2json.json']) == {'INTEG_aix.txt', 'INTEG_inner.txt'}
+
+
+def test_outfile_exists(mixed_dir, tmp_path):
+    integ_file = mixed_dir / 'INTEG_aix.txt'
+    outfile = tmp_path / 'INTEG_aix.json'
+    outfile.write_text('{}')
+    printed = integ2json('-o', tmp_path, integ_file).stdout
+    assert "Skipping file {} because its outfile exists: {}".format(integ_file, outfile) in printed
+    assert outfile.read_text() == '{}'
+
+
+def test_singlefile_exists(mixed_dir, tmp_path):
+    (tmp_path / 'integ2json.json').write_text('{}')
+    run = integ2json('-o', tmp_path, '-s', mixed_dir / 'INTEG_aix.txt', check=False)
+    assert run.returncode == 1
+    assert 'Default single-output file exists' in run.stderr
@@ -0,0 +1,128 @@
+""" [user-024] serve answers with the same JSON as converting the files, from a cache that keeps the recent ones until
+they change, parsing each one once however many ask for it at the same time.  Nothing outside its dirs is served. """
+import asyncio
+import http.client
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+from urllib.parse import quote
+
+import pytest
+
+from helpers import INTEG_DIR_OUTFILES, REPO, VMS_DATABASE, convert, write_integfile
+
+import integ2json
+
+
+@pytest.fixture
+def server(integ_dir, tmp_path):
+    """ Serves integ_dir on a free port, returns a function that GETs (or whatever method) a path from it. """
+    # An integ file, but not in the served directory
+    shutil.copy(REPO / 'testfiles' / 'INTEG_example_cache201721_AIX.txt', tmp_path / 'outside.txt')
+    daemon = subprocess.Popen([sys.executable, str(REPO / 'integ2json.py'), 'serve', '-p', '0', '-j', '2',
+                               str(integ_dir)], stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    host, port = re.search(r'on http://(.*):(\d+)/reports', daemon.stdout.readline()).groups()
+
+    def request(path: str, method: str = 'GET') -> tuple:
+        conn = http.client.HTTPConnection(host, int(port), timeout=30)
+        try:
+            conn.request(method, path)
+            response = conn.getresponse()
+            return response.status, json.loads(response.read())
+        finally:
+            conn.close()
+    yield request
+    daemon.kill()
+    daemon.wait()
+
+
+def test_serve(server, integ_dir, tmp_path):
+    want = convert(integ_dir, tmp_path / 'want')
+    assert set(want) == INTEG_DIR_OUTFILES
+    assert server('/reports') == (200, {"reports": ['INTEG_aix.txt', 'INTEG_aix_zipped.zip', 'INTEG_emptyfile.txt',
+                                                    'INTEG_vms.txt']})
+    for name in ('INTEG_aix.txt', 'INTEG_vms.txt'):
+        report = want[name.replace('.txt', '.json')]
+        assert server('/reports/' + name) == (200, report)
+        assert server('/reports/{}/errors'.format(name)) == (200, {"errors": report[name].get("errors", {})})
+    vms_json = want['INTEG_vms.json']['INTEG_vms.txt']
+    # Quoted, or not
+    assert server('/reports/INTEG_vms.txt/databases/' + quote(VMS_DATABASE, safe='')) == \
+        (200, vms_json["databases"][VMS_DATABASE])
+    assert server('/reports/INTEG_vms.txt/databases/' + VMS_DATABASE) == (200, vms_json["databases"][VMS_DATABASE])
+
+
+@pytest.mark.parametrize('path, error', [
+    ('/reports/INTEG_nope.txt', 'No integ file INTEG_nope.txt'),
+    ('/reports/INTEG_emptyfile.txt', 'INTEG_emptyfile.txt is not an integrity file'),
+    ('/reports/INTEG_vms.txt/databases/%2Fnope%2F', 'No database /nope/ in INTEG_vms.txt'),
+    ('/reports/../outside.txt', 'No integ file ../outside.txt'),
+    ('/reports/%2E%2E/outside.txt', 'No integ file ../outside.txt'),
+    ('/elsewhere', 'Not found: /elsewhere'),
+])
+def test_serve_not_found(server, path, error):
+    assert server(path) == (404, {"error": error})
+
+
+def test_serve_only_get(server):
+    assert server('/reports', 'POST') == (405, {"error": "Only GET is supported"})
+
+
+def get(cache: {}, integ_file) -> {}:
+    return asyncio.run(integ2json.cached_report(cache, integ_file))
+
+
+@pytest.fixture
+def cache():
+    cache = integ2json.new_report_cache(max_reports=2, jobs=2)
+    yield cache
+    if cache["pool"] is not None:
+        cache["pool"].shutdown()
+
+
+def test_cache(cache, tmp_path):
+    integ_files = [write_integfile(tmp_path / 'INTEG_{}.txt'.format(number), databases=2, globals_per_database=5,
+                                   seed=number) for number in range(3)]
+    first = get(cache, integ_files[0])
+    assert first == integ2json.deal_with_integfile(integ_files[0])
+    # It's the cached one
+    assert get(cache, integ_files[0]) is first
+    get(cache, integ_files[1])
+    get(cache, integ_files[2])
+    # Only the last two are kept
+    assert list(cache["reports"]) == integ_files[1:]
+    assert get(cache, integ_files[0]) is not first
+    # A new version is parsed again
+    stat = integ_files[0].stat()
+    write_integfile(integ_files[0], databases=3, globals_per_database=5, seed=9)
+    os.utime(integ_files[0], ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert len(get(cache, integ_files[0])["databases"]) == 3
+
+
+def test_cache_one_parse(cache, tmp_path):
+    """ Requests for a file that's being parsed wait for that parse. """
+    integ_file = write_integfile(tmp_path / 'INTEG_busy.txt', databases=4, globals_per_database=50)
+
+    async def requests():
+        tasks = [asyncio.create_task(integ2json.cached_report(cache, integ_file)) for _ in range(5)]
+        # Let them all start before any of them finishes
+        await asyncio.sleep(0)
+        assert len(cache["parsing"]) == 1
+        return await asyncio.gather(*tasks)
+    reports = asyncio.run(requests())
+    assert all(report is reports[0] for report in reports)
+    assert cache["parsing"] == {}
+
+
+def test_served_file(tmp_path):
+    served = tmp_path / 'served'
+    served.mkdir()
+    shutil.copy(REPO / 'testfiles' / 'INTEG_example_cache201721_AIX.txt', served / 'INTEG_aix.txt')
+    (tmp_path / 'outside.txt').write_text('')
+    assert integ2json.served_file([served], 'INTEG_aix.txt') == served.resolve() / 'INTEG_aix.txt'
+    assert integ2json.served_file([served], '../outside.txt') is None
+    assert integ2json.served_file([served], str(tmp_path / 'outside.txt')) is None
+    assert integ2json.served_file([served], '') is None
@@ -0,0 +1,94 @@
+""" [user-023] --shard-reports and --shard-mb write the files of each system to shards of a bounded number of files or
+size, and a manifest of which shard each file is in.  Together the shards are the --singlefile output. """
+import gzip
+import json
+
+import pytest
+
+from helpers import integ2json, integ_files, load_outdir, write_integfile
+
+MANIFEST = 'integ2json_manifest.json'
+
+
+@pytest.fixture
+def fleet(tmp_path):
+    """ Five reports of SYNTHHOST, three of OTHERHOST, and a file that isn't a report. """
+    fleet = tmp_path / 'fleet'
+    fleet.mkdir()
+    for number in range(8):
+        integ_file = write_integfile(fleet / 'INTEG_{}.txt'.format(number), databases=2, globals_per_database=10,
+                                     errors=number % 2, seed=number)
+        if number % 3 == 1:
+            integ_file.write_text(integ_file.read_text().replace('System: SYNTHHOST', 'System: OTHERHOST', 1))
+    (fleet / 'INTEG_not.txt').write_text('Not an integ file\n')
+    return fleet
+
+
+def shard(fleet, outdir, *argv) -> ({}, str):
+    """ Shards the fleet to outdir with argv, returns (the manifest, what was printed). """
+    outdir.mkdir()
+    printed = integ2json('-o', outdir, *argv, *integ_files(fleet)).stdout
+    return json.loads((outdir / MANIFEST).read_text()), printed
+
+
+def singlefile(fleet, outdir) -> {}:
+    outdir.mkdir()
+    integ2json('-o', outdir, '-s', *integ_files(fleet))
+    return load_outdir(outdir)['integ2json.json']
+
+
+def test_shard_reports(fleet, tmp_path):
+    manifest, printed = shard(fleet, tmp_path / 'shards', '--shard-reports', '2')
+    assert [(shard_json["File"], shard_json["System_Name"], shard_json["Reports"]) for shard_json in manifest["Shards"]] == [
+        ('integ2json_shards/OTHERHOST_CACHE_00000.json', 'OTHERHOST', 2),
+        ('integ2json_shards/OTHERHOST_CACHE_00001.json', 'OTHERHOST', 1),
+        ('integ2json_shards/SYNTHHOST_CACHE_00002.json', 'SYNTHHOST', 2),
+        ('integ2json_shards/SYNTHHOST_CACHE_00003.json', 'SYNTHHOST', 2),
+        ('integ2json_shards/SYNTHHOST_CACHE_00004.json', 'SYNTHHOST', 1),
+    ]
+    assert "Skipping file {} because it's not an integrity file.".format(fleet / 'INTEG_not.txt') in printed
+    # Each shard has the files the manifest says it has
+    shards = [json.loads((tmp_path / 'shards' / shard_json["File"]).read_text()) for shard_json in manifest["Shards"]]
+    for report in manifest["Reports"]:
+        assert report["Name"] in shards[report["Shard"]]
+        assert report["Source"] == str(fleet / report["Name"])
+        assert report["System_Name"] == manifest["Shards"][report["Shard"]]["System_Name"]
+    assert sorted(report["Name"] for report in manifest["Reports"]) == ['INTEG_{}.txt'.format(n) for n in range(8)]
+    # Together they're the singlefile output
+    union = {if_str: integ_json for shard_json in shards for if_str, integ_json in shard_json.items()}
+    assert union == singlefile(fleet, tmp_path / 'single')
+
+
+@pytest.mark.parametrize('shard_mb, shards', [('0.0001', 8), ('100', 2)])
+def test_shard_mb(fleet, tmp_path, shard_mb, shards):
+    """ A shard is finished once it's that big, so a tiny one has a file per shard. """
+    manifest, _ = shard(fleet, tmp_path / 'shards', '--shard-mb', shard_mb)
+    assert len(manifest["Shards"]) == shards
+    assert sum(shard_json["Reports"] for shard_json in manifest["Shards"]) == 8
+
+
+def test_shard_compressed(fleet, tmp_path):
+    manifest, _ = shard(fleet, tmp_path / 'shards', '--shard-reports', '3', '-z', 'gzip')
+    union = {}
+    for shard_json in manifest["Shards"]:
+        assert shard_json["File"].endswith('.json.gz')
+        union.update(json.loads(gzip.decompress((tmp_path / 'shards' / shard_json["File"]).read_bytes())))
+    assert union == singlefile(fleet, tmp_path / 'single')
+
+
+@pytest.mark.parametrize('argv, message', [
+    (['--shard-reports', '0'], 'Shards must have room for something.'),
+    (['--shard-reports', '2', '-s'], 'Shards can not be used with singlefile'),
+    (['--shard-mb', '1', '--errors-only'], 'Shards can not be used with'),
+])
+def test_shard_refused(fleet, tmp_path, argv, message):
+    run = integ2json('-o', tmp_path, *argv, *integ_files(fleet), check=False)
+    assert run.returncode == 1
+    assert message in run.stderr
+
+
+def test_shard_manifest_exists(fleet, tmp_path):
+    shard(fleet, tmp_path / 'shards', '--shard-reports', '2')
+    run = integ2json('-o', tmp_path / 'shards', '--shard-reports', '2', *integ_files(fleet), check=False)
+    assert run.returncode == 1
+    assert 'Shard manifest exists' in run.stderr
@@ -0,0 +1,29 @@
+""" [user-003] Parsing the databases of a file in parallel with --split gives the same JSON as parsing it in order. """
+import pytest
+
+from helpers import INTEG_DIR_OUTFILES, convert, integ2json
+
+
+@pytest.mark.parametrize('argv', [[], ['-d', 'hash'], ['-e', 'mmap']])
+def test_split_same_output(integ_dir, tmp_path, argv):
+    want = convert(integ_dir, tmp_path / 'plain', *argv)
+    assert set(want) == INTEG_DIR_OUTFILES
+    assert convert(integ_dir, tmp_path / 'split', '--split', '-j', '2', *argv) == want
+
+
+def test_split_same_singlefile(integ_dir, tmp_path):
+    want = convert(integ_dir, tmp_path / 'plain', '-s')
+    assert convert(integ_dir, tmp_path / 'split', '-s', '--split', '-j', '2') == want
+
+
+def test_split_errors(synthetic_file, tmp_path):
+    """ Each database's errors go with it, whichever job parsed it. """
+    want = convert(synthetic_file, tmp_path / 'plain')
+    assert convert(synthetic_file, tmp_path / 'split', '--split', '-j', '3') == want
+
+
+def test_split_not_with_stream(synthetic_file, tmp_path):
+    """ --stream writes the databases as they're parsed, in order, so it can't split them. """
+    done = integ2json('--split', '-j', '2', '--stream', '-o', tmp_path, synthetic_file, check=False)
+    assert done.returncode != 0
+    assert 'split' in done.stderr
@@ -0,0 +1,108 @@
+""" [user-025] A plain conversion doesn't import what only some options need, integ2json.py is the entry point of
+integ2json_lib, and --stdin converts a whole batch in one process, each file as soon as its name is read. """
+import subprocess
+import sys
+import time
+
+import pytest
+
+from helpers import INTEG_DIR_OUTFILES, REPO, convert, integ2json, integ_files, load_outdir
+
+import integ2json as integ2json_module
+import integ2json_lib
+
+# Imported only by the options that need them
+LAZY_MODULES = ['asyncio', 'concurrent.futures', 'csv', 'gzip', 'hashlib', 'http.server', 'orjson', 'sqlite3',
+                'tempfile', 'ujson', 'zipfile', 'zstandard']
+
+
+def test_lazy_imports(synthetic_file, tmp_path):
+    code = ("import sys; sys.path.insert(0, {!r}); sys.argv = ['integ2json.py', '-o', {!r}, {!r}]; "
+            "import integ2json_lib; integ2json_lib.run(); "
+            "print(','.join(name for name in {!r} if name in sys.modules))").format(
+                str(REPO), str(tmp_path), str(synthetic_file), LAZY_MODULES)
+    printed = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True).stdout
+    assert (tmp_path / 'INTEG_synthetic.json').exists()
+    assert printed.splitlines()[-1] == ''
+    # Nothing's left behind checking the outdir can be written to
+    assert sorted(path.name for path in tmp_path.iterdir()) == ['INTEG_synthetic.json', 'INTEG_synthetic.txt']
+
+
+def test_entry_point(synthetic_file, tmp_path):
+    assert integ2json_module.main is integ2json_lib.main
+    assert integ2json_module.parse is integ2json_lib.parse
+    # It runs from a symlink to it too
+    link = tmp_path / 'integ2json'
+    link.symlink_to(REPO / 'integ2json.py')
+    outdir = tmp_path / 'out'
+    outdir.mkdir()
+    subprocess.run([sys.executable, str(link), '-o', str(outdir), str(synthetic_file)], check=True, capture_output=True)
+    assert load_outdir(outdir) == convert(synthetic_file, tmp_path / 'want')
+
+
+def stdin(outdir, names: list, *argv) -> str:
+    """ Converts the files named on stdin to outdir, returns what it printed. """
+    outdir.mkdir()
+    return integ2json('--stdin', '-o', outdir, *argv, input=''.join('{}\n'.format(name) for name in names)).stdout
+
+
+@pytest.mark.parametrize('argv', [[], ['-j', '2'], ['-c'], ['-j', '2', '--split']])
+def test_stdin(integ_dir, tmp_path, argv):
+    names = integ_files(integ_dir)
+    names.insert(2, tmp_path / 'INTEG_nope.txt')
+    names.insert(1, '')
+    printed = stdin(tmp_path / 'out', names, *argv)
+    assert "Skipping file {} because it does not exist.".format(tmp_path / 'INTEG_nope.txt') in printed
+    got = load_outdir(tmp_path / 'out')
+    # The conversion cache's file is there too with -c
+    got.pop('integ2json_cache.json', None)
+    assert got == convert(integ_dir, tmp_path / 'want')
+    assert set(got) == INTEG_DIR_OUTFILES
+
+
+def test_stdin_cache(integ_dir, tmp_path):
+    """ The second batch only converts what's changed. """
+    stdin(tmp_path / 'out', integ_files(integ_dir), '-c')
+    printed = integ2json('--stdin', '-o', tmp_path / 'out', '-c',
+                         input=''.join('{}\n'.format(name) for name in integ_files(integ_dir))).stdout
+    assert 'Converted' not in printed
+    assert printed.count("because it hasn't changed") == 3
+    # It's not cached, it's not an integ file
+    assert "Skipping file {} because it's not an integrity file.".format(integ_dir / 'INTEG_emptyfile.txt') in printed
+
+
+def test_stdin_as_read(integ_dir, tmp_path):
+    """ Each file is converted when its name is read, not when stdin is closed. """
+    outdir = tmp_path / 'out'
+    outdir.mkdir()
+    batch = subprocess.Popen([sys.executable, str(REPO / 'integ2json.py'), '--stdin', '-o', str(outdir)],
+                             stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+    try:
+        for name, outfile in (('INTEG_aix.txt', 'INTEG_aix.json'), ('INTEG_vms.txt', 'INTEG_vms.json')):
+            batch.stdin.write('{}\n'.format(integ_dir / name))
+            batch.stdin.flush()
+            give_up = time.monotonic() + 30
+            while not (outdir / outfile).exists():
+                assert time.monotonic() < give_up, "Timed out"
+                time.sleep(0.05)
+        assert batch.poll() is None
+        batch.stdin.close()
+        assert batch.wait(timeout=30) == 0
+    finally:
+        if batch.poll() is None:
+            batch.kill()
+            batch.wait()
+    assert batch.stdout.read().count('Converted') == 2
+
+
+@pytest.mark.parametrize('argv', [['-s'], ['--follow'], ['--shard-reports', '2'], ['--shard-mb', '1']])
+def test_stdin_refused(tmp_path, argv):
+    run = integ2json('--stdin', '-o', tmp_path, *argv, input='', check=False)
+    assert run.returncode == 1
+    assert 'The stdin flag can not be used with' in run.stderr
+
+
+def test_stdin_no_files(synthetic_file, tmp_path):
+    run = integ2json('--stdin', '-o', tmp_path, synthetic_file, input='', check=False)
+    assert run.returncode == 1
+    assert "Integ files can not be given with the stdin flag" in run.stderr
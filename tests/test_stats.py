@@ -0,0 +1,52 @@
+""" [user-012] --stats prints the bytes and lines read, counted as the file is parsed, and --profile writes a
+cProfile file next to each outfile. """
+import gzip
+import pstats
+import re
+import shutil
+
+import pytest
+
+from helpers import integ2json, write_integfile
+
+STATS_PATTERN = re.compile(r'([\d,]+) bytes, ([\d,]+) lines .*, (\d+) databases .*, (\d+) globals ')
+
+
+@pytest.fixture
+def integ_file(tmp_path):
+    """ A file without errors, they're at the end so it's read right to the last line. """
+    return write_integfile(tmp_path / 'INTEG_stats.txt', databases=4, globals_per_database=25)
+
+
+def stats(*argv) -> list:
+    """ Returns the (bytes, lines, databases, globals) --stats printed for each file. """
+    printed = integ2json('--stats', *argv).stdout
+    return [tuple(int(number.replace(',', '')) for number in match.groups())
+            for match in STATS_PATTERN.finditer(printed)]
+
+
+@pytest.mark.parametrize('argv', [[], ['-e', 'mmap'], ['--stream'], ['-j', '2'], ['--split', '-j', '2']])
+def test_stats_counts(integ_file, tmp_path, argv):
+    lines = integ_file.read_text().count('\n')
+    assert stats('-o', tmp_path, *argv, integ_file) == [(integ_file.stat().st_size, lines, 4, 100)]
+
+
+def test_stats_gzip(integ_file, tmp_path):
+    """ It's the uncompressed bytes that are counted. """
+    gzip_file = tmp_path / 'INTEG_stats.txt.gz'
+    with open(integ_file, 'rb') as fp, gzip.open(gzip_file, 'wb') as gz:
+        shutil.copyfileobj(fp, gz)
+    outdir = tmp_path / 'out'
+    outdir.mkdir()
+    assert stats('-o', outdir, gzip_file) == stats('-o', tmp_path, integ_file)
+
+
+def test_stats_errors_only(integ_file, tmp_path):
+    (counted,) = stats('-o', tmp_path, '--errors-only', integ_file)
+    assert counted[:2] == (integ_file.stat().st_size, integ_file.read_text().count('\n'))
+
+
+def test_profile(integ_file, tmp_path):
+    integ2json('--profile', '-o', tmp_path, integ_file)
+    profile = pstats.Stats(str(tmp_path / 'INTEG_stats.pstats'))
+    assert any(function.startswith('deal_with_global') for _, _, function in profile.stats)
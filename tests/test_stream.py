@@ -0,0 +1,25 @@
+""" [user-001] --stream writes the same JSON as parsing the whole file first. """
+import pytest
+
+from helpers import INTEG_DIR_OUTFILES, convert
+
+
+@pytest.mark.parametrize('argv', [[], ['-b'], ['-d', 'hash']])
+def test_stream_same_output(integ_dir, tmp_path, argv):
+    want = convert(integ_dir, tmp_path / 'plain', *argv)
+    assert set(want) == INTEG_DIR_OUTFILES
+    assert convert(integ_dir, tmp_path / 'stream', '--stream', *argv) == want
+
+
+def test_stream_same_singlefile(integ_dir, tmp_path):
+    want = convert(integ_dir, tmp_path / 'plain', '-s')
+    assert len(want['integ2json.json']) == 3
+    assert convert(integ_dir, tmp_path / 'stream', '-s', '--stream') == want
+
+
+def test_stream_errors(synthetic_file, tmp_path):
+    """ The errors come after the databases in the file, they're still all there. """
+    want = convert(synthetic_file, tmp_path / 'plain')
+    (integ_json,) = want['INTEG_synthetic.json'].values()
+    assert sum(len(errors) for errors in integ_json['errors'].values()) == 5
+    assert convert(synthetic_file, tmp_path / 'stream', '--stream') == want
@@ -0,0 +1,71 @@
+""" [user-016] --summary adds the totals, percent full percentiles and --top largest and most wasteful globals to each
+database and to the file, the same however the file is converted. """
+import math
+
+import pytest
+
+from helpers import convert
+
+
+def percentile(values: list, percent: int) -> int:
+    """ Nearest-rank, worked out the long way. """
+    values = sorted(values)
+    rank = max(math.ceil(percent * len(values) / 100), 1)
+    return values[rank - 1]
+
+
+def want_summary(globals_: list, top: int) -> {}:
+    """ The summary of some (database, global, global JSON), worked out from the JSON of the globals. """
+    rows = []
+    for database, glbl, global_json in globals_:
+        total = global_json["Data"]["Total"]
+        rows.append({"Database": database, "Global": glbl, "Size_KB": total["Size_KB"],
+                     "Wasted_KB": total["Size_KB"] * (100 - total["Percent_Full"]) // 100,
+                     "Percent_Full": total["Percent_Full"], "Blocks": total["Blocks"],
+                     "Elapsed_Seconds": global_json["Time"]["Elapsed_Seconds"]})
+    size_kb = sum(row["Size_KB"] for row in rows)
+    wasted_kb = sum(row["Wasted_KB"] for row in rows)
+    percent_full = [row["Percent_Full"] for row in rows]
+    listed = ("Database", "Global", "Size_KB", "Wasted_KB", "Percent_Full")
+    return {
+        "Globals": len(rows),
+        "Blocks": sum(row["Blocks"] for row in rows),
+        "Size_KB": size_kb,
+        "Wasted_KB": wasted_kb,
+        "Elapsed_Seconds": round(math.fsum(row["Elapsed_Seconds"] for row in rows), 3),
+        "Percent_Full": {"Min": min(percent_full), "P10": percentile(percent_full, 10),
+                         "P50": percentile(percent_full, 50), "P90": percentile(percent_full, 90),
+                         "Max": max(percent_full), "Weighted_Mean": round(100 * (1 - wasted_kb / size_kb), 1)},
+        "Largest_Globals": [{key: row[key] for key in listed}
+                            for row in sorted(rows, key=lambda row: row["Size_KB"], reverse=True)[:top]],
+        "Most_Wasted_Globals": [{key: row[key] for key in listed}
+                                for row in sorted(rows, key=lambda row: row["Wasted_KB"], reverse=True)[:top]],
+    }
+
+
+@pytest.mark.parametrize('top', [None, 3])
+def test_summary(synthetic_file, tmp_path, top):
+    argv = ['--summary'] + (['--top', str(top)] if top else [])
+    (report,) = convert(synthetic_file, tmp_path / 'out', *argv)['INTEG_synthetic.json'].values()
+    top = top or 10
+    everything = []
+    for database, database_json in report["databases"].items():
+        globals_ = [(database, glbl, global_json) for glbl, global_json in database_json["globals"].items()]
+        assert database_json["summary"] == want_summary(globals_, top)
+        everything.extend(globals_)
+    summary = dict(report["summary"])
+    assert summary.pop("Databases") == 6
+    assert summary.pop("Wall_Seconds") > 0
+    assert summary == want_summary(everything, top)
+
+
+def test_summary_without_it(synthetic_file, tmp_path):
+    (report,) = convert(synthetic_file, tmp_path / 'out')['INTEG_synthetic.json'].values()
+    assert "summary" not in report
+    assert all("summary" not in database_json for database_json in report["databases"].values())
+
+
+@pytest.mark.parametrize('argv', [['-e', 'mmap'], ['--stream'], ['-j', '2'], ['--split', '-j', '2']])
+def test_summary_same_every_way(synthetic_file, tmp_path, argv):
+    want = convert(synthetic_file, tmp_path / 'want', '--summary')
+    assert convert(synthetic_file, tmp_path / 'out', '--summary', *argv) == want
@@ -0,0 +1,83 @@
+""" [user-014] The trend index: growth shows a global in every report, full the globals that went over a percent
+full, and integ files and their JSON give the same index. """
+import csv
+import io
+
+import pytest
+
+from helpers import convert, integ2json
+
+import gen_integfile
+
+DATES = ['01/01/2199', '01/11/2199', '01/21/2199']
+
+
+@pytest.fixture
+def reports(tmp_path) -> list:
+    """ Three reports of the same system, ten days apart. """
+    integ_files = []
+    for number, date in enumerate(DATES):
+        text = io.StringIO()
+        gen_integfile.generate_integfile(text, databases=2, globals_per_database=10, seed=number)
+        integ_file = tmp_path / 'INTEG_{}.txt'.format(number)
+        integ_file.write_text(text.getvalue().replace('01/01/2199', date, 1))
+        integ_files.append(integ_file)
+    return integ_files
+
+
+def trend(*argv) -> list:
+    """ Runs a trend query, returns the rows of csv it printed. """
+    return list(csv.DictReader(io.StringIO(integ2json('trend', *argv).stdout)))
+
+
+def report_json(integ_file, tmp_path) -> {}:
+    (report,) = convert(integ_file, tmp_path / integ_file.stem).popitem()[1].values()
+    return report
+
+
+def test_trend_add_skips_indexed(reports, tmp_path):
+    index = tmp_path / 'index.sqlite'
+    printed = integ2json('trend', 'add', index, *reports[:2]).stdout
+    assert printed.count('Added') == 2
+    printed = integ2json('trend', 'add', index, *reports).stdout
+    assert printed.count('Added') == 1
+    assert printed.count("because it's already in the index") == 2
+
+
+def test_trend_growth(reports, tmp_path):
+    index = tmp_path / 'index.sqlite'
+    integ2json('trend', 'add', index, *reports)
+    rows = trend('growth', index, '-D', '/database/db1/', '-G', 'GLOBAL3')
+    assert [row["Date"] for row in rows] == ['2199-01-01 00:00:00', '2199-01-11 00:00:00', '2199-01-21 00:00:00']
+    for row, integ_file in zip(rows, reports):
+        total = report_json(integ_file, tmp_path)["databases"]["/database/db1/"]["globals"]["GLOBAL3"]["Data"]["Total"]
+        assert (int(row["Blocks"]), int(row["Size_KB"]), int(row["Percent_Full"])) == \
+            (total["Blocks"], total["Size_KB"], total["Percent_Full"])
+
+
+def test_trend_full(reports, tmp_path):
+    index = tmp_path / 'index.sqlite'
+    integ2json('trend', 'add', index, *reports)
+    want = set()
+    previous = {}
+    for integ_file, date in zip(reports, ['2199-01-01', '2199-01-11', '2199-01-21']):
+        for database, database_json in report_json(integ_file, tmp_path)["databases"].items():
+            for glbl, global_json in database_json["globals"].items():
+                percent_full = global_json["Data"]["Total"]["Percent_Full"]
+                if percent_full >= 80 and previous.get((database, glbl), 0) < 80 and date >= '2199-01-11':
+                    want.add((database, glbl, date))
+                previous[(database, glbl)] = percent_full
+    rows = trend('full', index, '-p', '80', '--since', '2199-01-11')
+    assert want
+    assert {(row["Database"], row["Global"], row["Date"][:10]) for row in rows} == want
+
+
+def test_trend_from_json(reports, tmp_path):
+    """ Adding the JSON of the reports gives the same index as adding the integ files. """
+    outdir = tmp_path / 'json'
+    convert(reports[0].parent, outdir)
+    integ2json('trend', 'add', tmp_path / 'integ.sqlite', *reports)
+    integ2json('trend', 'add', tmp_path / 'json.sqlite', *sorted(outdir.glob('*.json')))
+    for query in (['growth', '-D', '/database/db0/', '-G', 'GLOBAL7'], ['full', '-p', '50']):
+        assert trend(query[0], tmp_path / 'json.sqlite', *query[1:]) == \
+            trend(query[0], tmp_path / 'integ.sqlite', *query[1:])
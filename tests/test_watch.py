@@ -0,0 +1,86 @@
+""" [user-015] The watch daemon converts integ files as they turn up, once they've stopped growing, and again when
+they change.  Files that aren't integ files are skipped without stopping it. """
+import io
+import signal
+import subprocess
+import sys
+import time
+
+import pytest
+
+from helpers import REPO, convert, load_outdir, write_integfile
+
+import gen_integfile
+
+
+@pytest.fixture
+def watch(tmp_path):
+    """ Starts the daemon watching tmp_path/in, converting to tmp_path/out.  Returns (in, out, the process). """
+    watched = tmp_path / 'in'
+    outdir = tmp_path / 'out'
+    watched.mkdir()
+    outdir.mkdir()
+    daemon = subprocess.Popen([sys.executable, str(REPO / 'integ2json.py'), 'watch', '-o', str(outdir), '-p', 'INTEG_*',
+                               '-j', '2', '--interval', '0.05', '--settle', '0.5', str(watched)],
+                              stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    yield watched, outdir, daemon
+    if daemon.poll() is None:
+        daemon.kill()
+        daemon.wait()
+
+
+def wait_for(check, timeout: float = 30) -> None:
+    """ Waits until check() is true.  It's checked again if it raises KeyError or ValueError, ie: an outfile that
+    isn't there yet, or is only half written. """
+    give_up = time.monotonic() + timeout
+    while True:
+        try:
+            if check():
+                return
+        except (KeyError, ValueError):
+            pass
+        assert time.monotonic() < give_up, "Timed out"
+        time.sleep(0.05)
+
+
+def stop(daemon) -> str:
+    """ Stops the daemon like ^C does, returns what it printed. """
+    daemon.send_signal(signal.SIGINT)
+    printed = daemon.communicate(timeout=30)[0]
+    assert printed.rstrip().endswith('Stopped watching.')
+    return printed
+
+
+def test_watch(watch, tmp_path):
+    watched, outdir, daemon = watch
+    (watched / 'INTEG_notinteg.txt').write_text('Not an integ file\n')
+    (watched / 'other.txt').write_text('Not matched by the pattern\n')
+    integ_file = write_integfile(watched / 'INTEG_a.txt', databases=2, globals_per_database=10, seed=1)
+    want = convert(integ_file, tmp_path / 'want')
+    wait_for(lambda: load_outdir(outdir) == want)
+    # A new version of it is converted again
+    time.sleep(0.05)
+    integ_file = write_integfile(watched / 'INTEG_a.txt', databases=3, globals_per_database=10, seed=2)
+    wait_for(lambda: len(load_outdir(outdir)['INTEG_a.json']['INTEG_a.txt']['databases']) == 3)
+    printed = stop(daemon)
+    assert "Skipping file {} because it's not an integrity file.".format(watched / 'INTEG_notinteg.txt') in printed
+    assert printed.count('Converted {}'.format(integ_file)) == 2
+    assert 'other.txt' not in printed
+
+
+def test_watch_settles(watch):
+    """ A file that's still growing isn't converted until it stops.  It's written in pieces, with pauses longer than
+    the interval but shorter than the settle time. """
+    watched, outdir, daemon = watch
+    text = io.StringIO()
+    gen_integfile.generate_integfile(text, databases=2, globals_per_database=10)
+    lines = text.getvalue().splitlines(keepends=True)
+    with open(watched / 'INTEG_growing.txt', 'w') as fp:
+        for start in range(0, len(lines), len(lines) // 4):
+            fp.writelines(lines[start:start + len(lines) // 4])
+            fp.flush()
+            time.sleep(0.15)
+    wait_for(lambda: len(load_outdir(outdir)['INTEG_growing.json']['INTEG_growing.txt']['databases']) == 2)
+    printed = stop(daemon)
+    assert printed.count('Converted') == 1
+    assert 'Skipping' not in printed and 'Failed' not in printed